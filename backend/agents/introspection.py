@@ -1,9 +1,20 @@
-from typing import TypedDict, Sequence
+import hashlib
+import logging
+from typing import Any, AsyncIterator, Dict, List, TypedDict, Sequence
 from pydantic import BaseModel, Field
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import BaseMessage
-from langchain_openai import ChatOpenAI
+from langchain_core.output_parsers.openai_tools import JsonOutputKeyToolsParser
+from langchain_core.runnables import Runnable, RunnableLambda
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langgraph.graph import StateGraph
+from agents.providers import OPENAI, get_provider
+from agents.resilience import CallPolicy, ModelCallGuard
+
+MODEL_NAME = "gpt-4o-mini"
+
+logger = logging.getLogger(__name__)
 
 # Pydantic Model for Structured Output
 class IntrospectiveThought(BaseModel):
@@ -15,12 +26,16 @@ class IntrospectiveThought(BaseModel):
         description="Explanation of how the thought was transformed."
     )
 
+class IntrospectionError(Exception):
+    """Raised when a thought could not be transformed."""
+
 # Agent State Definition
 class AgentState(TypedDict):
     """State for the introspection agent."""
     input_thought: str
     messages: Sequence[BaseMessage]
     output: IntrospectiveThought | None
+    error: str | None
 
 # Prompt Creation
 def create_introspection_prompt() -> ChatPromptTemplate:
@@ -50,19 +65,76 @@ Focus only on this transformation. Do not add extra steps or complexity."""),
         ("user", "Transform this thought slightly introspectively: {input_thought}")
     ])
 
+def get_prompt_version() -> str:
+    """
+    Fingerprints the introspection prompt so that stored rewrites can be tied
+    to the prompt that produced them.
+
+    Returns:
+        str: A short hash that changes whenever the prompt changes.
+    """
+    rendered = create_introspection_prompt().pretty_repr()
+    return hashlib.sha256(rendered.encode("utf-8")).hexdigest()[:16]
+
+def create_chat_model(model_name: str = MODEL_NAME, provider: str = OPENAI, **options: Any) -> BaseChatModel:
+    """
+    Creates the chat model shared by the workflow and the streaming chain.
+
+    Args:
+        model_name (str): The chat model to use.
+        provider (str): The provider serving it, a key of agents.providers.PROVIDERS.
+        **options: Provider-specific settings.
+
+    Returns:
+        BaseChatModel: The chat model.
+    """
+    return get_provider(provider)(model_name, **options)
+
+# Streaming Chain Creation
+def create_introspection_stream(model: BaseChatModel) -> Runnable:
+    """
+    Sets up a chain that streams the structured output as it is generated.
+
+    The model is forced to call the IntrospectiveThought tool and the tool
+    arguments are parsed as partial JSON, so every chunk yields the fields
+    generated so far.
+
+    Args:
+        model (BaseChatModel): The chat model to stream from.
+
+    Returns:
+        Runnable: A chain yielding progressively more complete output dicts.
+    """
+    return (
+        create_introspection_prompt()
+        | model.bind_tools([IntrospectiveThought], tool_choice=True)
+        | JsonOutputKeyToolsParser(key_name=IntrospectiveThought.__name__, first_tool_only=True)
+    )
+
 # Agent Workflow Creation
-def create_introspection_agent() -> StateGraph:
+def create_introspection_agent(
+    model_name: str = MODEL_NAME,
+    model: BaseChatModel | None = None,
+    guard: ModelCallGuard | None = None,
+    policy: CallPolicy | None = None
+) -> StateGraph:
     """
     Sets up the introspection agent with a structured output model.
 
+    Args:
+        model_name (str): The OpenAI chat model to use.
+        model (BaseChatModel | None): An existing chat model to reuse instead.
+        guard (ModelCallGuard | None): Limits and circuit breaking for model calls.
+        policy (CallPolicy | None): Retries and hedging for model calls.
+
     Returns:
         StateGraph: The compiled workflow for the agent.
     """
-    # Initialize the ChatOpenAI model
-    model = ChatOpenAI(
-        model="gpt-4o-mini",
-        temperature=0.7,
-    )
+    # Initialize the chat model
+    if model is None:
+        model = create_chat_model(model_name)
+    guard = guard or ModelCallGuard()
+    policy = policy or CallPolicy()
 
     # Apply with_structured_output() to enforce structured output
     structured_model = model.with_structured_output(schema=IntrospectiveThought)
@@ -70,30 +142,55 @@ def create_introspection_agent() -> StateGraph:
     # Create the prompt
     prompt = create_introspection_prompt()
 
+    def format_messages(state: AgentState) -> List[BaseMessage]:
+        # Format the prompt with the input thought
+        return prompt.format_messages(
+            input_thought=state["input_thought"],
+            messages=state["messages"]
+        )
+
+    def fall_back(state: AgentState, e: Exception) -> AgentState:
+        logger.warning("Error in transform_thought: %s: %s", type(e).__name__, e)
+        # Fallback in case of errors
+        state["error"] = str(e)
+        state["output"] = IntrospectiveThought(
+            introspective_rewrite=state["input_thought"],
+            reasoning="Error occurred during transformation"
+        )
+        return state
+
     def transform_thought(state: AgentState) -> AgentState:
         """Transforms the input thought into a slightly introspective version."""
+        messages = format_messages(state)
+
+        def attempt() -> IntrospectiveThought:
+            with guard.call():
+                return structured_model.invoke(messages)
+
         try:
-            # Format the prompt with the input thought
-            messages = prompt.format_messages(
-                input_thought=state["input_thought"],
-                messages=state["messages"]
-            )
             # Get the structured output directly from the model
-            response = structured_model.invoke(messages)
-            state["output"] = response
+            state["output"] = policy.run(attempt)
             return state
         except Exception as e:
-            print(f"Error in transform_thought: {str(e)}")
-            # Fallback in case of errors
-            state["output"] = IntrospectiveThought(
-                introspective_rewrite=state["input_thought"],
-                reasoning="Error occurred during transformation"
-            )
+            return fall_back(state, e)
+
+    async def atransform_thought(state: AgentState) -> AgentState:
+        """Async twin of transform_thought, used by ainvoke so no thread is held."""
+        messages = format_messages(state)
+
+        async def attempt() -> IntrospectiveThought:
+            async with guard.acall():
+                return await structured_model.ainvoke(messages)
+
+        try:
+            state["output"] = await policy.arun(attempt)
             return state
+        except Exception as e:
+            return fall_back(state, e)
 
     # Set up the workflow
     workflow = StateGraph(AgentState)
-    workflow.add_node("transform", transform_thought)
+    workflow.add_node("transform", RunnableLambda(transform_thought, afunc=atransform_thought))
     workflow.set_entry_point("transform")
     workflow.set_finish_point("transform")
 
@@ -103,18 +200,41 @@ def create_introspection_agent() -> StateGraph:
 class IntrospectionAgent:
     """Agent for transforming thoughts into slightly introspective versions."""
 
-    def __init__(self):
-        self.graph = create_introspection_agent()
+    def __init__(
+        self,
+        model_name: str = MODEL_NAME,
+        provider: str = OPENAI,
+        provider_options: Dict[str, Any] | None = None,
+        callbacks: List[BaseCallbackHandler] | None = None,
+        guard: ModelCallGuard | None = None,
+        policy: CallPolicy | None = None
+    ):
+        # Qualified for other providers so their rewrites never share cache keys with OpenAI's
+        self.model_name = model_name if provider == OPENAI else f"{provider}:{model_name}"
+        self.provider = provider
+        self.prompt_version = get_prompt_version()
+        self.model = create_chat_model(model_name, provider, callbacks=callbacks, **(provider_options or {}))
+        # One guard for the graph and the stream, so both share the same slots
+        self.guard = guard or ModelCallGuard()
+        self.graph = create_introspection_agent(model=self.model, guard=self.guard, policy=policy)
+        self.stream_chain = create_introspection_stream(self.model)
 
-    def process_thought(self, thought_text: str) -> IntrospectiveThought:
+    def process_thought(
+        self, thought_text: str, raise_on_error: bool = False, messages: Sequence[BaseMessage] = ()
+    ) -> IntrospectiveThought:
         """
         Processes a thought and returns its introspective version.
 
         Args:
             thought_text (str): The original thought to transform.
+            raise_on_error (bool): Raise instead of falling back to the original text.
+            messages (Sequence[BaseMessage]): Context about the user, placed before the thought.
 
         Returns:
             IntrospectiveThought: The transformed thought and reasoning.
+
+        Raises:
+            IntrospectionError: If raise_on_error is set and the transformation failed.
         """
         if not thought_text:
             return IntrospectiveThought(
@@ -125,18 +245,141 @@ class IntrospectionAgent:
         try:
             initial_state: AgentState = {
                 "input_thought": thought_text,
-                "messages": [],
-                "output": None
+                "messages": list(messages),
+                "output": None,
+                "error": None
             }
             final_state: AgentState = self.graph.invoke(initial_state)
-            return final_state["output"]
         except Exception as e:
-            print(f"Error in process_thought: {str(e)}")
+            if raise_on_error:
+                raise IntrospectionError(str(e)) from e
+            logger.warning("Error in process_thought: %s", e)
             return IntrospectiveThought(
                 introspective_rewrite=thought_text,
                 reasoning="Error occurred during processing"
             )
 
+        if raise_on_error and final_state.get("error"):
+            raise IntrospectionError(final_state["error"])
+        return final_state["output"]
+
+    async def aprocess_thought(
+        self, thought_text: str, raise_on_error: bool = False, messages: Sequence[BaseMessage] = ()
+    ) -> IntrospectiveThought:
+        """
+        Async version of process_thought, running the graph with ainvoke.
+
+        Args:
+            thought_text (str): The original thought to transform.
+            raise_on_error (bool): Raise instead of falling back to the original text.
+            messages (Sequence[BaseMessage]): Context about the user, placed before the thought.
+
+        Returns:
+            IntrospectiveThought: The transformed thought and reasoning.
+
+        Raises:
+            IntrospectionError: If raise_on_error is set and the transformation failed.
+        """
+        if not thought_text:
+            return IntrospectiveThought(
+                introspective_rewrite="",
+                reasoning="No thought provided"
+            )
+
+        try:
+            initial_state: AgentState = {
+                "input_thought": thought_text,
+                "messages": list(messages),
+                "output": None,
+                "error": None
+            }
+            final_state: AgentState = await self.graph.ainvoke(initial_state)
+        except Exception as e:
+            if raise_on_error:
+                raise IntrospectionError(str(e)) from e
+            logger.warning("Error in aprocess_thought: %s", e)
+            return IntrospectiveThought(
+                introspective_rewrite=thought_text,
+                reasoning="Error occurred during processing"
+            )
+
+        if raise_on_error and final_state.get("error"):
+            raise IntrospectionError(final_state["error"])
+        return final_state["output"]
+
+    def process_thoughts(
+        self,
+        thought_texts: List[str],
+        max_concurrency: int = 4,
+        messages: List[Sequence[BaseMessage]] | None = None
+    ) -> List[IntrospectiveThought | IntrospectionError]:
+        """
+        Processes many thoughts through one batched graph run.
+
+        Args:
+            thought_texts (List[str]): The original thoughts to transform.
+            max_concurrency (int): Maximum number of model calls in flight at once.
+            messages (List[Sequence[BaseMessage]] | None): Context for each thought, in order.
+
+        Returns:
+            List[IntrospectiveThought | IntrospectionError]: One entry per input, in
+            order. Failed items are returned as IntrospectionError instead of raising
+            so that one bad thought does not sink the whole batch.
+        """
+        contexts = messages or [()] * len(thought_texts)
+        initial_states: List[AgentState] = [
+            {
+                "input_thought": thought_text,
+                "messages": list(context),
+                "output": None,
+                "error": None
+            }
+            for thought_text, context in zip(thought_texts, contexts)
+        ]
+        final_states = self.graph.batch(
+            initial_states,
+            config={"max_concurrency": max_concurrency},
+            return_exceptions=True
+        )
+
+        results: List[IntrospectiveThought | IntrospectionError] = []
+        for final_state in final_states:
+            if isinstance(final_state, Exception):
+                results.append(IntrospectionError(str(final_state)))
+            elif final_state.get("error"):
+                results.append(IntrospectionError(final_state["error"]))
+            else:
+                results.append(final_state["output"])
+        return results
+
+    async def astream_thought(
+        self, thought_text: str, messages: Sequence[BaseMessage] = ()
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streams the introspective version of a thought as it is generated.
+
+        Args:
+            thought_text (str): The original thought to transform.
+            messages (Sequence[BaseMessage]): Context about the user, placed before the thought.
+
+        Yields:
+            Dict[str, Any]: The output fields generated so far. Each dict
+            supersedes the previous one.
+
+        Raises:
+            IntrospectionError: If the model call fails or returns no usable output.
+        """
+        try:
+            async with self.guard.acall(observe_latency=False):
+                async for partial in self.stream_chain.astream({
+                    "input_thought": thought_text,
+                    "messages": list(messages)
+                }):
+                    if partial:
+                        yield partial
+        except Exception as e:
+            raise IntrospectionError(str(e)) from e
+
 # Example Usage
 if __name__ == "__main__":
     agent = IntrospectionAgent()
@@ -0,0 +1,238 @@
+import asyncio
+import json
+import math
+import random
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+import httpx
+import openai
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.output_parsers.openai_tools import JsonOutputKeyToolsParser
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+from langchain_openai import ChatOpenAI
+
+OPENAI = "openai"
+FAKE = "fake"
+
+# z-score of the 99th percentile of a standard normal distribution
+_Z99 = 2.3263
+
+class FakeProviderError(Exception):
+    """
+    A simulated provider failure.
+
+    Attributes:
+        kind (str): One of FakeChatModel.ERROR_KINDS.
+        status_code (int): The HTTP status a real provider would have returned.
+    """
+
+    def __init__(self, kind: str, status_code: int):
+        super().__init__(f"Simulated {kind} ({status_code})")
+        self.kind = kind
+        self.status_code = status_code
+
+class FakeChatModel(BaseChatModel):
+    """
+    Local stand-in for a chat provider, for load tests and development.
+
+    It answers every introspection prompt with a valid IntrospectiveThought
+    tool call, so the workflow, the streaming chain and structured output
+    all behave as they would against OpenAI. Latency is drawn from a
+    log-normal distribution fitted to `latency_p50` and `latency_p99`, which
+    gives the long tail real providers have. `errors` maps an error kind to
+    the probability that a call fails that way.
+    """
+
+    # Error kind -> HTTP status a real provider would have answered with
+    ERROR_KINDS = {
+        "rate_limit": 429,
+        "server_error": 500,
+        "timeout": 504,
+    }
+
+    latency_p50: float = 0.8
+    latency_p99: float = 3.0
+    errors: Dict[str, float] = {}
+    stream_chunk_size: int = 8
+    seed: Optional[int] = None
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        unknown = set(self.errors) - set(self.ERROR_KINDS)
+        if unknown:
+            raise ValueError(f"Unknown fake provider error kinds: {sorted(unknown)}")
+        if sum(self.errors.values()) > 1:
+            raise ValueError("Fake provider error probabilities add up to more than 1")
+        # Not a pydantic field: each model instance owns its generator
+        object.__setattr__(self, "_random", random.Random(self.seed))
+
+    @property
+    def _llm_type(self) -> str:
+        return FAKE
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs) -> "FakeChatModel":
+        # Every answer is already an IntrospectiveThought tool call
+        return self
+
+    def with_structured_output(self, schema, **kwargs) -> Runnable:
+        # PydanticToolsParser in this langchain-core only accepts pydantic v1 models
+        return (
+            self
+            | JsonOutputKeyToolsParser(key_name=schema.__name__, first_tool_only=True)
+            | RunnableLambda(lambda arguments: schema(**arguments))
+        )
+
+    def _draw_latency(self) -> float:
+        if self.latency_p99 <= self.latency_p50:
+            return self.latency_p50
+        sigma = math.log(self.latency_p99 / self.latency_p50) / _Z99
+        return self._random.lognormvariate(math.log(self.latency_p50), sigma)
+
+    def _draw_error(self) -> Optional[FakeProviderError]:
+        roll = self._random.random()
+        for kind, probability in self.errors.items():
+            if roll < probability:
+                return FakeProviderError(kind, self.ERROR_KINDS[kind])
+            roll -= probability
+        return None
+
+    def _arguments(self, messages: List[BaseMessage]) -> str:
+        # The prompt ends with "...introspectively: {input_thought}"
+        thought = str(messages[-1].content).split(": ", 1)[-1]
+        return json.dumps({
+            "introspective_rewrite": f"I wonder about this: {thought}",
+            "reasoning": "Generated by the fake provider.",
+        })
+
+    def _tool_call(self, arguments: str, first: bool = True) -> Dict[str, Any]:
+        return {"tool_calls": [{
+            "index": 0,
+            "id": "call_fake" if first else None,
+            "type": "function",
+            "function": {"name": "IntrospectiveThought" if first else None, "arguments": arguments},
+        }]}
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        arguments = self._arguments(messages)
+        message = AIMessage(content="", additional_kwargs=self._tool_call(arguments))
+        # Word counts stand in for tokens, so usage metrics have something to show
+        usage = {
+            "prompt_tokens": sum(len(str(m.content).split()) for m in messages),
+            "completion_tokens": len(arguments.split()),
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output={"token_usage": usage})
+
+    def _chunks(self, messages: List[BaseMessage]) -> List[str]:
+        arguments = self._arguments(messages)
+        size = self.stream_chunk_size
+        return [arguments[i:i + size] for i in range(0, len(arguments), size)]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        latency, error = self._draw_latency(), self._draw_error()
+        time.sleep(latency)
+        if error is not None:
+            raise error
+        return self._result(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        latency, error = self._draw_latency(), self._draw_error()
+        await asyncio.sleep(latency)
+        if error is not None:
+            raise error
+        return self._result(messages)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        latency, error = self._draw_latency(), self._draw_error()
+        chunks = self._chunks(messages)
+        for position, text in enumerate(chunks):
+            # Spread the latency over the stream, as tokens would arrive
+            time.sleep(latency / len(chunks))
+            if error is not None:
+                raise error
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", additional_kwargs=self._tool_call(text, position == 0)))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        latency, error = self._draw_latency(), self._draw_error()
+        chunks = self._chunks(messages)
+        for position, text in enumerate(chunks):
+            await asyncio.sleep(latency / len(chunks))
+            if error is not None:
+                raise error
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", additional_kwargs=self._tool_call(text, position == 0)))
+
+def create_openai_chat_model(
+    model_name: str,
+    http_client: httpx.Client | None = None,
+    http_async_client: httpx.AsyncClient | None = None,
+    **options: Any
+) -> BaseChatModel:
+    """
+    Creates an OpenAI chat model.
+
+    Args:
+        model_name (str): The OpenAI chat model to use.
+        http_client (httpx.Client | None): Shared connection pool for sync calls.
+        http_async_client (httpx.AsyncClient | None): Shared connection pool for async calls.
+        **options: Extra ChatOpenAI arguments; temperature defaults to 0.7.
+
+    Returns:
+        BaseChatModel: The chat model.
+    """
+    options.setdefault("temperature", 0.7)
+    # Retries belong to the agent's CallPolicy, where the circuit breaker and
+    # the concurrency limiter see each attempt; client retries would hide them
+    options.setdefault("max_retries", 0)
+    if http_client is not None or http_async_client is not None:
+        # ChatOpenAI hands a single http_client to both of its clients, so
+        # build them here to give each the pool of the matching kind
+        client_options = {
+            "api_key": options.get("openai_api_key"),
+            "organization": options.get("openai_organization"),
+            "base_url": options.get("openai_api_base"),
+            "max_retries": options["max_retries"],
+        }
+        if options.get("request_timeout") is not None:
+            client_options["timeout"] = options["request_timeout"]
+        options["client"] = openai.OpenAI(http_client=http_client, **client_options).chat.completions
+        options["async_client"] = openai.AsyncOpenAI(http_client=http_async_client, **client_options).chat.completions
+    return ChatOpenAI(model=model_name, **options)
+
+def create_fake_chat_model(model_name: str, **options: Any) -> BaseChatModel:
+    """
+    Creates the local fake provider; the model name is ignored.
+
+    Args:
+        model_name (str): Unused.
+        **options: FakeChatModel fields such as latency_p50 or errors.
+
+    Returns:
+        BaseChatModel: The chat model.
+    """
+    return FakeChatModel(**options)
+
+# Factories for each provider, keyed by the name used in settings
+PROVIDERS: Dict[str, Callable[..., BaseChatModel]] = {
+    OPENAI: create_openai_chat_model,
+    FAKE: create_fake_chat_model,
+}
+
+def get_provider(name: str) -> Callable[..., BaseChatModel]:
+    """
+    Looks up a chat model factory.
+
+    Args:
+        name (str): A key of PROVIDERS.
+
+    Returns:
+        Callable[..., BaseChatModel]: Factory taking a model name and options.
+
+    Raises:
+        LookupError: If no provider has that name.
+    """
+    try:
+        return PROVIDERS[name]
+    except KeyError:
+        raise LookupError(f"Unknown chat model provider '{name}'") from None
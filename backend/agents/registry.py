@@ -0,0 +1,78 @@
+import threading
+from typing import Any, Callable, Dict
+
+from agents.introspection import IntrospectionAgent
+
+INTROSPECTION = "introspection"
+
+# Factories used to build each agent the first time it is requested
+_factories: Dict[str, Callable[[], Any]] = {
+    INTROSPECTION: IntrospectionAgent,
+}
+
+# Agents built so far in this process, keyed by name
+_agents: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def register_agent(name: str, factory: Callable[[], Any]) -> None:
+    """
+    Registers (or replaces) the factory used to build an agent.
+
+    Any instance already built under that name is discarded so the next
+    lookup picks up the new factory.
+
+    Args:
+        name (str): The agent name.
+        factory (Callable[[], Any]): Zero-argument callable returning the agent.
+    """
+    with _lock:
+        _factories[name] = factory
+        _agents.pop(name, None)
+
+
+def get_agent(name: str = INTROSPECTION) -> Any:
+    """
+    Returns the shared agent for this process, building it on first use.
+
+    Agents are stateless between calls, so one compiled graph and its pooled
+    HTTP client are safely shared by every request thread.
+
+    Args:
+        name (str): The agent name.
+
+    Returns:
+        Any: The shared agent instance.
+    """
+    agent = _agents.get(name)
+    if agent is not None:
+        return agent
+
+    with _lock:
+        agent = _agents.get(name)
+        if agent is None:
+            try:
+                factory = _factories[name]
+            except KeyError:
+                raise LookupError(f"No agent registered under '{name}'") from None
+            agent = factory()
+            _agents[name] = agent
+        return agent
+
+
+def warm_up(*names: str) -> None:
+    """
+    Builds the given agents (all registered agents by default) ahead of the
+    first request.
+    """
+    for name in names or tuple(_factories):
+        get_agent(name)
+
+
+def reset_agents(*names: str) -> None:
+    """Drops built agents (all of them by default) so they are rebuilt lazily."""
+    with _lock:
+        if not names:
+            _agents.clear()
+        for name in names:
+            _agents.pop(name, None)
@@ -0,0 +1,768 @@
+import asyncio
+import logging
+import math
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, TimeoutError as FutureTimeoutError, wait
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Iterator, Optional, Set, Tuple, TypeVar
+
+import httpx
+import openai
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class ModelCallRejected(Exception):
+    """
+    Raised when a model call is refused before it reaches the provider.
+
+    Attributes:
+        reason (str): Why the call was refused, used as a metrics label.
+    """
+
+    reason = "rejected"
+
+class CircuitOpenError(ModelCallRejected):
+    """Raised while the circuit breaker is failing calls fast."""
+
+    reason = "circuit_open"
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Model provider circuit is open; retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class ConcurrencyLimitTimeout(ModelCallRejected):
+    """Raised when a call waited longer than the queue timeout for a slot."""
+
+    reason = "queue_timeout"
+
+    def __init__(self, timeout: float, limit: int):
+        super().__init__(f"No model call slot freed up within {timeout:.1f}s (limit {limit})")
+        self.timeout = timeout
+        self.limit = limit
+
+def status_code_of(error: BaseException) -> Optional[int]:
+    """
+    The HTTP status behind a provider error, if it carries one.
+
+    OpenAI's APIStatusError and the fake provider's errors both expose it
+    as `status_code`; connection errors and timeouts have none.
+    """
+    status_code = getattr(error, "status_code", None)
+    return status_code if isinstance(status_code, int) else None
+
+def is_overload(error: BaseException) -> bool:
+    """Whether the provider asked us to slow down."""
+    return status_code_of(error) == 429
+
+# Errors without an HTTP status that still mean the provider could not be
+# reached or did not answer in time; openai.APITimeoutError is one of these
+TRANSPORT_ERRORS = (TimeoutError, ConnectionError, httpx.TransportError, openai.APIConnectionError)
+
+def is_provider_failure(error: BaseException) -> bool:
+    """
+    Whether an error says the provider is unhealthy.
+
+    Client errors other than timeouts and rate limits are about the request
+    itself, so they do not count against the provider. Neither do errors
+    with no status other than transport failures and timeouts, such as an
+    answer that would not parse.
+    """
+    status_code = status_code_of(error)
+    if status_code is None:
+        return isinstance(error, TRANSPORT_ERRORS)
+    return status_code >= 500 or status_code in (408, 429)
+
+class _Waiter:
+    """A caller queued for a slot; `granted` is only touched under the limiter lock."""
+
+    __slots__ = ("granted", "wake")
+
+    def __init__(self, wake: Callable[[], None]):
+        self.granted = False
+        self.wake = wake
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+class AdaptiveLimiter:
+    """
+    Caps the number of model calls in flight and adapts the cap as it goes.
+
+    The limit follows AIMD: every call that returns in normal time raises it
+    by 1/limit, about one slot per round of calls, and a rate limit answer or
+    a slowdown cuts it by `backoff`. A slowdown is when the recent average
+    latency exceeds `latency_tolerance` times a long-run average that
+    follows improvements quickly and degradations slowly. Comparing
+    averages keeps the long tail of a healthy provider from counting, while
+    a provider that is getting slower keeps cutting the limit until it
+    recovers. Cuts happen at most once per baseline round trip, so one slow
+    burst does not collapse the limit.
+
+    Callers over the limit wait in FIFO order for up to `queue_timeout`
+    seconds. Threads and coroutines share the same slots: threads block on
+    an event, coroutines await a future, and neither holds the lock while
+    waiting.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        queue_timeout: float = 10.0,
+        latency_tolerance: float = 2.0,
+        backoff: float = 0.75,
+        on_limit_change: Optional[Callable[[int], None]] = None
+    ):
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError("Concurrency limits must satisfy 1 <= min <= initial <= max")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.queue_timeout = queue_timeout
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.on_limit_change = on_limit_change
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._baseline: Optional[float] = None
+        self._recent: Optional[float] = None
+        self._last_decrease = float("-inf")
+        self._waiters: Deque[_Waiter] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _try_acquire_locked(self) -> bool:
+        # Queued callers go first, so a newcomer cannot jump the line
+        if not self._waiters and self._in_flight < self.limit:
+            self._in_flight += 1
+            return True
+        return False
+
+    def _grant_locked(self) -> None:
+        while self._waiters and self._in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self._in_flight += 1
+            try:
+                waiter.wake()
+            except RuntimeError:
+                # The waiter's event loop is gone; nobody will use the slot
+                waiter.granted = False
+                self._in_flight -= 1
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Stop waiting; returns True when a slot was granted in the meantime"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def acquire(self, timeout: Optional[float] = None) -> None:
+        """
+        Takes a slot, waiting for one if the limit is reached.
+
+        Args:
+            timeout (float | None): Seconds to wait; defaults to queue_timeout.
+
+        Raises:
+            ConcurrencyLimitTimeout: If no slot freed up in time.
+        """
+        timeout = self.queue_timeout if timeout is None else timeout
+        with self._lock:
+            if self._try_acquire_locked():
+                return
+            event = threading.Event()
+            waiter = _Waiter(event.set)
+            self._waiters.append(waiter)
+
+        event.wait(timeout)
+        if not self._abandon(waiter):
+            raise ConcurrencyLimitTimeout(timeout, self.limit)
+
+    async def aacquire(self, timeout: Optional[float] = None) -> None:
+        """Async version of acquire; waiting never blocks the event loop."""
+        timeout = self.queue_timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._try_acquire_locked():
+                return
+            future = loop.create_future()
+            waiter = _Waiter(lambda: loop.call_soon_threadsafe(_resolve, future))
+            self._waiters.append(waiter)
+
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:
+            # Cancelled while queued: hand back a slot we may have been given
+            if self._abandon(waiter):
+                self.release()
+            raise
+        if not self._abandon(waiter):
+            raise ConcurrencyLimitTimeout(timeout, self.limit)
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False) -> None:
+        """
+        Returns a slot and feeds the call's outcome into the limit.
+
+        Args:
+            latency (float | None): Duration of a successful call, in seconds.
+            overloaded (bool): Whether the provider answered with a rate limit.
+        """
+        with self._lock:
+            self._in_flight -= 1
+            previous = self.limit
+            if overloaded:
+                self._decrease_locked()
+            elif latency is not None:
+                self._observe_locked(latency)
+            self._grant_locked()
+            limit = self.limit
+
+        if limit != previous and self.on_limit_change is not None:
+            self.on_limit_change(limit)
+
+    def _observe_locked(self, latency: float) -> None:
+        if self._baseline is None:
+            self._baseline = self._recent = latency
+        self._recent += 0.1 * (latency - self._recent)
+        if self._recent > self.latency_tolerance * self._baseline:
+            self._decrease_locked()
+        else:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+        # Follow improvements quickly and degradations slowly
+        weight = 0.1 if self._recent < self._baseline else 0.01
+        self._baseline += weight * (self._recent - self._baseline)
+
+    def _decrease_locked(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < (self._baseline or 0):
+            return
+        self._last_decrease = now
+        self._limit = max(self.min_limit, self._limit * self.backoff)
+
+    def stats(self) -> dict:
+        """Current limit, slots in use, queued callers and baseline latency"""
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "queued": len(self._waiters),
+                "baseline_latency": self._baseline,
+                "recent_latency": self._recent,
+            }
+
+class CircuitBreaker:
+    """
+    Fails model calls fast while the provider is failing most of them.
+
+    Outcomes from the last `window` seconds are kept. Once at least
+    `min_calls` of them are in and the share of failures reaches
+    `failure_rate`, the circuit opens and every call is refused for
+    `reset_timeout` seconds. After that it is half open: up to
+    `half_open_calls` trial calls go through, and the first outcome closes
+    the circuit again or reopens it.
+    """
+
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        min_calls: int = 20,
+        window: float = 30.0,
+        reset_timeout: float = 30.0,
+        half_open_calls: int = 1,
+        on_state_change: Optional[Callable[[str], None]] = None
+    ):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.on_state_change = on_state_change
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trials = 0
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._failures = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def before_call(self) -> None:
+        """
+        Lets a call through or refuses it.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half open with all
+                trial calls already under way.
+        """
+        with self._lock:
+            changed = False
+            if self._state == OPEN:
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpenError(remaining)
+                changed = self._set_state_locked(HALF_OPEN)
+                self._trials = 0
+            if self._state == HALF_OPEN:
+                if self._trials >= self.half_open_calls:
+                    raise CircuitOpenError(0)
+                self._trials += 1
+        if changed:
+            self._notify(HALF_OPEN)
+
+    def cancel(self) -> None:
+        """Gives back a call let through by before_call that never ran"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._trials:
+                self._trials -= 1
+
+    def record(self, success: bool) -> None:
+        """Counts the outcome of a call let through by before_call."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                state = CLOSED if success else OPEN
+            elif self._state == CLOSED:
+                self._add_locked(success)
+                state = CLOSED if success or not self._tripped_locked() else OPEN
+            else:
+                # Started before the circuit opened; it no longer matters
+                return
+            changed = self._set_state_locked(state)
+        if changed:
+            self._notify(state)
+
+    def _add_locked(self, success: bool) -> None:
+        now = time.monotonic()
+        self._outcomes.append((now, success))
+        self._failures += not success
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            _, old_success = self._outcomes.popleft()
+            self._failures -= not old_success
+
+    def _tripped_locked(self) -> bool:
+        calls = len(self._outcomes)
+        return calls >= self.min_calls and self._failures / calls >= self.failure_rate
+
+    def _set_state_locked(self, state: str) -> bool:
+        if state == self._state:
+            return False
+        self._state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        else:
+            self._outcomes.clear()
+            self._failures = 0
+        return True
+
+    def _notify(self, state: str) -> None:
+        log = logger.info if state == CLOSED else logger.warning
+        log("Model provider circuit is now %s", state)
+        if self.on_state_change is not None:
+            self.on_state_change(state)
+
+class ModelCallGuard:
+    """
+    Runs model calls through a circuit breaker and an adaptive limiter.
+
+    The breaker is asked first so an open circuit fails at once instead of
+    queueing. Refused calls raise a ModelCallRejected subclass, which callers
+    treat like any other failed model call. Either part may be left out.
+    """
+
+    def __init__(
+        self,
+        limiter: Optional[AdaptiveLimiter] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        on_reject: Optional[Callable[[str], None]] = None
+    ):
+        self.limiter = limiter
+        self.breaker = breaker
+        self.on_reject = on_reject
+
+    def _reject(self, error: ModelCallRejected) -> None:
+        if self.on_reject is not None:
+            self.on_reject(error.reason)
+
+    def _admit(self) -> None:
+        if self.breaker is not None:
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError as e:
+                self._reject(e)
+                raise
+
+    def _refused(self, error: ModelCallRejected) -> None:
+        if self.breaker is not None:
+            self.breaker.cancel()
+        self._reject(error)
+
+    def _settle(self, started: float, error: Optional[BaseException], observe_latency: bool) -> None:
+        if isinstance(error, Exception):
+            if self.limiter is not None:
+                self.limiter.release(overloaded=is_overload(error))
+            if self.breaker is not None:
+                self.breaker.record(not is_provider_failure(error))
+        elif error is not None:
+            # Cancelled or interrupted: says nothing about the provider
+            if self.limiter is not None:
+                self.limiter.release()
+            if self.breaker is not None:
+                self.breaker.cancel()
+        else:
+            if self.limiter is not None:
+                self.limiter.release(time.monotonic() - started if observe_latency else None)
+            if self.breaker is not None:
+                self.breaker.record(True)
+
+    @contextmanager
+    def call(self, observe_latency: bool = True) -> Iterator[None]:
+        """
+        Wraps one model call.
+
+        Args:
+            observe_latency (bool): Feed the call's duration into the limiter;
+                turn off for streams, whose duration is not a round trip.
+
+        Raises:
+            ModelCallRejected: If the call may not go ahead.
+        """
+        self._admit()
+        if self.limiter is not None:
+            try:
+                self.limiter.acquire()
+            except ConcurrencyLimitTimeout as e:
+                self._refused(e)
+                raise
+
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            self._settle(started, e, observe_latency)
+            raise
+        self._settle(started, None, observe_latency)
+
+    @asynccontextmanager
+    async def acall(self, observe_latency: bool = True) -> AsyncIterator[None]:
+        """Async version of call; waiting for a slot never blocks the event loop."""
+        self._admit()
+        if self.limiter is not None:
+            try:
+                await self.limiter.aacquire()
+            except ConcurrencyLimitTimeout as e:
+                self._refused(e)
+                raise
+            except BaseException:
+                if self.breaker is not None:
+                    self.breaker.cancel()
+                raise
+
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            self._settle(started, e, observe_latency)
+            raise
+        self._settle(started, None, observe_latency)
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Whether a failed model call is worth trying again.
+
+    Provider failures are, refused calls are not: the breaker or the limiter
+    has already decided, and retrying would only defeat them.
+    """
+    return not isinstance(error, ModelCallRejected) and is_provider_failure(error)
+
+class RetryPolicy:
+    """
+    Retries transient failures with jittered exponential backoff.
+
+    The n-th retry waits a random time between zero and
+    min(max_delay, base_delay * 2 ** (n - 1)) seconds ("full jitter"), so
+    callers that failed together do not all come back at the same moment.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        retry_on: Callable[[BaseException], bool] = is_transient
+    ):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+
+    def should_retry(self, error: BaseException, attempt: int) -> bool:
+        return attempt < self.max_attempts and isinstance(error, Exception) and self.retry_on(error)
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait after the given attempt (1-based) failed."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+class HedgePolicy:
+    """
+    Decides when to send a duplicate of a call that is taking too long.
+
+    Latencies of recent successful calls are kept, and once `min_samples`
+    are in, a call still running after their `quantile` gets a hedged twin;
+    whichever answers first wins. Hedges are paid for from a budget that
+    grows by `budget` per call, so at most that share of extra calls is
+    sent even if the provider slows down as a whole.
+    """
+
+    def __init__(
+        self,
+        quantile: float = 0.95,
+        min_samples: int = 20,
+        window: int = 500,
+        min_delay: float = 0.05,
+        budget: float = 0.1
+    ):
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.budget = budget
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, latency: float) -> None:
+        with self._lock:
+            self._samples.append(latency)
+
+    def delay(self) -> Optional[float]:
+        """
+        How long to wait before hedging a call that just started.
+
+        Returns:
+            float | None: Seconds, or None while too few latencies are known.
+        """
+        with self._lock:
+            # Every call earns a little budget, capped so an idle spell cannot save up a burst
+            self._tokens = min(self._tokens + self.budget, max(1.0, self.budget * 10))
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        position = min(len(ordered) - 1, math.ceil(self.quantile * len(ordered)) - 1)
+        return max(self.min_delay, ordered[position])
+
+    def try_spend(self) -> bool:
+        """Takes one hedge from the budget, if there is one left."""
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+class CallPolicy:
+    """
+    Retries and hedging for a model call; either may be left out.
+
+    Every attempt, hedged ones included, calls the function it is given
+    afresh, so each goes through the ModelCallGuard on its own. Sync hedges
+    run on a small thread pool, and an attempt is only handed to it while
+    one of its threads is free: time spent queued behind other calls would
+    otherwise count towards the hedge delay. When none is free the call runs
+    unhedged. A losing sync attempt cannot be interrupted and finishes in
+    the background, while a losing async attempt is cancelled.
+
+    Args:
+        retry (RetryPolicy | None): Retries for transient failures.
+        hedge (HedgePolicy | None): Hedged requests for slow calls.
+        on_event (Callable[[str], None] | None): Told about every "retry",
+            "hedge" and "hedge_won", e.g. for metrics.
+        max_workers (int): Threads available to sync hedged calls.
+    """
+
+    def __init__(
+        self,
+        retry: Optional[RetryPolicy] = None,
+        hedge: Optional[HedgePolicy] = None,
+        on_event: Optional[Callable[[str], None]] = None,
+        max_workers: int = 16
+    ):
+        self.retry = retry
+        self.hedge = hedge
+        self.on_event = on_event
+        self.max_workers = max_workers
+        self._executor: Optional[ContextThreadPoolExecutor] = None
+        # Pool threads not running an attempt
+        self._free = threading.BoundedSemaphore(max_workers)
+        self._lock = threading.Lock()
+
+    def _emit(self, event: str) -> None:
+        if self.on_event is not None:
+            self.on_event(event)
+
+    def _get_executor(self) -> ContextThreadPoolExecutor:
+        # Started on first hedge so processes that never hedge never spawn threads
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ContextThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="hedge"
+                    )
+        return self._executor
+
+    def _try_submit(self, fn: Callable[[], T], admit: Optional[Callable[[], bool]] = None) -> Optional[Future]:
+        """
+        Starts an attempt on the pool if a thread is free and `admit` agrees.
+
+        Returns:
+            Future | None: The attempt, or None if it was not started.
+        """
+        if not self._free.acquire(blocking=False):
+            return None
+        if admit is not None and not admit():
+            self._free.release()
+            return None
+        try:
+            future = self._get_executor().submit(self._timed, fn)
+        except BaseException:
+            self._free.release()
+            raise
+        future.add_done_callback(lambda _: self._free.release())
+        return future
+
+    def run(self, fn: Callable[[], T]) -> T:
+        """
+        Calls `fn` under the policy.
+
+        Returns:
+            The first successful result.
+
+        Raises:
+            Exception: The last failure, once retries are exhausted or the
+                failure is not worth retrying.
+        """
+        attempt = 1
+        while True:
+            try:
+                return self._run_hedged(fn)
+            except Exception as e:
+                if self.retry is None or not self.retry.should_retry(e, attempt):
+                    raise
+                delay = self.retry.delay(attempt)
+                logger.info("Model call attempt %s failed (%s); retrying in %.2fs", attempt, e, delay)
+                self._emit("retry")
+                time.sleep(delay)
+                attempt += 1
+
+    async def arun(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Async version of run; backoff and hedging never block the event loop."""
+        attempt = 1
+        while True:
+            try:
+                return await self._arun_hedged(fn)
+            except Exception as e:
+                if self.retry is None or not self.retry.should_retry(e, attempt):
+                    raise
+                delay = self.retry.delay(attempt)
+                logger.info("Model call attempt %s failed (%s); retrying in %.2fs", attempt, e, delay)
+                self._emit("retry")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def _timed(self, fn: Callable[[], T]) -> T:
+        started = time.monotonic()
+        result = fn()
+        if self.hedge is not None:
+            self.hedge.observe(time.monotonic() - started)
+        return result
+
+    async def _atimed(self, fn: Callable[[], Awaitable[T]]) -> T:
+        started = time.monotonic()
+        result = await fn()
+        if self.hedge is not None:
+            self.hedge.observe(time.monotonic() - started)
+        return result
+
+    def _run_hedged(self, fn: Callable[[], T]) -> T:
+        delay = self.hedge.delay() if self.hedge is not None else None
+        if delay is None:
+            return self._timed(fn)
+
+        first = self._try_submit(fn)
+        if first is None:
+            return self._timed(fn)
+        try:
+            return first.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+        second = self._try_submit(fn, self.hedge.try_spend)
+        if second is None:
+            return first.result()
+
+        self._emit("hedge")
+        return self._first_success({first, second}, second)
+
+    def _first_success(self, pending: Set[Future], hedged: Future) -> Any:
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedged:
+                        self._emit("hedge_won")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _arun_hedged(self, fn: Callable[[], Awaitable[T]]) -> T:
+        delay = self.hedge.delay() if self.hedge is not None else None
+        if delay is None:
+            return await self._atimed(fn)
+
+        first = asyncio.ensure_future(self._atimed(fn))
+        pending = {first}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done or not self.hedge.try_spend():
+                return await first
+
+            self._emit("hedge")
+            hedged = asyncio.ensure_future(self._atimed(fn))
+            pending.add(hedged)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedged:
+                            self._emit("hedge_won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The loser, or everything if we were cancelled
+            for task in pending:
+                task.cancel()
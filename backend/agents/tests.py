@@ -0,0 +1,249 @@
+import asyncio
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from .resilience import (
+    CLOSED, HALF_OPEN, OPEN, AdaptiveLimiter, CallPolicy, CircuitBreaker, CircuitOpenError,
+    ConcurrencyLimitTimeout, HedgePolicy, ModelCallGuard, RetryPolicy
+)
+
+class ProviderError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+class AdaptiveLimiterTests(SimpleTestCase):
+    def test_callers_over_the_limit_time_out(self):
+        limiter = AdaptiveLimiter(initial_limit=2, queue_timeout=0.01)
+        limiter.acquire()
+        limiter.acquire()
+
+        with self.assertRaises(ConcurrencyLimitTimeout):
+            limiter.acquire()
+        self.assertEqual(limiter.stats()['queued'], 0)
+
+    def test_released_slot_goes_to_the_waiting_caller(self):
+        limiter = AdaptiveLimiter(initial_limit=1, min_limit=1, queue_timeout=5)
+        limiter.acquire()
+        waiter = threading.Thread(target=limiter.acquire)
+        waiter.start()
+        while limiter.stats()['queued'] == 0:
+            time.sleep(0.01)
+
+        limiter.release()
+        waiter.join(5)
+
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(limiter.in_flight, 1)
+
+    def test_limit_grows_with_healthy_calls_and_shrinks_on_rate_limits(self):
+        limiter = AdaptiveLimiter(initial_limit=8, backoff=0.75)
+        for _ in range(20):
+            limiter.acquire()
+            limiter.release(latency=0.01)
+        grown = limiter.limit
+        self.assertGreater(grown, 8)
+
+        limiter.acquire()
+        limiter.release(overloaded=True)
+
+        self.assertEqual(limiter.limit, int(grown * 0.75))
+
+    def test_cancelled_async_waiter_gives_up_its_place(self):
+        limiter = AdaptiveLimiter(initial_limit=1, min_limit=1, queue_timeout=5)
+
+        async def cancel_waiter():
+            await limiter.aacquire()
+            waiter = asyncio.ensure_future(limiter.aacquire())
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            limiter.release()
+
+        asyncio.run(cancel_waiter())
+
+        self.assertEqual(limiter.stats()['in_flight'], 0)
+        self.assertEqual(limiter.stats()['queued'], 0)
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.states = []
+        self.breaker = CircuitBreaker(
+            failure_rate=0.5, min_calls=4, reset_timeout=0.05, on_state_change=self.states.append
+        )
+
+    def _record(self, *outcomes):
+        for success in outcomes:
+            self.breaker.before_call()
+            self.breaker.record(success)
+
+    def test_opens_once_enough_calls_fail(self):
+        self._record(True, True, False)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+        self._record(False)
+
+        self.assertEqual(self.breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_trial_call_closes_or_reopens_the_circuit(self):
+        self._record(False, False, False, False)
+        time.sleep(0.06)
+
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        # Only one trial at a time
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, OPEN)
+
+        time.sleep(0.06)
+        self._record(True)
+
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertEqual(self.states, [OPEN, HALF_OPEN, OPEN, HALF_OPEN, CLOSED])
+
+class ModelCallGuardTests(SimpleTestCase):
+    def setUp(self):
+        self.rejections = []
+        self.limiter = AdaptiveLimiter(initial_limit=1, min_limit=1, queue_timeout=0.01)
+        self.breaker = CircuitBreaker(min_calls=1, reset_timeout=30)
+        self.guard = ModelCallGuard(self.limiter, self.breaker, on_reject=self.rejections.append)
+
+    def test_open_circuit_fails_fast_without_taking_a_slot(self):
+        with self.assertRaises(ProviderError):
+            with self.guard.call():
+                raise ProviderError(503)
+
+        with self.assertRaises(CircuitOpenError):
+            with self.guard.call():
+                pass
+
+        self.assertEqual(self.limiter.in_flight, 0)
+        self.assertEqual(self.rejections, ['circuit_open'])
+
+    def test_request_errors_do_not_trip_the_breaker(self):
+        with self.assertRaises(ProviderError):
+            with self.guard.call():
+                raise ProviderError(400)
+
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_call_refused_a_slot_is_counted(self):
+        self.limiter.acquire()
+
+        with self.assertRaises(ConcurrencyLimitTimeout):
+            with self.guard.call():
+                pass
+
+        self.assertEqual(self.rejections, ['queue_timeout'])
+
+class RetryPolicyTests(SimpleTestCase):
+    def setUp(self):
+        self.events = []
+        self.policy = CallPolicy(retry=RetryPolicy(max_attempts=3, base_delay=0), on_event=self.events.append)
+        self.calls = 0
+
+    def _failing(self, *errors):
+        errors = list(errors)
+
+        def call():
+            self.calls += 1
+            if errors:
+                raise errors.pop(0)
+            return 'answer'
+        return call
+
+    def test_transient_failures_are_retried(self):
+        self.assertEqual(self.policy.run(self._failing(ProviderError(503), ProviderError(429))), 'answer')
+        self.assertEqual(self.events, ['retry', 'retry'])
+
+    def test_gives_up_after_max_attempts(self):
+        with self.assertRaises(ProviderError):
+            self.policy.run(self._failing(*(ProviderError(503) for _ in range(3))))
+        self.assertEqual(self.calls, 3)
+
+    def test_request_errors_and_refusals_are_not_retried(self):
+        for error in (ProviderError(400), ValueError('unparseable answer'), CircuitOpenError(30)):
+            with self.subTest(error=error), self.assertRaises(type(error)):
+                self.policy.run(self._failing(error))
+        self.assertEqual(self.calls, 3)
+
+    def test_async_failures_are_retried(self):
+        call = self._failing(ProviderError(503))
+
+        async def acall():
+            return call()
+
+        self.assertEqual(asyncio.run(self.policy.arun(acall)), 'answer')
+        self.assertEqual(self.calls, 2)
+
+    def test_backoff_is_jittered_under_a_growing_cap(self):
+        retry = RetryPolicy(base_delay=0.5, max_delay=1.5)
+        for attempt, cap in ((1, 0.5), (2, 1.0), (3, 1.5), (6, 1.5)):
+            delays = [retry.delay(attempt) for _ in range(50)]
+            self.assertTrue(all(0 <= delay <= cap for delay in delays))
+
+class HedgePolicyTests(SimpleTestCase):
+    def setUp(self):
+        self.events = []
+        self.hedge = HedgePolicy(min_samples=5, min_delay=0.01, budget=1)
+        for _ in range(5):
+            self.hedge.observe(0.02)
+        self.policy = CallPolicy(hedge=self.hedge, on_event=self.events.append, max_workers=2)
+        self.addCleanup(lambda: self.policy._executor and self.policy._executor.shutdown(wait=True))
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def test_delay_waits_for_enough_samples(self):
+        hedge = HedgePolicy(min_samples=3, quantile=0.5, min_delay=0)
+        hedge.observe(0.1)
+        self.assertIsNone(hedge.delay())
+        hedge.observe(0.3)
+        hedge.observe(0.2)
+        self.assertEqual(hedge.delay(), 0.2)
+
+    def test_budget_caps_extra_calls(self):
+        hedge = HedgePolicy(budget=0.1)
+        hedge.delay()
+        self.assertFalse(hedge.try_spend())
+        # One hedge per ten calls, and idle calls do not save up more
+        for _ in range(30):
+            hedge.delay()
+        self.assertTrue(hedge.try_spend())
+        self.assertFalse(hedge.try_spend())
+
+    def test_slow_call_is_hedged_and_the_first_answer_wins(self):
+        def call():
+            with self.lock:
+                self.calls += 1
+                first = self.calls == 1
+            if first:
+                time.sleep(0.5)
+                return 'slow'
+            return 'fast'
+
+        self.assertEqual(self.policy.run(call), 'fast')
+        self.assertEqual(self.events, ['hedge', 'hedge_won'])
+
+    def test_slow_async_call_is_hedged_and_the_loser_cancelled(self):
+        cancelled = []
+
+        async def call():
+            self.calls += 1
+            if self.calls == 1:
+                try:
+                    await asyncio.sleep(0.5)
+                except asyncio.CancelledError:
+                    cancelled.append(True)
+                    raise
+                return 'slow'
+            return 'fast'
+
+        self.assertEqual(asyncio.run(self.policy.arun(call)), 'fast')
+        self.assertEqual(self.events, ['hedge', 'hedge_won'])
+        self.assertEqual(cancelled, [True])
@@ -4,3 +4,10 @@ class GeminiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.agent_integrations.gemini'
     verbose_name = 'Gemini Integration'
+
+    def ready(self):
+        from you_backend.lifespan import on_shutdown, on_startup
+        from .tokens import gemini_tokens
+
+        on_startup(gemini_tokens.startup)
+        on_shutdown(gemini_tokens.shutdown)
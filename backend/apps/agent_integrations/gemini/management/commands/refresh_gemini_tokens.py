@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.agent_integrations.gemini.tokens import gemini_tokens
+
+class Command(BaseCommand):
+    help = "Refresh Gemini access tokens that are about to expire (the scheduler for GEMINI_TOKEN_SCHEDULER=off)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep refreshing as tokens come due")
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help="Seconds between runs; defaults to GEMINI_TOKENS['INTERVAL']"
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or gemini_tokens.interval
+
+        while True:
+            refreshed = gemini_tokens.refresh_due()
+            if refreshed:
+                self.stdout.write(f"Refreshed {refreshed} token(s)")
+
+            if not options['loop']:
+                break
+            time.sleep(interval)
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.6 on 2026-10-18 20:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeminiIntegration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('api_key', models.CharField(max_length=512)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='gemini_integration', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Gemini Integration',
+                'verbose_name_plural': 'Gemini Integrations',
+            },
+        ),
+        migrations.CreateModel(
+            name='GeminiConfig',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_preference', models.CharField(choices=[('gemini-pro', 'Gemini Pro'), ('gemini-pro-vision', 'Gemini Pro Vision')], default='gemini-pro', max_length=50)),
+                ('temperature', models.FloatField(default=0.7)),
+                ('max_output_tokens', models.IntegerField(default=2048)),
+                ('top_p', models.FloatField(default=0.95)),
+                ('top_k', models.IntegerField(default=40)),
+                ('integration', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='config', to='gemini.geminiintegration')),
+            ],
+            options={
+                'verbose_name': 'Gemini Configuration',
+                'verbose_name_plural': 'Gemini Configurations',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 20:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gemini', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geminiintegration',
+            name='access_token',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='geminiintegration',
+            name='refresh_token',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='geminiintegration',
+            name='token_expiry',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
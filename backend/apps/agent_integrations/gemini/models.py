@@ -10,6 +10,10 @@ class GeminiIntegration(models.Model):
         related_name='gemini_integration'
     )
     api_key = models.CharField(max_length=512)
+    # OAuth tokens, kept fresh by GeminiTokenStore
+    access_token = models.TextField(blank=True, default='')
+    refresh_token = models.TextField(blank=True, default='')
+    token_expiry = models.DateTimeField(null=True, blank=True, db_index=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
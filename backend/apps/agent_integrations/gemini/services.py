@@ -1,12 +1,15 @@
 import os
 from datetime import datetime, timedelta
 from typing import Dict, Optional, Tuple
-import google.auth.transport.requests
 from google.oauth2.credentials import Credentials
 from google.auth.exceptions import RefreshError
 from django.conf import settings
+from django.utils import timezone
+from apps.outbound.clients import outbound_http
 from .models import GeminiIntegration
 
+TOKEN_URL = "https://oauth2.googleapis.com/token"
+
 class GeminiAuthService:
     """Service for handling Gemini authentication"""
 
@@ -40,8 +43,6 @@ class GeminiAuthService:
 
     async def exchange_code_for_tokens(self, code: str) -> Dict[str, str]:
         """Exchange authorization code for access and refresh tokens"""
-        token_url = "https://oauth2.googleapis.com/token"
-
         data = {
             "client_id": self.client_id,
             "client_secret": self.client_secret,
@@ -50,56 +51,57 @@ class GeminiAuthService:
             "redirect_uri": self.redirect_uri
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(token_url, data=data)
-            response.raise_for_status()
-            return response.json()
+        response = await outbound_http.aclient().post(TOKEN_URL, data=data)
+        response.raise_for_status()
+        return response.json()
 
     def create_credentials(self, tokens: Dict[str, str]) -> Credentials:
         """Create Google Credentials object from tokens"""
         return Credentials(
             token=tokens["access_token"],
             refresh_token=tokens.get("refresh_token"),
-            token_uri="https://oauth2.googleapis.com/token",
+            token_uri=TOKEN_URL,
             client_id=self.client_id,
             client_secret=self.client_secret,
             scopes=self.SCOPES
         )
 
     async def refresh_access_token(self, integration: GeminiIntegration) -> Tuple[str, datetime]:
-        """Refresh the access token using the refresh token"""
-        credentials = Credentials(
-            token=integration.access_token,
-            refresh_token=integration.refresh_token,
-            token_uri="https://oauth2.googleapis.com/token",
-            client_id=self.client_id,
-            client_secret=self.client_secret,
-            scopes=self.SCOPES
-        )
+        """
+        Refresh the access token using the refresh token
 
-        try:
-            request = google.auth.transport.requests.Request()
-            credentials.refresh(request)
-            expiry = datetime.utcnow() + timedelta(seconds=credentials.expiry.timestamp() - datetime.now().timestamp())
-            return credentials.token, expiry
-        except RefreshError:
+        The token endpoint is called through the shared async connection pool
+        rather than google-auth's blocking transport, so the event loop is
+        never held and the TLS connection to Google is reused.
+
+        Raises:
+            RefreshError: If Google rejected the refresh token; the integration is deactivated
+        """
+        data = {
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "refresh_token": integration.refresh_token,
+            "grant_type": "refresh_token"
+        }
+
+        response = await outbound_http.aclient().post(TOKEN_URL, data=data)
+
+        if response.status_code in (400, 401):
             integration.is_active = False
-            integration.save()
-            raise
+            await integration.asave(update_fields=['is_active', 'updated_at'])
+            raise RefreshError(response.text)
+        response.raise_for_status()
+
+        tokens = response.json()
+        expiry = timezone.now() + timedelta(seconds=tokens.get("expires_in", 3600))
+        return tokens["access_token"], expiry
 
     async def validate_token(self, integration: GeminiIntegration) -> Optional[str]:
-        """Validate and refresh token if necessary"""
-        if not integration.is_active:
-            return None
-
-        if integration.token_expiry <= datetime.utcnow():
-            try:
-                new_token, new_expiry = await self.refresh_access_token(integration)
-                integration.access_token = new_token
-                integration.token_expiry = new_expiry
-                integration.save()
-                return new_token
-            except RefreshError:
-                return None
-
-        return integration.access_token
+        """
+        A valid access token for the integration, or None if it cannot have one
+
+        Served from the token store, which refreshes tokens ahead of expiry
+        so this rarely waits on Google.
+        """
+        from .tokens import gemini_tokens
+        return await gemini_tokens.aget_token(integration)
@@ -0,0 +1,88 @@
+import asyncio
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from google.auth.exceptions import RefreshError
+
+from .models import GeminiIntegration
+from .tokens import GeminiTokenStore
+
+User = get_user_model()
+
+class GeminiTokenStoreTests(TestCase):
+    def setUp(self):
+        self.store = GeminiTokenStore(refresh_ahead=300, scheduler='off', idle_after=3600)
+        self.new_expiry = timezone.now() + timedelta(hours=1)
+        self.store._auth = mock.Mock()
+        self.store._auth.refresh_access_token = mock.AsyncMock(side_effect=self._refresh)
+
+    async def _refresh(self, integration):
+        await asyncio.sleep(0.01)
+        return 'new-token', self.new_expiry
+
+    def create_integration(self, expires_in, username='gemini'):
+        return GeminiIntegration.objects.create(
+            user=User.objects.create(username=username),
+            api_key='key',
+            access_token='old-token',
+            refresh_token='refresh-token',
+            token_expiry=timezone.now() + timedelta(seconds=expires_in)
+        )
+
+    async def _acreate(self, expires_in):
+        return await sync_to_async(self.create_integration)(expires_in)
+
+    async def test_fresh_token_is_served_without_a_refresh(self):
+        integration = await self._acreate(3600)
+
+        self.assertEqual(await self.store.aget_token(integration), 'old-token')
+        self.store._auth.refresh_access_token.assert_not_called()
+
+    async def test_token_about_to_expire_is_refreshed_in_the_background(self):
+        integration = await self._acreate(60)
+
+        self.assertEqual(await self.store.aget_token(integration), 'old-token')
+        await asyncio.gather(*self.store._tasks)
+
+        await integration.arefresh_from_db()
+        self.assertEqual(integration.access_token, 'new-token')
+        self.assertEqual(await self.store.aget_token(integration), 'new-token')
+
+    async def test_concurrent_requests_for_an_expired_token_share_one_refresh(self):
+        integration = await self._acreate(-60)
+
+        tokens = await asyncio.gather(*(self.store.aget_token(integration) for _ in range(3)))
+
+        self.assertEqual(tokens, ['new-token'] * 3)
+        self.store._auth.refresh_access_token.assert_awaited_once()
+
+    async def test_refused_refresh_gives_no_token(self):
+        integration = await self._acreate(-60)
+        self.store._auth.refresh_access_token.side_effect = RefreshError('invalid_grant')
+
+        self.assertIsNone(await self.store.aget_token(integration))
+        self.assertIsNone(self.store._cached(integration.pk))
+
+    def test_refresh_due_only_refreshes_tokens_near_expiry(self):
+        due = self.create_integration(60, 'due')
+        self.create_integration(3600, 'fresh')
+        GeminiIntegration.objects.filter(pk=self.create_integration(60, 'inactive').pk).update(is_active=False)
+
+        self.assertEqual(self.store.refresh_due([]), 0)
+        self.assertEqual(self.store.refresh_due(), 1)
+
+        due.refresh_from_db()
+        self.assertEqual(due.access_token, 'new-token')
+
+    def test_idle_integrations_are_forgotten(self):
+        self.store._touch(1)
+        self.store._remember(1, 'token', self.new_expiry)
+        self.assertEqual(self.store.recently_used(), [1])
+
+        with mock.patch('apps.agent_integrations.gemini.tokens.time.monotonic', return_value=10 ** 9):
+            self.assertEqual(self.store.recently_used(), [])
+        self.assertIsNone(self.store._cached(1))
@@ -0,0 +1,269 @@
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from google.auth.exceptions import RefreshError
+
+from apps.outbound.clients import outbound_http
+from apps.thoughts.singleflight import SingleFlight
+from .models import GeminiIntegration
+from .services import GeminiAuthService
+
+logger = logging.getLogger(__name__)
+
+class GeminiTokenStore:
+    """
+    Hands out Gemini access tokens without an OAuth round trip on the request path.
+
+    Tokens are persisted on the integration and kept in a process-local
+    cache. A scheduler refreshes the tokens due to expire within
+    `refresh_ahead` seconds, and a request that finds its token in that
+    window gets the current token while a refresh starts in the background.
+    Only a token that has already expired is refreshed inline.
+
+    The scheduler thread only refreshes integrations this process has
+    served within `idle_after` seconds, so N processes do not each keep
+    every integration fresh; one left idle longer is refreshed inline on
+    its next use.
+
+    Refreshes of one integration are coalesced, so a burst of requests or
+    several schedulers make a single call to Google. With `lock_cache` set
+    this holds across processes too.
+
+    Schedulers:
+        thread: a daemon thread in each process, started with the server
+        off: run `manage.py refresh_gemini_tokens --loop` instead, which
+            refreshes every active integration from one process
+    """
+
+    SCHEDULERS = ('thread', 'off')
+
+    def __init__(
+        self,
+        refresh_ahead: float = 300,
+        scheduler: str = 'thread',
+        interval: float = 60,
+        idle_after: float = 3600,
+        lock_cache=None
+    ):
+        if scheduler not in self.SCHEDULERS:
+            raise ValueError(f"Unknown Gemini token scheduler: {scheduler}")
+        self.refresh_ahead = timedelta(seconds=refresh_ahead)
+        self.scheduler = scheduler
+        self.interval = interval
+        self.idle_after = idle_after
+        self._auth = GeminiAuthService()
+        self._flights = SingleFlight(lock_cache=lock_cache)
+        self._tokens: Dict[int, Tuple[str, datetime]] = {}
+        # Integration id -> time.monotonic() of its last request in this process
+        self._used: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+        self._tasks: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_settings(cls):
+        options = settings.GEMINI_TOKENS
+        return cls(
+            refresh_ahead=options.get('REFRESH_AHEAD', 300),
+            scheduler=options.get('SCHEDULER', 'thread'),
+            interval=options.get('INTERVAL', 60),
+            idle_after=options.get('IDLE_AFTER', 3600),
+            lock_cache=options.get('LOCK_CACHE'),
+        )
+
+    def _cached(self, integration_id: int) -> Optional[Tuple[str, datetime]]:
+        with self._lock:
+            return self._tokens.get(integration_id)
+
+    def _remember(self, integration_id: int, token: str, expiry: datetime) -> None:
+        with self._lock:
+            self._tokens[integration_id] = (token, expiry)
+
+    def discard(self, integration_id: int) -> None:
+        """Forget a cached token, e.g. when the integration is disconnected"""
+        with self._lock:
+            self._tokens.pop(integration_id, None)
+            self._used.pop(integration_id, None)
+
+    def _touch(self, integration_id: int) -> None:
+        with self._lock:
+            self._used[integration_id] = time.monotonic()
+
+    def recently_used(self) -> List[int]:
+        """
+        Integrations this process served within idle_after, forgetting the rest
+
+        Returns:
+            list: Integration ids
+        """
+        cutoff = time.monotonic() - self.idle_after
+        with self._lock:
+            for integration_id in [i for i, used in self._used.items() if used < cutoff]:
+                del self._used[integration_id]
+                self._tokens.pop(integration_id, None)
+            return list(self._used)
+
+    async def aget_token(self, integration: GeminiIntegration) -> Optional[str]:
+        """
+        A valid access token for the integration
+
+        Returns:
+            str | None: The token, or None if the integration is inactive or
+            Google refused to refresh it
+        """
+        if not integration.is_active:
+            self.discard(integration.pk)
+            return None
+        self.start()
+        self._touch(integration.pk)
+
+        cached = self._cached(integration.pk)
+        if cached is None and integration.access_token and integration.token_expiry:
+            cached = (integration.access_token, integration.token_expiry)
+            self._remember(integration.pk, *cached)
+
+        now = timezone.now()
+        if cached is not None and cached[1] > now:
+            if cached[1] - now <= self.refresh_ahead:
+                self._refresh_in_background(integration.pk)
+            return cached[0]
+
+        # Already expired: the scheduler fell behind, so this request has to wait
+        try:
+            token, _ = await self.arefresh(integration.pk)
+        except RefreshError:
+            return None
+        return token
+
+    def _refresh_in_background(self, integration_id: int) -> None:
+        task = asyncio.get_running_loop().create_task(self._arefresh_quietly(integration_id))
+        # The loop only keeps weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _arefresh_quietly(self, integration_id: int) -> None:
+        try:
+            await self.arefresh(integration_id)
+        except Exception as err:
+            logger.warning(f"Background refresh of Gemini integration {integration_id} failed: {err}")
+
+    async def arefresh(self, integration_id: int) -> Tuple[str, datetime]:
+        """
+        Refresh an integration's access token, once for all concurrent callers
+
+        Raises:
+            RefreshError: If the integration is inactive or Google refused the refresh token
+        """
+        return await self._flights.ado(f'gemini-token:{integration_id}', lambda: self._arefresh(integration_id))
+
+    async def _arefresh(self, integration_id: int) -> Tuple[str, datetime]:
+        integration = await GeminiIntegration.objects.filter(pk=integration_id, is_active=True).afirst()
+        if integration is None or not integration.refresh_token:
+            self.discard(integration_id)
+            raise RefreshError(f"Gemini integration {integration_id} cannot be refreshed")
+
+        # Another process may have refreshed it while we waited for the lock
+        if integration.access_token and integration.token_expiry \
+                and integration.token_expiry - timezone.now() > self.refresh_ahead:
+            self._remember(integration_id, integration.access_token, integration.token_expiry)
+            return integration.access_token, integration.token_expiry
+
+        try:
+            token, expiry = await self._auth.refresh_access_token(integration)
+        except RefreshError:
+            self.discard(integration_id)
+            raise
+        integration.access_token = token
+        integration.token_expiry = expiry
+        await integration.asave(update_fields=['access_token', 'token_expiry', 'updated_at'])
+        self._remember(integration_id, token, expiry)
+        return token, expiry
+
+    def refresh_due(self, integration_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        Refresh the active tokens expiring within refresh_ahead
+
+        Runs on an event loop of its own, whose connection pool is closed
+        before it returns.
+
+        Args:
+            integration_ids: Only consider these integrations; all active ones if None
+
+        Returns:
+            int: Number of tokens refreshed
+        """
+        async def refresh():
+            try:
+                return await self.arefresh_due(integration_ids)
+            finally:
+                await outbound_http.aclose_loop_client()
+        return async_to_sync(refresh)()
+
+    async def arefresh_due(self, integration_ids: Optional[Iterable[int]] = None) -> int:
+        """Async version of refresh_due, using the running loop's connection pool"""
+        integrations = GeminiIntegration.objects.filter(
+            is_active=True,
+            token_expiry__lt=timezone.now() + self.refresh_ahead
+        ).exclude(refresh_token='')
+        if integration_ids is not None:
+            integration_ids = list(integration_ids)
+            if not integration_ids:
+                return 0
+            integrations = integrations.filter(id__in=integration_ids)
+        due = [integration_id async for integration_id in integrations.values_list('id', flat=True)]
+        refreshed = 0
+        for integration_id in due:
+            try:
+                await self.arefresh(integration_id)
+                refreshed += 1
+            except Exception as err:
+                logger.warning(f"Scheduled refresh of Gemini integration {integration_id} failed: {err}")
+        return refreshed
+
+    def start(self) -> None:
+        """Start the scheduler thread if this store runs one and it is not running yet"""
+        if self.scheduler != 'thread' or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='gemini-tokens', daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    async def startup(self) -> None:
+        """ASGI lifespan hook"""
+        self.start()
+
+    async def shutdown(self) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        # One event loop for the thread's whole life, so every run reuses one connection pool
+        async_to_sync(self._arun)()
+
+    async def _arun(self) -> None:
+        try:
+            while not self._stopped.is_set():
+                await sync_to_async(close_old_connections)()
+                try:
+                    await self.arefresh_due(self.recently_used())
+                except Exception as err:
+                    logger.error(f"Gemini token scheduler run failed: {err}", exc_info=True)
+                finally:
+                    await sync_to_async(close_old_connections)()
+                await sync_to_async(self._stopped.wait)(self.interval)
+        finally:
+            await outbound_http.aclose_loop_client()
+
+gemini_tokens = GeminiTokenStore.from_settings()
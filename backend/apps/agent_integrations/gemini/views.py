@@ -1,4 +1,5 @@
-from rest_framework import viewsets, status
+from adrf import viewsets
+from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
@@ -6,6 +7,7 @@ from django.conf import settings
 
 from .models import GeminiIntegration
 from .serializers import GeminiIntegrationSerializer, GeminiConfigSerializer
+from .tokens import gemini_tokens
 
 class GeminiViewSet(viewsets.ModelViewSet):
     serializer_class = GeminiIntegrationSerializer
@@ -15,10 +17,10 @@ class GeminiViewSet(viewsets.ModelViewSet):
         return GeminiIntegration.objects.filter(user=self.request.user)
 
     @action(detail=False, methods=['get', 'put'])
-    def config(self, request):
+    async def config(self, request):
         """Get or update Gemini configuration"""
         try:
-            integration = GeminiIntegration.objects.get(user=request.user)
+            integration = await GeminiIntegration.objects.aget(user=request.user)
 
             if request.method == 'GET':
                 return Response({
@@ -36,7 +38,7 @@ class GeminiViewSet(viewsets.ModelViewSet):
 
             integration.api_key = api_key
             integration.is_active = True
-            integration.save()
+            await integration.asave(update_fields=['api_key', 'is_active', 'updated_at'])
 
             return Response({
                 'is_connected': True,
@@ -51,7 +53,7 @@ class GeminiViewSet(viewsets.ModelViewSet):
                 })
 
             # Create new integration with API key
-            integration = GeminiIntegration.objects.create(
+            integration = await GeminiIntegration.objects.acreate(
                 user=request.user,
                 api_key=request.data.get('api_key'),
                 is_active=True
@@ -63,13 +65,18 @@ class GeminiViewSet(viewsets.ModelViewSet):
             })
 
     @action(detail=False, methods=['post'])
-    def disconnect(self, request):
+    async def disconnect(self, request):
         """Disconnect Gemini integration"""
         try:
-            integration = GeminiIntegration.objects.get(user=request.user)
+            integration = await GeminiIntegration.objects.aget(user=request.user)
             integration.is_active = False
             integration.api_key = ''  # Clear the API key
-            integration.save()
+            integration.access_token = integration.refresh_token = ''
+            integration.token_expiry = None
+            await integration.asave(update_fields=[
+                'is_active', 'api_key', 'access_token', 'refresh_token', 'token_expiry', 'updated_at'
+            ])
+            gemini_tokens.discard(integration.pk)
             return Response(status=status.HTTP_204_NO_CONTENT)
         except GeminiIntegration.DoesNotExist:
             return Response(
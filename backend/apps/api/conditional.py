@@ -0,0 +1,39 @@
+import hashlib
+from datetime import datetime
+from typing import Optional
+
+from django.http import HttpResponseBase
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+def weak_etag(*parts) -> str:
+    """A weak ETag for a response built from parts: equal parts, equivalent bodies"""
+    digest = hashlib.sha256(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+def with_validators(response: HttpResponseBase, etag: str,
+                    last_modified: Optional[datetime]) -> HttpResponseBase:
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Browsers keep the response but revalidate it on every use, so a refetch is a 304
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+def not_modified(request, etag: str, last_modified: Optional[datetime]) -> Optional[HttpResponseBase]:
+    """
+    A 304 Not Modified when the request's validators match, else None
+
+    Args:
+        request: The request, with any If-None-Match or If-Modified-Since headers
+        etag: The ETag the full response would have
+        last_modified: When the response's content last changed, if known
+    """
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified is not None else None
+    )
+    if response is None:
+        return None
+    return with_validators(response, etag, last_modified)
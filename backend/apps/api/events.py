@@ -0,0 +1,178 @@
+import asyncio
+import threading
+from collections import deque
+from typing import Dict, Optional, Set
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Event types pushed to clients
+THOUGHT_CREATED = 'thought.created'
+THOUGHT_UPDATED = 'thought.updated'
+THOUGHT_DELETED = 'thought.deleted'
+INTROSPECTION_COMPLETED = 'introspection.completed'
+
+# Why a subscription was closed: its listener fell too far behind
+OVERFLOW = 'overflow'
+
+class SubscriptionClosed(Exception):
+    """Raised by Subscription.get once the broker has closed the subscription"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class TooManySubscriptions(Exception):
+    """Raised when a user already has as many open subscriptions as allowed"""
+
+class Subscription:
+    """
+    One connection's queue of a user's events.
+
+    Events may be put from any thread; they are handed to the event loop the
+    subscription was created on. A listener that falls more than `size`
+    events behind is closed rather than buffered without bound, and the
+    client catches up from the changes feed.
+    """
+
+    __slots__ = ('user_id', 'size', 'closed', '_events', '_ready', '_loop')
+
+    def __init__(self, user_id: int, size: int):
+        self.user_id = user_id
+        self.size = size
+        # Why the broker closed it, or None while open
+        self.closed: Optional[str] = None
+        self._events = deque()
+        self._ready = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+
+    def put(self, event: dict) -> None:
+        """Queue an event for the listener; safe to call from any thread"""
+        self._call(self._deliver, event)
+
+    def close(self, reason: str) -> None:
+        """Stop the subscription; the listener's next get raises SubscriptionClosed"""
+        self._call(self._close, reason)
+
+    def _call(self, callback, *args) -> None:
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # The loop has closed, and the listener with it
+            pass
+
+    def _deliver(self, event: dict) -> None:
+        if self.closed is not None:
+            return
+        if len(self._events) >= self.size:
+            self._close(OVERFLOW)
+            return
+        self._events.append(event)
+        self._ready.set()
+
+    def _close(self, reason: str) -> None:
+        if self.closed is None:
+            self.closed = reason
+            self._events.clear()
+            self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """
+        The next event, waiting for one if need be
+
+        Returns:
+            dict | None: The event, or None if none arrived within timeout
+
+        Raises:
+            SubscriptionClosed: If the broker closed the subscription
+        """
+        while not self._events:
+            if self.closed is not None:
+                raise SubscriptionClosed(self.closed)
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._events.popleft()
+
+class EventBroker:
+    """
+    Passes thought events from the code that writes thoughts to the
+    connections listening for them.
+
+    Subclass and point settings.THOUGHT_EVENTS['BROKER'] at the subclass to
+    swap the transport, for example for one that relays events between
+    processes and `put`s them into the local subscriptions.
+    """
+
+    def __init__(self, queue_size: int = 100, max_subscriptions_per_user: int = 10):
+        self.queue_size = queue_size
+        self.max_subscriptions_per_user = max_subscriptions_per_user
+
+    def subscribe(self, user_id: int) -> Subscription:
+        """Start listening to a user's events; call from the listener's event loop"""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        raise NotImplementedError
+
+    def has_subscribers(self, user_id: int) -> bool:
+        """Whether anything is listening, so publishers can skip building events"""
+        raise NotImplementedError
+
+    def publish(self, user_id: int, event: dict) -> None:
+        """Send an event to a user's subscriptions; safe to call from any thread"""
+        raise NotImplementedError
+
+class LocalBroker(EventBroker):
+    """Delivers events to the subscriptions in this process"""
+
+    def __init__(self, queue_size: int = 100, max_subscriptions_per_user: int = 10):
+        super().__init__(queue_size, max_subscriptions_per_user)
+        self._subscriptions: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: int) -> Subscription:
+        """
+        Raises:
+            TooManySubscriptions: If the user is at max_subscriptions_per_user
+        """
+        subscription = Subscription(user_id, self.queue_size)
+        with self._lock:
+            subscriptions = self._subscriptions.setdefault(user_id, set())
+            if len(subscriptions) >= self.max_subscriptions_per_user:
+                raise TooManySubscriptions(f"At most {self.max_subscriptions_per_user} event streams per user")
+            subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def has_subscribers(self, user_id: int) -> bool:
+        return user_id in self._subscriptions
+
+    def publish(self, user_id: int, event: dict) -> None:
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+_broker = None
+_lock = threading.Lock()
+
+def get_broker() -> EventBroker:
+    """Return the broker configured in settings.THOUGHT_EVENTS, built once per process"""
+    global _broker
+    if _broker is None:
+        with _lock:
+            if _broker is None:
+                options = settings.THOUGHT_EVENTS
+                broker_class = import_string(options['BROKER'])
+                _broker = broker_class(**options.get('OPTIONS', {}))
+    return _broker
@@ -0,0 +1,72 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Tuple
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+# Columns of an export, in order
+EXPORT_FIELDS = ('id', 'text', 'introspective_version', 'introspection_status', 'created_at', 'updated_at')
+
+def _isoformat(value: datetime) -> str:
+    # Matches how the API renders datetimes
+    value = value.isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+def _ndjson(rows: List[Dict]) -> str:
+    return ''.join(json.dumps(row, ensure_ascii=False, default=_isoformat) + '\n' for row in rows)
+
+def _csv(rows: List[Dict]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([
+            _isoformat(row[field]) if isinstance(row[field], datetime) else row[field]
+            for field in EXPORT_FIELDS
+        ])
+    return buffer.getvalue()
+
+# type: (content type, file extension, header, row formatter)
+EXPORT_TYPES: Dict[str, Tuple[str, str, str, Callable[[List[Dict]], str]]] = {
+    'ndjson': ('application/x-ndjson', 'ndjson', '', _ndjson),
+    'csv': ('text/csv', 'csv', ','.join(EXPORT_FIELDS) + '\r\n', _csv),
+}
+
+async def _export_chunks(queryset: QuerySet, header: str, format_rows, chunk_size: int) -> AsyncIterator[str]:
+    if header:
+        yield header
+    rows = []
+    # A server-side cursor: only one chunk of rows is held in memory at a time
+    async for row in queryset.values(*EXPORT_FIELDS).aiterator(chunk_size=chunk_size):
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            yield format_rows(rows)
+            rows = []
+    if rows:
+        yield format_rows(rows)
+
+def export_response(queryset: QuerySet, export_type: str) -> StreamingHttpResponse:
+    """
+    Stream a queryset of thoughts as a file download
+
+    Args:
+        queryset: The thoughts to export, in the order they should appear
+        export_type: A key of EXPORT_TYPES
+
+    Returns:
+        StreamingHttpResponse: The export, written a chunk of rows at a time
+    """
+    content_type, extension, header, format_rows = EXPORT_TYPES[export_type]
+    response = StreamingHttpResponse(
+        _export_chunks(queryset, header, format_rows, settings.THOUGHTS_EXPORT_CHUNK_SIZE),
+        content_type=f'{content_type}; charset=utf-8'
+    )
+    filename = f"thoughts-{timezone.now():%Y-%m-%d}.{extension}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Stop proxies such as nginx from buffering the download
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,89 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+
+DEFAULT_BASELINES = Path(__file__).resolve().parents[4] / 'benchmarks' / 'baselines.json'
+
+class Command(BaseCommand):
+    help = "Time the API hot paths against a test database and fail on regressions from the stored baselines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="Only run these benchmarks")
+        parser.add_argument('--baselines', default=str(DEFAULT_BASELINES))
+        parser.add_argument('--update', action='store_true', help="Store the results as the new baselines")
+        parser.add_argument(
+            '--allow-more-queries', action='store_true',
+            help="With --update, store baselines even where a benchmark now makes more queries"
+        )
+        parser.add_argument(
+            '--time-tolerance', type=float, default=0.5,
+            help="Allowed slowdown of the fastest run before a benchmark fails, as a fraction"
+        )
+        parser.add_argument(
+            '--time-floor', type=float, default=5.0,
+            help="Slowdowns smaller than this many milliseconds never fail a benchmark"
+        )
+        parser.add_argument(
+            '--memory-tolerance', type=float, default=0.25,
+            help="Allowed growth in peak allocations before a benchmark fails, as a fraction"
+        )
+        parser.add_argument('--keepdb', action='store_true', help="Reuse the test database between runs")
+
+    def handle(self, *args, **options):
+        # Imported here so the cases register only when benchmarks actually run
+        from benchmarks import cases  # noqa: F401
+        from benchmarks.runner import BENCHMARKS, find_regressions, load_baselines, save_baselines
+
+        names = options['names'] or list(BENCHMARKS)
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+        runner = DiscoverRunner(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            results = {}
+            for name in names:
+                results[name] = BENCHMARKS[name].run()
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+        baselines = load_baselines(options['baselines'])
+        failures = []
+        self.stdout.write(f"{'benchmark':<22}{'median ms':>11}{'min ms':>10}{'queries':>9}{'peak KiB':>10}  status")
+        for name, result in results.items():
+            baseline = baselines.get(name)
+            if baseline is None:
+                status = 'new'
+            else:
+                problems = find_regressions(
+                    result, baseline, options['time_tolerance'], options['memory_tolerance'],
+                    options['time_floor']
+                )
+                status = 'REGRESSED: ' + '; '.join(problems) if problems else 'ok'
+                if problems:
+                    failures.append(name)
+            self.stdout.write(
+                f"{name:<22}{result['time_ms']:>11.2f}{result['min_ms']:>10.2f}"
+                f"{result['queries']:>9}{result['peak_kib']:>10.0f}  {status}"
+            )
+
+        if options['update']:
+            # An extra query is never noise, so raising a query baseline has to be asked for
+            grown = [
+                f"{name} ({baselines[name]['queries']} -> {result['queries']})"
+                for name, result in results.items()
+                if name in baselines and result['queries'] > baselines[name]['queries']
+            ]
+            if grown and not options['allow_more_queries']:
+                raise CommandError(
+                    f"Not updating baselines, more queries in: {', '.join(grown)}. "
+                    "Fix the regression, or pass --allow-more-queries if it is intended"
+                )
+            save_baselines(options['baselines'], {**baselines, **results})
+            self.stdout.write(f"Baselines written to {options['baselines']}")
+        elif failures:
+            raise CommandError(f"{len(failures)} benchmark(s) regressed: {', '.join(failures)}")
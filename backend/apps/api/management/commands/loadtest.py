@@ -0,0 +1,167 @@
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+
+# Share of requests each scenario sends to each operation
+SCENARIOS = {
+    'mixed': {'create': 0.3, 'list': 0.5, 'token': 0.1, 'refresh': 0.1},
+    'create': {'create': 1.0},
+    'list': {'list': 1.0},
+    'token': {'token': 0.5, 'refresh': 0.5},
+}
+
+PASSWORD = 'load-test-Pa55word'
+
+def percentile(values, p):
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+class Command(BaseCommand):
+    help = "Drive the thoughts and token endpoints of a running server and report throughput and latency percentiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8000')
+        parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixed')
+        parser.add_argument('--users', type=int, default=10, help="Accounts registered for the run")
+        parser.add_argument('--concurrency', type=int, default=20, help="Requests in flight at once")
+        parser.add_argument('--duration', type=float, default=30.0, help="Seconds to send requests for")
+        parser.add_argument('--timeout', type=float, default=30.0, help="Per-request timeout in seconds")
+        parser.add_argument('--seed', type=int, default=0, help="Makes the request mix repeatable")
+        parser.add_argument('--json', dest='json_path', help="Also write the report to this file")
+
+    def handle(self, *args, **options):
+        report = asyncio.run(self.run(options))
+        self.print_report(report)
+        if options['json_path']:
+            with open(options['json_path'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+    async def run(self, options):
+        limits = httpx.Limits(max_connections=options['concurrency'])
+        async with httpx.AsyncClient(
+            base_url=options['base_url'], timeout=options['timeout'], limits=limits
+        ) as client:
+            accounts = await self.set_up_accounts(client, options['users'])
+            samples = defaultdict(list)
+            statuses = defaultdict(Counter)
+            weights = SCENARIOS[options['scenario']]
+            deadline = time.monotonic() + options['duration']
+
+            async def worker(number):
+                rng = random.Random(options['seed'] * 1000 + number)
+                operations, shares = zip(*weights.items())
+                requests = 0
+                while time.monotonic() < deadline:
+                    account = accounts[(number + requests) % len(accounts)]
+                    operation = rng.choices(operations, shares)[0]
+                    started = time.perf_counter()
+                    try:
+                        status = await getattr(self, f'do_{operation}')(client, account, rng)
+                    except httpx.HTTPError as err:
+                        status = type(err).__name__
+                    samples[operation].append(time.perf_counter() - started)
+                    statuses[operation][status] += 1
+                    requests += 1
+
+            started = time.monotonic()
+            await asyncio.gather(*(worker(number) for number in range(options['concurrency'])))
+            elapsed = time.monotonic() - started
+
+        return self.summarize(options, samples, statuses, elapsed)
+
+    async def set_up_accounts(self, client, count):
+        run_id = uuid.uuid4().hex[:8]
+        accounts = []
+        for number in range(count):
+            username = f'loadtest-{run_id}-{number}'
+            response = await client.post('/api/register/', json={
+                'username': username, 'password': PASSWORD, 'password2': PASSWORD
+            })
+            if response.status_code != 201:
+                raise CommandError(f"Could not register {username}: {response.status_code} {response.text[:200]}")
+            response = await client.post('/api/token/', json={'username': username, 'password': PASSWORD})
+            if response.status_code != 200:
+                raise CommandError(f"Could not log in as {username}: {response.status_code}")
+            tokens = response.json()
+            accounts.append({'username': username, 'access': tokens['access'], 'refresh': tokens['refresh']})
+        return accounts
+
+    async def do_create(self, client, account, rng):
+        response = await client.post(
+            '/api/thoughts/',
+            json={'text': f'load test thought {rng.randrange(1_000_000)}'},
+            headers={'Authorization': f"Bearer {account['access']}"}
+        )
+        return response.status_code
+
+    async def do_list(self, client, account, rng):
+        response = await client.get(
+            '/api/thoughts/', headers={'Authorization': f"Bearer {account['access']}"}
+        )
+        return response.status_code
+
+    async def do_token(self, client, account, rng):
+        response = await client.post(
+            '/api/token/', json={'username': account['username'], 'password': PASSWORD}
+        )
+        return response.status_code
+
+    async def do_refresh(self, client, account, rng):
+        response = await client.post('/api/token/refresh/', json={'refresh': account['refresh']})
+        if response.status_code == 200:
+            account['access'] = response.json()['access']
+        return response.status_code
+
+    def summarize(self, options, samples, statuses, elapsed):
+        operations = {}
+        for operation, latencies in sorted(samples.items()):
+            latencies.sort()
+            errors = sum(
+                count for status, count in statuses[operation].items()
+                if not isinstance(status, int) or status >= 400
+            )
+            operations[operation] = {
+                'requests': len(latencies),
+                'errors': errors,
+                'throughput': len(latencies) / elapsed,
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+                'max_ms': latencies[-1] * 1000,
+                'statuses': {str(status): count for status, count in statuses[operation].items()},
+            }
+        total = sum(result['requests'] for result in operations.values())
+        return {
+            'scenario': options['scenario'],
+            'concurrency': options['concurrency'],
+            'users': options['users'],
+            'duration': elapsed,
+            'requests': total,
+            'throughput': total / elapsed,
+            'operations': operations,
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{report['scenario']}: {report['requests']} requests in {report['duration']:.1f}s "
+            f"at concurrency {report['concurrency']} ({report['throughput']:.1f} req/s)"
+        )
+        self.stdout.write(
+            f"{'operation':<10}{'requests':>10}{'errors':>8}{'req/s':>9}"
+            f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}  statuses"
+        )
+        for operation, result in report['operations'].items():
+            statuses = ' '.join(f'{status}:{count}' for status, count in sorted(result['statuses'].items()))
+            self.stdout.write(
+                f"{operation:<10}{result['requests']:>10}{result['errors']:>8}{result['throughput']:>9.1f}"
+                f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}{result['max_ms']:>9.1f}  {statuses}"
+            )
@@ -0,0 +1,77 @@
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+class ThoughtCursorPagination(CursorPagination):
+    """
+    Keyset pagination over a user's timeline, newest first.
+
+    A cursor holds the (created_at, id) of the thought at the edge of its
+    page, and the next page is the thoughts past it in that order, read as a
+    range of the (user, created_at, id) index. Fetching a page costs the same
+    however much history a user has.
+
+    DRF's CursorPagination keys on created_at alone and steps over ties with
+    an offset, which stops working past `offset_cutoff` thoughts sharing a
+    timestamp, as an import without creation times leaves them.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor.reverse if self.cursor else False
+        position = self._parse_position(self.cursor.position) if self.cursor else None
+        if position is not None:
+            created_at, pk = position
+            if reverse:
+                queryset = queryset.filter(created_at__gte=created_at).exclude(created_at=created_at, id__lte=pk)
+            else:
+                queryset = queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=pk)
+        queryset = queryset.order_by(*(('created_at', 'id') if reverse else self.ordering))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+        # Moving back, the page the cursor came from is still ahead, and vice versa
+        self.has_next = position is not None if reverse else has_more
+        self.has_previous = has_more if reverse else position is not None
+        return self.page
+
+    def _position(self, thought) -> str:
+        return f"{thought.created_at.isoformat()}|{thought.pk}"
+
+    def _parse_position(self, position):
+        if position is None:
+            return None
+        try:
+            created_at, pk = position.rsplit('|', 1)
+            created_at = parse_datetime(created_at)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self._position(self.page[-1]) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self._position(self.page[0]) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import AuthenticationFailed
+
+from apps.users.authentication import ClaimsJWTAuthentication
+from .events import Subscription, SubscriptionClosed, TooManySubscriptions, get_broker
+from .streams import _sse
+
+logger = logging.getLogger(__name__)
+
+# WebSocket close codes, in the range left to applications
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_TOO_MANY = 4429
+# The listener fell behind and missed events; resync from the changes feed
+CLOSE_OVERFLOW = 4409
+
+@sync_to_async
+def _authenticate_token(raw_token: str) -> Tuple[Optional[object], float]:
+    """The user a raw access token belongs to, and when the token expires"""
+    # Not run inside a request, so nothing else tidies up the database connection
+    close_old_connections()
+    try:
+        authentication = ClaimsJWTAuthentication()
+        validated_token = authentication.get_validated_token(raw_token)
+        return authentication.get_user(validated_token), validated_token['exp']
+    except (AuthenticationFailed, KeyError):
+        return None, 0
+    finally:
+        close_old_connections()
+
+@csrf_exempt
+@require_GET
+async def thought_events(request):
+    """
+    Stream the user's thought events as Server-Sent Events, for clients that
+    cannot open the WebSocket at the same URL
+
+    Events:
+        ready: the stream is listening
+        thought.created, thought.updated, introspection.completed: {"thought": {...}}
+        thought.deleted: {"id": ...}
+        closed: {"reason": "overflow" | "expired"}; reconnect and resync from the changes feed
+    """
+    header = request.headers.get('Authorization', '')
+    raw_token = header[len('Bearer '):] if header.startswith('Bearer ') else ''
+    user, expires = await _authenticate_token(raw_token) if raw_token else (None, 0)
+    if user is None:
+        return JsonResponse(
+            {'detail': 'Authentication credentials were not provided or are invalid.'},
+            status=401
+        )
+
+    broker = get_broker()
+    try:
+        subscription = broker.subscribe(user.pk)
+    except TooManySubscriptions as err:
+        return JsonResponse({'error': str(err)}, status=429)
+
+    response = StreamingHttpResponse(
+        _event_stream(subscription, expires),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop proxies such as nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+async def _event_stream(subscription: Subscription, expires: float):
+    heartbeat = settings.THOUGHT_EVENTS.get('HEARTBEAT', 25)
+    try:
+        yield _sse('ready', {})
+        while True:
+            remaining = expires - time.time()
+            if remaining <= 0:
+                yield _sse('closed', {'reason': 'expired'})
+                return
+            try:
+                event = await subscription.get(timeout=min(heartbeat, remaining))
+            except SubscriptionClosed as err:
+                yield _sse('closed', {'reason': err.reason})
+                return
+            if event is None:
+                # A comment line keeps idle proxies from dropping the connection
+                yield ': keepalive\n\n'
+            else:
+                yield _sse(event['type'], {key: value for key, value in event.items() if key != 'type'})
+    finally:
+        get_broker().unsubscribe(subscription)
+
+class ThoughtEventSocket:
+    """
+    ASGI application pushing a user's thought events over a WebSocket.
+
+    Browsers cannot set headers on a WebSocket, and a token in the URL ends up
+    in access logs, so the client sends its access token as the first
+    message: {"token": "..."}. Events then follow as JSON text messages with a
+    "type". The socket is closed with 4401 when the token is missing, invalid
+    or expires; the client reconnects with a fresh one.
+    """
+
+    async def __call__(self, scope, receive, send):
+        message = await receive()
+        if message['type'] != 'websocket.connect':
+            return
+        await send({'type': 'websocket.accept'})
+
+        user, expires = await self._authenticate(receive)
+        if user is None:
+            await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+            return
+
+        broker = get_broker()
+        try:
+            subscription = broker.subscribe(user.pk)
+        except TooManySubscriptions:
+            await send({'type': 'websocket.close', 'code': CLOSE_TOO_MANY})
+            return
+
+        try:
+            await send({'type': 'websocket.send', 'text': json.dumps({'type': 'ready'})})
+            code = await self._relay(subscription, expires, receive, send)
+        except OSError:
+            # The client went away mid-send
+            return
+        finally:
+            broker.unsubscribe(subscription)
+        if code is not None:
+            await send({'type': 'websocket.close', 'code': code})
+
+    async def _authenticate(self, receive) -> Tuple[Optional[object], float]:
+        try:
+            message = await asyncio.wait_for(receive(), settings.THOUGHT_EVENTS.get('AUTH_TIMEOUT', 10))
+        except asyncio.TimeoutError:
+            return None, 0
+        if message['type'] != 'websocket.receive':
+            return None, 0
+        try:
+            raw_token = json.loads(message.get('text') or '')['token']
+        except (ValueError, TypeError, KeyError):
+            return None, 0
+        if not isinstance(raw_token, str) or not raw_token:
+            return None, 0
+        return await _authenticate_token(raw_token)
+
+    async def _relay(self, subscription: Subscription, expires: float, receive, send) -> Optional[int]:
+        """Send events until the client leaves or the socket must close; returns the close code"""
+
+        async def push():
+            while True:
+                event = await subscription.get()
+                await send({'type': 'websocket.send', 'text': json.dumps(event)})
+
+        async def listen():
+            # Nothing is expected from the client; this only notices it leaving
+            while (await receive())['type'] != 'websocket.disconnect':
+                pass
+
+        pushing, listening = asyncio.ensure_future(push()), asyncio.ensure_future(listen())
+        try:
+            done, _ = await asyncio.wait(
+                {pushing, listening},
+                timeout=max(expires - time.time(), 0),
+                return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            pushing.cancel()
+            listening.cancel()
+
+        if listening in done:
+            return None
+        if pushing in done:
+            error = pushing.exception()
+            if isinstance(error, SubscriptionClosed):
+                return CLOSE_OVERFLOW
+            raise error
+        return CLOSE_UNAUTHORIZED
+
+thought_event_socket = ThoughtEventSocket()
@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.thoughts.models import IntrospectionStatus, Thought
+from apps.thoughts.signals import thoughts_bulk_created, thoughts_updated
+from .events import (
+    INTROSPECTION_COMPLETED, THOUGHT_CREATED, THOUGHT_DELETED, THOUGHT_UPDATED, get_broker
+)
+from .serializers import ThoughtSerializer
+
+FINISHED_STATUSES = (IntrospectionStatus.COMPLETED, IntrospectionStatus.FAILED)
+
+def _publish(user_id: int, event: dict) -> None:
+    # Listeners only hear about writes that committed
+    transaction.on_commit(lambda: get_broker().publish(user_id, event))
+
+def _event_type(instance: Thought, created: bool, update_fields) -> str:
+    if created:
+        return THOUGHT_CREATED
+    if (update_fields and 'introspective_version' in update_fields
+            and instance.introspection_status in FINISHED_STATUSES):
+        return INTROSPECTION_COMPLETED
+    return THOUGHT_UPDATED
+
+@receiver(post_save, sender=Thought)
+def publish_saved_thought(sender, instance, created=False, update_fields=None, **kwargs):
+    if not get_broker().has_subscribers(instance.user_id):
+        return
+    _publish(instance.user_id, {
+        'type': _event_type(instance, created, update_fields),
+        'thought': ThoughtSerializer(instance).data,
+    })
+
+@receiver(thoughts_bulk_created, sender=Thought)
+def publish_bulk_created_thoughts(sender, thoughts, **kwargs):
+    broker = get_broker()
+    for thought in thoughts:
+        if broker.has_subscribers(thought.user_id):
+            _publish(thought.user_id, {'type': THOUGHT_CREATED, 'thought': ThoughtSerializer(thought).data})
+
+@receiver(thoughts_updated, sender=Thought)
+def publish_updated_thoughts(sender, thoughts, update_fields=None, **kwargs):
+    broker = get_broker()
+    for thought in thoughts:
+        if broker.has_subscribers(thought.user_id):
+            _publish(thought.user_id, {
+                'type': _event_type(thought, False, update_fields),
+                'thought': ThoughtSerializer(thought).data,
+            })
+
+@receiver(post_delete, sender=Thought)
+def publish_deleted_thought(sender, instance, origin=None, **kwargs):
+    # Deleted along with their user: nobody is left to tell
+    if origin is not None and getattr(origin, 'model', type(origin)) is not Thought:
+        return
+    if get_broker().has_subscribers(instance.user_id):
+        _publish(instance.user_id, {'type': THOUGHT_DELETED, 'id': instance.pk})
@@ -1,8 +1,39 @@
 from rest_framework import serializers
-from apps.thoughts.models import Thought
+from apps.thoughts.models import ImportJob, Thought
 
 class ThoughtSerializer(serializers.ModelSerializer):
     class Meta:
         model = Thought
-        fields = ['id', 'text', 'introspective_version', 'created_at', 'updated_at', 'user']
-        read_only_fields = ['introspective_version', 'user', 'created_at', 'updated_at']
+        fields = [
+            'id', 'text', 'introspective_version', 'introspection_status',
+            'introspection_attempts', 'introspection_error', 'created_at', 'updated_at', 'user'
+        ]
+        read_only_fields = [
+            'introspective_version', 'introspection_status', 'introspection_attempts',
+            'introspection_error', 'user', 'created_at', 'updated_at'
+        ]
+
+class ThoughtSearchResultSerializer(ThoughtSerializer):
+    """A thought matched by full-text search, with its rank and highlighted snippets"""
+    rank = serializers.FloatField(read_only=True)
+    text_highlight = serializers.CharField(read_only=True)
+    introspective_highlight = serializers.CharField(read_only=True, allow_null=True)
+
+    class Meta(ThoughtSerializer.Meta):
+        fields = ThoughtSerializer.Meta.fields + ['rank', 'text_highlight', 'introspective_highlight']
+
+class SimilarThoughtSerializer(ThoughtSerializer):
+    """A thought close in meaning to another, with its cosine similarity"""
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(ThoughtSerializer.Meta):
+        fields = ThoughtSerializer.Meta.fields + ['score']
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id', 'format', 'status', 'size', 'offset', 'rows_imported', 'rows_skipped',
+            'error', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
@@ -0,0 +1,152 @@
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework.exceptions import AuthenticationFailed
+
+from apps.thoughts.cache import thought_hash
+from apps.thoughts.context import thought_context
+from apps.thoughts.models import IntrospectionStatus, Thought
+from apps.thoughts.services import ThoughtIntrospectionService
+from apps.thoughts.signals import thoughts_updated
+from apps.thoughts.tasks import introspection_queue
+from apps.thoughts.versions import thought_versions
+from apps.users.authentication import ClaimsJWTAuthentication
+from .serializers import ThoughtSerializer
+
+logger = logging.getLogger(__name__)
+
+introspection_service = ThoughtIntrospectionService()
+
+STREAMED_FIELDS = ('introspective_rewrite', 'reasoning')
+
+def _sse(event: str, data) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _authenticate(request):
+    """Resolve the JWT user for a plain (non-DRF) Django view"""
+    try:
+        result = await sync_to_async(ClaimsJWTAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+@sync_to_async
+def _hand_to_queue(thought: Thought, error: str) -> None:
+    # Let the background pipeline finish a thought the stream could not
+    requeued = Thought.objects.filter(
+        pk=thought.pk,
+        introspection_status=IntrospectionStatus.PROCESSING
+    ).update(
+        introspection_status=IntrospectionStatus.PENDING,
+        introspection_error=error
+    )
+    if requeued:
+        thought_versions.touch(thought.user_id)
+        introspection_queue.enqueue(thought.pk)
+
+async def _introspection_events(thought: Thought):
+    finished = False
+    error = 'Stream closed before the introspection finished'
+    try:
+        yield _sse('thought', ThoughtSerializer(thought).data)
+
+        sent = dict.fromkeys(STREAMED_FIELDS, '')
+        output = {}
+        context = await sync_to_async(thought_context.for_thought)(thought.user_id, thought.pk, thought.text)
+        async for output in introspection_service.astream(thought.text, context):
+            for field in STREAMED_FIELDS:
+                value = output.get(field) or ''
+                # Partial JSON only ever grows, so each event carries the new suffix
+                if len(value) > len(sent[field]) and value.startswith(sent[field]):
+                    yield _sse('delta', {'field': field, 'text': value[len(sent[field]):]})
+                    sent[field] = value
+
+        prompt_version, model = introspection_service.version
+        result = {
+            'introspective_version': output['introspective_rewrite'],
+            'introspection_status': IntrospectionStatus.COMPLETED,
+            'introspection_error': '',
+            'introspection_prompt_version': prompt_version,
+            'introspection_model': model,
+            'introspection_text_hash': thought_hash(thought.text),
+            'updated_at': timezone.now(),
+        }
+        # Conditional, like the queue's finish: if the thought was edited while
+        # streaming, the rewrite is for text it no longer has
+        saved = await Thought.objects.filter(
+            pk=thought.pk,
+            introspection_status=IntrospectionStatus.PROCESSING,
+            text=thought.text
+        ).aupdate(**result)
+        if not saved:
+            error = 'Thought was edited before its streamed introspection finished'
+            yield _sse('error', {'error': 'The thought changed; it will be introspected in the background'})
+            return
+
+        for field, value in result.items():
+            setattr(thought, field, value)
+        await sync_to_async(thought_versions.touch)(thought.user_id)
+        await sync_to_async(thoughts_updated.send)(sender=Thought, thoughts=[thought], update_fields=list(result))
+        finished = True
+        yield _sse('done', ThoughtSerializer(thought).data)
+
+    except Exception as err:
+        # Not only IntrospectionError: a shared flight the stream followed can fail with anything
+        logger.warning(f"Streaming introspection failed for thought {thought.pk}: {type(err).__name__}: {err}")
+        error = str(err)
+        yield _sse('error', {'error': 'Introspection failed; it will be retried in the background'})
+
+    finally:
+        if not finished:
+            await _hand_to_queue(thought, error)
+
+@csrf_exempt
+@require_POST
+async def stream_thought(request):
+    """
+    Create a thought and stream its introspection as Server-Sent Events
+
+    Events:
+        thought: the stored thought, sent first
+        delta: {"field": "introspective_rewrite" | "reasoning", "text": "..."}
+        done: the thought with its introspective version saved
+        error: the model call failed; the thought falls back to the background queue
+    """
+    user = await _authenticate(request)
+    if user is None:
+        return JsonResponse(
+            {'detail': 'Authentication credentials were not provided or are invalid.'},
+            status=401
+        )
+
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+
+    serializer = ThoughtSerializer(data=payload)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    thought = await Thought.objects.acreate(
+        user=user,
+        text=serializer.validated_data['text'],
+        introspection_status=IntrospectionStatus.PROCESSING,
+        introspection_attempts=1,
+        introspection_claimed_at=timezone.now()
+    )
+
+    response = StreamingHttpResponse(
+        _introspection_events(thought),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop proxies such as nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
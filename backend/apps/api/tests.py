@@ -1,3 +1,343 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.embeddings.services import embedding_service
+from apps.thoughts.context import EMPTY_CONTEXT, thought_context
+from apps.thoughts.models import IntrospectionStatus, Thought
+from apps.thoughts.tasks import IntrospectionQueue
+from apps.thoughts.versions import thought_versions
+from apps.users.resolver import user_resolver
+from apps.users.serializers import ClaimsTokenObtainPairSerializer
+from .events import (
+    OVERFLOW, THOUGHT_CREATED, THOUGHT_UPDATED, LocalBroker, SubscriptionClosed, TooManySubscriptions, get_broker
+)
+from .exports import EXPORT_FIELDS
+from .push import CLOSE_UNAUTHORIZED, thought_event_socket
+
+User = get_user_model()
+
+class ApiTestCase(TransactionTestCase):
+    # Each request commits on its own, as it would in production; thought
+    # versions come from the transaction that last wrote a thought
+
+    def setUp(self):
+        # Embed inline, so no worker is still writing when the tables are flushed
+        patcher = mock.patch.object(embedding_service, 'backend', 'sync')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        caches[user_resolver.shared_cache].clear()
+        user_resolver.clear_local()
+        self.user = User.objects.create(username='reader')
+        self.token = str(ClaimsTokenObtainPairSerializer.get_token(self.user).access_token)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def create_thought(self, text='A thought'):
+        return Thought.objects.create(user=self.user, text=text, introspection_status=IntrospectionStatus.COMPLETED)
+
+class ConditionalGetTests(ApiTestCase):
+    def test_unchanged_list_is_not_modified(self):
+        self.create_thought()
+        response = self.client.get('/api/thoughts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+
+        response = self.client.get('/api/thoughts/', HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_list_tag_changes_with_every_write(self):
+        tags = [self.client.get('/api/thoughts/')['ETag']]
+        thought = self.create_thought()
+        tags.append(self.client.get('/api/thoughts/')['ETag'])
+        # update() skips the ORM's signals; the version follows the row anyway
+        Thought.objects.filter(pk=thought.pk).update(text='Edited')
+        tags.append(self.client.get('/api/thoughts/')['ETag'])
+        thought.delete()
+        tags.append(self.client.get('/api/thoughts/')['ETag'])
+
+        self.assertEqual(len(set(tags)), len(tags))
+        response = self.client.get('/api/thoughts/', HTTP_IF_NONE_MATCH=tags[0])
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_tag_depends_on_the_page(self):
+        self.create_thought()
+        etag = self.client.get('/api/thoughts/')['ETag']
+
+        response = self.client.get('/api/thoughts/?page_size=1', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_other_users_writes_keep_the_list_current(self):
+        self.create_thought()
+        etag = self.client.get('/api/thoughts/')['ETag']
+        Thought.objects.create(user=User.objects.create(username='someone-else'), text='Not mine')
+
+        response = self.client.get('/api/thoughts/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_unchanged_thought_is_not_modified(self):
+        thought = self.create_thought()
+        url = f'/api/thoughts/{thought.pk}/'
+        response = self.client.get(url)
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        thought.text = 'Edited'
+        thought.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_queue_status_change_moves_the_thought_tag_only(self):
+        thought = self.create_thought()
+        url = f'/api/thoughts/{thought.pk}/'
+        response = self.client.get(url)
+        Thought.objects.filter(pk=thought.pk).update(introspection_status=IntrospectionStatus.PENDING)
+
+        refetched = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(refetched.status_code, 200)
+        self.assertEqual(refetched.data['introspection_status'], IntrospectionStatus.PENDING)
+        self.assertEqual(refetched['Last-Modified'], response['Last-Modified'])
+
+class CachedVersionTests(ApiTestCase):
+    # With THOUGHT_VERSIONS['CACHE'] set, every write has to replace the cached version
+
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+        for patcher in (
+            mock.patch.object(thought_versions, 'cache', 'default'),
+            mock.patch.object(thought_context, 'for_thought', return_value=EMPTY_CONTEXT),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.queue = IntrospectionQueue(backend='sync')
+        self.queue._service = mock.Mock(version=('prompt-v1', 'model-a'))
+        self.thought = Thought.objects.create(
+            user=self.user, text='A thought', introspection_status=IntrospectionStatus.PENDING
+        )
+        self.etag = self.client.get('/api/thoughts/')['ETag']
+        self.seen = []
+
+    def _list_while_running(self):
+        response = self.client.get('/api/thoughts/', HTTP_IF_NONE_MATCH=self.etag)
+        status = response.data['results'][0]['introspection_status'] if response.status_code == 200 else None
+        self.seen.append((response.status_code, status))
+
+    def test_claim_moves_the_version(self):
+        def introspect(text, context):
+            self._list_while_running()
+            return 'Rewrite'
+        self.queue._service.introspect.side_effect = introspect
+
+        self.queue.run(self.thought.pk)
+
+        self.assertEqual(self.seen, [(200, IntrospectionStatus.PROCESSING)])
+        self.assertNotEqual(self.client.get('/api/thoughts/')['ETag'], self.etag)
+
+    def test_batch_claim_moves_the_version(self):
+        def introspect_many(texts, **kwargs):
+            self._list_while_running()
+            return ['Rewrite']
+        self.queue._service.introspect_many.side_effect = introspect_many
+
+        self.queue.run_many([self.thought.pk])
+
+        self.assertEqual(self.seen, [(200, IntrospectionStatus.PROCESSING)])
+
+class ThoughtChangesApiTests(ApiTestCase):
+    def test_changes_follow_the_cursor(self):
+        kept, deleted = self.create_thought('Kept'), self.create_thought('Deleted')
+        synced = self.client.get('/api/thoughts/changes/').data
+        self.assertEqual([thought['id'] for thought in synced['changes']], [kept.pk, deleted.pk])
+
+        deleted_id = deleted.pk
+        deleted.delete()
+        response = self.client.get('/api/thoughts/changes/', {'since': synced['cursor']})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['changes'], response.data['deleted']), ([], [deleted_id]))
+        self.assertFalse(response.data['has_more'])
+
+    def test_bad_parameters_are_refused(self):
+        for params in ({'limit': '0'}, {'limit': '-1'}, {'limit': 'ten'}, {'since': 'not-a-cursor'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/thoughts/changes/', params).status_code, 400)
+
+class ThoughtPaginationTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.thoughts = [self.create_thought(f'Thought {n}') for n in range(5)]
+        # Thoughts imported without creation times all share one
+        Thought.objects.filter(user=self.user).update(created_at=self.thoughts[0].created_at)
+        self.newest_first = [thought.pk for thought in reversed(self.thoughts)]
+
+    def _ids(self, response):
+        return [thought['id'] for thought in response.data['results']]
+
+    def test_pages_step_over_shared_timestamps(self):
+        pages, url = [], '/api/thoughts/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(self._ids(response))
+            url = response.data['next']
+
+        self.assertEqual(pages, [self.newest_first[:2], self.newest_first[2:4], self.newest_first[4:]])
+
+    def test_previous_link_returns_the_page_before(self):
+        first = self.client.get('/api/thoughts/?page_size=2')
+        second = self.client.get(first.data['next'])
+
+        back = self.client.get(second.data['previous'])
+
+        self.assertEqual(self._ids(back), self._ids(first))
+        self.assertIsNone(back.data['previous'])
+
+    def test_malformed_cursor_is_not_found(self):
+        self.assertEqual(self.client.get('/api/thoughts/', {'cursor': 'not-a-cursor'}).status_code, 404)
+
+class ThoughtSearchTests(ApiTestCase):
+    def test_matches_are_ranked_and_highlighted(self):
+        passing = self.create_thought('Thinking about running shoes')
+        focused = self.create_thought('Running, running and more running')
+        self.create_thought('Nothing relevant here')
+        Thought.objects.create(user=User.objects.create(username='someone-else'), text='Running too')
+
+        response = self.client.get('/api/thoughts/search/', {'q': 'run'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([thought['id'] for thought in response.data], [focused.pk, passing.pk])
+        self.assertIn('<b>Running</b>', response.data[0]['text_highlight'])
+
+    def test_introspective_version_is_searched(self):
+        thought = self.create_thought('A walk')
+        Thought.objects.filter(pk=thought.pk).update(introspective_version='I felt calm by the river')
+
+        response = self.client.get('/api/thoughts/search/', {'q': 'river'})
+
+        self.assertEqual([result['id'] for result in response.data], [thought.pk])
+
+    def test_bad_parameters_are_refused(self):
+        for params in ({}, {'q': '  '}, {'q': 'walk', 'limit': 'ten'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/thoughts/search/', params).status_code, 400)
+
+@override_settings(THOUGHTS_EXPORT_CHUNK_SIZE=2)
+class ThoughtExportTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.thoughts = [self.create_thought(text) for text in ('First', 'Second, with a comma', 'Third "quoted"')]
+        Thought.objects.create(user=User.objects.create(username='someone-else'), text='Not mine')
+
+    def _download(self, export_type):
+        response = self.client.get('/api/thoughts/export/', {'type': export_type})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        # The export streams from an async iterator, as served under ASGI
+        async def read():
+            return b''.join([chunk async for chunk in response.streaming_content])
+        return async_to_sync(read)().decode()
+
+    def test_ndjson_has_a_line_per_thought(self):
+        rows = [json.loads(line) for line in self._download('ndjson').splitlines()]
+
+        self.assertEqual([row['text'] for row in rows], [thought.text for thought in self.thoughts])
+        self.assertEqual(list(rows[0]), list(EXPORT_FIELDS))
+
+    def test_csv_has_a_header_and_quoted_rows(self):
+        rows = list(csv.reader(io.StringIO(self._download('csv'))))
+
+        self.assertEqual(rows[0], list(EXPORT_FIELDS))
+        self.assertEqual([row[1] for row in rows[1:]], [thought.text for thought in self.thoughts])
+
+    def test_unknown_type_is_refused(self):
+        self.assertEqual(self.client.get('/api/thoughts/export/', {'type': 'xml'}).status_code, 400)
+
+class EventBrokerTests(SimpleTestCase):
+    def setUp(self):
+        self.broker = LocalBroker(queue_size=2, max_subscriptions_per_user=1)
+
+    def test_events_reach_only_their_users_subscriptions(self):
+        async def listen():
+            mine, theirs = self.broker.subscribe(1), LocalBroker().subscribe(2)
+            self.broker.publish(1, {'type': THOUGHT_CREATED})
+            return await mine.get(timeout=1), await theirs.get(timeout=0.01)
+
+        self.assertEqual(asyncio.run(listen()), ({'type': THOUGHT_CREATED}, None))
+
+    def test_listener_that_falls_behind_is_closed(self):
+        async def fall_behind():
+            subscription = self.broker.subscribe(1)
+            for _ in range(3):
+                self.broker.publish(1, {'type': THOUGHT_UPDATED})
+            await asyncio.sleep(0)
+            await subscription.get(timeout=1)
+
+        with self.assertRaises(SubscriptionClosed) as caught:
+            asyncio.run(fall_behind())
+        self.assertEqual(caught.exception.reason, OVERFLOW)
+
+    def test_subscriptions_per_user_are_capped(self):
+        async def subscribe_twice():
+            subscription = self.broker.subscribe(1)
+            with self.assertRaises(TooManySubscriptions):
+                self.broker.subscribe(1)
+            self.broker.unsubscribe(subscription)
+            self.assertFalse(self.broker.has_subscribers(1))
+            self.broker.subscribe(1)
+
+        asyncio.run(subscribe_twice())
+
+class ThoughtEventSocketTests(ApiTestCase):
+    def _connect(self, messages):
+        """Drive the socket with the given client messages, recording what it sends"""
+        sent = []
+
+        async def run():
+            incoming = asyncio.Queue()
+            for message in messages:
+                incoming.put_nowait(message)
+
+            async def send(message):
+                sent.append(message)
+                if message.get('text') and json.loads(message['text'])['type'] == 'ready':
+                    # Listening: write a thought, then leave once its event is out
+                    await sync_to_async(self.create_thought)('Pushed')
+                elif message['type'] == 'websocket.send':
+                    incoming.put_nowait({'type': 'websocket.disconnect'})
+            await asyncio.wait_for(thought_event_socket({'type': 'websocket'}, incoming.get, send), 5)
+
+        async_to_sync(run)()
+        return sent
+
+    def test_writes_are_pushed_to_the_socket(self):
+        sent = self._connect([
+            {'type': 'websocket.connect'},
+            {'type': 'websocket.receive', 'text': json.dumps({'token': self.token})},
+        ])
+
+        events = [json.loads(message['text']) for message in sent if message['type'] == 'websocket.send']
+        self.assertEqual([event['type'] for event in events], ['ready', THOUGHT_CREATED])
+        self.assertEqual(events[1]['thought']['text'], 'Pushed')
+        self.assertFalse(get_broker().has_subscribers(self.user.pk))
+
+    def test_bad_token_closes_the_socket(self):
+        sent = self._connect([
+            {'type': 'websocket.connect'},
+            {'type': 'websocket.receive', 'text': json.dumps({'token': 'not-a-token'})},
+        ])
+
+        self.assertEqual(sent, [{'type': 'websocket.accept'}, {'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED}])
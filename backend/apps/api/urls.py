@@ -1,6 +1,15 @@
-from rest_framework.routers import DefaultRouter
-from .views import ThoughtViewSet
+from django.urls import path
+from adrf.routers import DefaultRouter
+from .push import thought_events
+from .streams import stream_thought
+from .views import ImportJobViewSet, ThoughtViewSet
 
 router = DefaultRouter()
 router.register(r'thoughts', ThoughtViewSet, basename='thought')
-urlpatterns = router.urls
+router.register(r'imports', ImportJobViewSet, basename='import')
+urlpatterns = [
+    # Listed before the router so "stream" is not taken for a thought id
+    path('thoughts/stream/', stream_thought, name='thought-stream'),
+    # The WebSocket at the same path is routed in you_backend/asgi.py
+    path('thoughts/events/', thought_events, name='thought-events'),
+] + router.urls
@@ -1,51 +1,303 @@
-from rest_framework import viewsets, status
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import transaction
+from django.db.models import F
+from adrf import viewsets
+from rest_framework import status
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from apps.thoughts.models import Thought
-from .serializers import ThoughtSerializer
+from apps.embeddings.services import embedding_service
+from apps.thoughts.cache import thought_hash
+from apps.thoughts.changes import CursorExpired, InvalidCursor, thought_changes
+from apps.thoughts.imports import ImportTooLarge, thought_importer
+from apps.thoughts.models import SEARCH_CONFIG, ImportFormat, ImportJob, IntrospectionStatus, Thought
+from apps.thoughts.signals import thoughts_bulk_created
+from .conditional import not_modified, weak_etag, with_validators
+from .exports import EXPORT_TYPES, export_response
+from .pagination import ThoughtCursorPagination
+from .serializers import (
+    ImportJobSerializer, SimilarThoughtSerializer, ThoughtSearchResultSerializer, ThoughtSerializer
+)
 from rest_framework.permissions import IsAuthenticated
-from apps.thoughts.services import ThoughtIntrospectionService
+from apps.thoughts.tasks import introspection_queue
+from apps.thoughts.versions import thought_versions
 
 class ThoughtViewSet(viewsets.ModelViewSet):
+    """
+    Thoughts of the authenticated user.
+
+    Create, read, update, delete and export run natively async on ASGI, so
+    waiting on the database does not tie up a thread. The bulk, search and
+    similar actions stay synchronous and are run in a worker thread.
+
+    List and retrieve answer conditional requests: a client whose copy is
+    still current gets a 304 before any thought is read or serialized.
+    """
     serializer_class = ThoughtSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ThoughtCursorPagination
 
     def get_queryset(self):
         """Return thoughts for the current authenticated user only"""
-        return Thought.objects.filter(user=self.request.user).order_by('-created_at')
+        return Thought.objects.filter(user=self.request.user).order_by('-created_at', '-id')
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._introspection_service = ThoughtIntrospectionService()
+    async def alist(self, request, *args, **kwargs):
+        tag, last_modified = await thought_versions.aget(request.user.pk)
+        # A page also depends on the cursor, page size and renderer
+        etag = weak_etag(tag, request.accepted_renderer.format, request.META.get('QUERY_STRING', ''))
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = with_validators(await super().alist(request, *args, **kwargs), etag, last_modified)
+        return response
 
-    def perform_create(self, serializer):
-        # Get the original thought text
-        thought_text = serializer.validated_data.get('text', '')
+    async def aretrieve(self, request, *args, **kwargs):
+        thought = await self.aget_object()
+        # The change stamp moves on every write, including queue status changes that leave updated_at alone
+        etag = weak_etag(thought.pk, thought.change_xid, request.accepted_renderer.format)
+        response = not_modified(request, etag, thought.updated_at)
+        if response is None:
+            response = with_validators(Response(self.get_serializer(thought).data), etag, thought.updated_at)
+        return response
 
-        try:
-            # Process the thought through the introspection agent
-            introspective_version = self._introspection_service.process_thought(thought_text)
+    async def acreate(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        thought = await Thought.objects.acreate(
+            user=request.user,
+            introspection_status=IntrospectionStatus.PENDING,
+            **serializer.validated_data
+        )
+        await introspection_queue.aenqueue(thought.pk)
+        # The thought is stored; its introspective version follows in the background
+        return Response(self.get_serializer(thought).data, status=status.HTTP_202_ACCEPTED)
+
+    async def aupdate(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        thought = await self.aget_object()
+        serializer = self.get_serializer(thought, data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+
+        thought_text = serializer.validated_data.get('text')
+        if thought_text is None or thought_text == thought.text:
+            await thought.asave(update_fields=['updated_at'])
+            return Response(self.get_serializer(thought).data)
+
+        if thought_hash(thought_text) == thought_hash(thought.text):
+            # Only whitespace or case changed: the rewrite, or the job making it, still applies
+            thought.text = thought_text
+            await thought.asave(update_fields=['text', 'updated_at'])
+            return Response(self.get_serializer(thought).data)
+
+        thought.text = thought_text
+        thought.introspective_version = None
+        thought.introspection_status = IntrospectionStatus.PENDING
+        thought.introspection_attempts = 0
+        thought.introspection_error = ''
+        thought.introspection_prompt_version = thought.introspection_model = ''
+        thought.introspection_text_hash = ''
+        await thought.asave(update_fields=[
+            'text', 'introspective_version', 'introspection_status', 'introspection_attempts',
+            'introspection_error', 'introspection_prompt_version', 'introspection_model',
+            'introspection_text_hash', 'updated_at'
+        ])
+        await introspection_queue.aenqueue(thought.pk)
+        return Response(self.get_serializer(thought).data, status=status.HTTP_202_ACCEPTED)
 
-            # Save both the original and introspective versions
-            serializer.save(
-                user=self.request.user,
-                introspective_version=introspective_version
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Create many thoughts at once and introspect them as one batch"""
+        if not isinstance(request.data, list):
+            return Response(
+                {'error': 'Expected a list of thoughts'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(request.data) > settings.THOUGHTS_BULK_MAX_ITEMS:
+            return Response(
+                {'error': f'At most {settings.THOUGHTS_BULK_MAX_ITEMS} thoughts per request'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        except Exception as e:
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        # Errors are reported per item, in the order the thoughts were sent
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            thoughts = Thought.objects.bulk_create([
+                Thought(
+                    user=request.user,
+                    introspection_status=IntrospectionStatus.PENDING,
+                    **item
+                )
+                for item in serializer.validated_data
+            ])
+            thoughts_bulk_created.send(sender=Thought, thoughts=thoughts)
+            introspection_queue.enqueue_many([thought.pk for thought in thoughts])
+
+        return Response(
+            self.get_serializer(thoughts, many=True).data,
+            status=status.HTTP_202_ACCEPTED
+        )
+
+    @action(detail=False, methods=['get'])
+    async def export(self, request):
+        """Stream all of the user's thoughts, oldest first, as NDJSON or CSV"""
+        # Not `format`, which DRF reserves for choosing a renderer
+        export_type = request.query_params.get('type', 'ndjson')
+        if export_type not in EXPORT_TYPES:
             return Response(
-                {"error": "Failed to process thought"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': f'Query parameter "type" must be one of: {", ".join(EXPORT_TYPES)}'},
+                status=status.HTTP_400_BAD_REQUEST
             )
+        return export_response(self.get_queryset().order_by('created_at', 'id'), export_type)
 
-    def perform_update(self, serializer):
-        if 'text' in serializer.validated_data:
-            thought_text = serializer.validated_data['text']
+    @action(detail=False, methods=['get'])
+    async def changes(self, request):
+        """Thoughts created, updated or deleted since a cursor, oldest change first"""
+        limit = request.query_params.get('limit') or None
+        if limit is not None:
             try:
-                introspective_version = self._introspection_service.process_thought(thought_text)
-                serializer.save(introspective_version=introspective_version)
-            except Exception as e:
+                limit = int(limit)
+            except ValueError:
+                limit = 0
+            if limit < 1:
                 return Response(
-                    {"error": "Failed to process thought"},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                    {'error': 'Query parameter "limit" must be a positive integer'},
+                    status=status.HTTP_400_BAD_REQUEST
                 )
-        else:
-            serializer.save()
+        try:
+            page = await sync_to_async(thought_changes.since)(
+                request.user.pk, request.query_params.get('since'), limit
+            )
+        except InvalidCursor as err:
+            return Response({'error': str(err)}, status=status.HTTP_400_BAD_REQUEST)
+        except CursorExpired as err:
+            return Response({'error': str(err)}, status=status.HTTP_410_GONE)
+
+        return Response({
+            'changes': self.get_serializer(page.thoughts, many=True).data,
+            'deleted': page.deleted,
+            'cursor': page.cursor,
+            'has_more': page.has_more,
+        })
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Full-text search over the user's thoughts and their introspective versions"""
+        query_text = request.query_params.get('q', '').strip()
+        if not query_text:
+            return Response(
+                {'error': 'Query parameter "q" is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            return Response(
+                {'error': 'Query parameter "limit" must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        query = SearchQuery(query_text, search_type='websearch', config=SEARCH_CONFIG)
+
+        # Rank using only the indexed vector, then build headlines for the top
+        # results alone; ts_headline re-parses the text and is the costly part
+        ranked = list(
+            self.get_queryset()
+            .filter(search_vector=query)
+            .annotate(rank=SearchRank(F('search_vector'), query))
+            .order_by('-rank', '-created_at', '-id')
+            .values_list('id', 'rank')[:limit]
+        )
+        thoughts = self.get_queryset().filter(pk__in=[pk for pk, _ in ranked]).annotate(
+            text_highlight=SearchHeadline('text', query, config=SEARCH_CONFIG),
+            introspective_highlight=SearchHeadline('introspective_version', query, config=SEARCH_CONFIG)
+        ).in_bulk()
+
+        results = []
+        for pk, rank in ranked:
+            thought = thoughts[pk]
+            thought.rank = rank
+            results.append(thought)
+
+        return Response(ThoughtSearchResultSerializer(results, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """The user's other thoughts closest in meaning to this one"""
+        thought = self.get_object()
+        try:
+            k = min(max(int(request.query_params.get('k', 10)), 1), 50)
+        except ValueError:
+            return Response(
+                {'error': 'Query parameter "k" must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        neighbours = embedding_service.similar(thought, k)
+        thoughts = self.get_queryset().in_bulk([thought_id for thought_id, _ in neighbours])
+
+        results = []
+        for thought_id, score in neighbours:
+            neighbour = thoughts.get(thought_id)
+            if neighbour is not None:
+                neighbour.score = score
+                results.append(neighbour)
+
+        return Response(SimilarThoughtSerializer(results, many=True).data)
+
+class ImportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Bulk imports of the authenticated user's thoughts.
+
+    An upload is stored and answered at once; its thoughts are loaded in the
+    background, so clients poll the job to follow its progress.
+    """
+    serializer_class = ImportJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return ImportJob.objects.filter(user=self.request.user)
+
+    async def acreate(self, request, *args, **kwargs):
+        import_format = request.query_params.get('type', ImportFormat.NDJSON)
+        if import_format not in ImportFormat.values:
+            return Response(
+                {'error': f'Query parameter "type" must be one of: {", ".join(ImportFormat.values)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            job = await sync_to_async(self._create_job)(request, import_format)
+        except ImportTooLarge as err:
+            return Response({'error': str(err)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        if job is None:
+            return Response(
+                {'error': 'Send the file as the request body or as the "file" field of a form'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    def _create_job(self, request, import_format):
+        if request.content_type.startswith('multipart/form-data'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return None
+            return thought_importer.create_job(request.user, upload, import_format, size=upload.size)
+
+        # Read straight from the request stream rather than through a parser
+        if request.stream is None:
+            return None
+        size = int(request.META.get('CONTENT_LENGTH') or 0) or None
+        return thought_importer.create_job(request.user, request.stream, import_format, size=size)
+
+    @action(detail=True, methods=['post'])
+    async def retry(self, request, pk=None):
+        """Resume a failed import from the last chunk it loaded"""
+        job = await self.aget_object()
+        if not await sync_to_async(thought_importer.retry)(job):
+            return Response(
+                {'error': 'Only failed imports can be retried'},
+                status=status.HTTP_409_CONFLICT
+            )
+        await job.arefresh_from_db()
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,106 @@
+import hashlib
+import re
+import threading
+from typing import List
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+_TOKEN = re.compile(r"[\w']+")
+
+class BaseEmbedder:
+    """
+    Turns texts into L2-normalized float32 vectors.
+
+    Subclasses set `dimensions` and implement `_embed`. `name` identifies the
+    vector space, so vectors from different embedders are never compared.
+    """
+    dimensions: int
+
+    @property
+    def name(self) -> str:
+        return f"{type(self).__name__}:{self.dimensions}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed a batch of texts
+
+        Args:
+            texts: The texts to embed
+
+        Returns:
+            np.ndarray: float32 array of shape (len(texts), dimensions), one unit vector per row
+        """
+        if not texts:
+            return np.empty((0, self.dimensions), dtype=np.float32)
+        vectors = np.asarray(self._embed(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _embed(self, texts: List[str]):
+        raise NotImplementedError
+
+class HashingEmbedder(BaseEmbedder):
+    """
+    Deterministic offline embedder using signed feature hashing.
+
+    Word unigrams and bigrams are hashed into a fixed number of buckets.
+    No model or network is needed, and the same text always maps to the
+    same vector.
+    """
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def _features(self, text: str) -> List[str]:
+        words = _TOKEN.findall(text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+                value = int.from_bytes(digest, 'little')
+                sign = 1.0 if value & 1 else -1.0
+                vectors[row, (value >> 1) % self.dimensions] += sign
+        return vectors
+
+class OpenAIEmbedder(BaseEmbedder):
+    """Embedder backed by the OpenAI embeddings API"""
+
+    def __init__(self, model: str = 'text-embedding-3-small', dimensions: int = 512):
+        import openai
+        from langchain_openai import OpenAIEmbeddings
+        from apps.outbound.clients import outbound_http
+
+        self.model = model
+        self.dimensions = dimensions
+        self._client = OpenAIEmbeddings(
+            model=model,
+            dimensions=dimensions,
+            client=openai.OpenAI(http_client=outbound_http.client).embeddings
+        )
+
+    @property
+    def name(self) -> str:
+        return f"openai:{self.model}:{self.dimensions}"
+
+    def _embed(self, texts: List[str]):
+        return self._client.embed_documents(texts)
+
+_embedder = None
+_lock = threading.Lock()
+
+def get_embedder() -> BaseEmbedder:
+    """Return the embedder configured in settings.EMBEDDINGS, built once per process"""
+    global _embedder
+    if _embedder is None:
+        with _lock:
+            if _embedder is None:
+                options = settings.EMBEDDINGS
+                embedder_class = import_string(options['EMBEDDER'])
+                _embedder = embedder_class(**options.get('OPTIONS', {}))
+    return _embedder
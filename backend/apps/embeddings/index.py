@@ -0,0 +1,137 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+class UserVectorIndex:
+    """
+    In-memory nearest-neighbour index over one user's thought vectors.
+
+    Vectors are unit length and kept in one contiguous float32 matrix, so a
+    query is a single matrix-vector product. Rows are added, replaced and
+    removed in place. Capacity doubles as it grows, and a removal moves the
+    last row into the gap.
+    """
+
+    def __init__(self, dimensions: int, version=None):
+        self.dimensions = dimensions
+        self.version = version
+        self._matrix = np.empty((16, dimensions), dtype=np.float32)
+        self._ids = np.empty(16, dtype=np.int64)
+        self._positions: Dict[int, int] = {}
+        self._size = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, thought_id: int) -> bool:
+        return thought_id in self._positions
+
+    def _grow(self) -> None:
+        capacity = self._matrix.shape[0] * 2
+        matrix = np.empty((capacity, self.dimensions), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids = np.empty(capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        self._matrix, self._ids = matrix, ids
+
+    def upsert(self, thought_id: int, vector: np.ndarray) -> None:
+        """Add a vector, or replace the one already stored for the thought"""
+        with self._lock:
+            position = self._positions.get(thought_id)
+            if position is None:
+                if self._size == self._matrix.shape[0]:
+                    self._grow()
+                position = self._size
+                self._positions[thought_id] = position
+                self._ids[position] = thought_id
+                self._size += 1
+            self._matrix[position] = vector
+
+    def remove(self, thought_id: int) -> None:
+        with self._lock:
+            position = self._positions.pop(thought_id, None)
+            if position is None:
+                return
+            last = self._size - 1
+            if position != last:
+                self._matrix[position] = self._matrix[last]
+                self._ids[position] = self._ids[last]
+                self._positions[int(self._ids[position])] = position
+            self._size = last
+
+    def vector(self, thought_id: int) -> Optional[np.ndarray]:
+        with self._lock:
+            position = self._positions.get(thought_id)
+            return None if position is None else self._matrix[position].copy()
+
+    def search(self, vector: np.ndarray, k: int, exclude: Tuple[int, ...] = ()) -> List[Tuple[int, float]]:
+        """
+        Find the stored vectors closest to `vector` by cosine similarity
+
+        Args:
+            vector: Unit-length query vector
+            k: Number of neighbours to return
+            exclude: Thought ids to leave out of the results
+
+        Returns:
+            list: (thought_id, score) pairs, most similar first
+        """
+        with self._lock:
+            if self._size == 0:
+                return []
+            scores = self._matrix[:self._size] @ vector
+            ids = self._ids[:self._size].copy()
+
+        if exclude:
+            keep = ~np.isin(ids, exclude)
+            scores, ids = scores[keep], ids[keep]
+        k = min(k, scores.shape[0])
+        if k == 0:
+            return []
+
+        # argpartition keeps this linear; only the k winners get sorted
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+class VectorIndexRegistry:
+    """
+    Per-user indexes for this process, least recently used evicted first.
+
+    Each index records the user's shared version stamp from when it was
+    loaded. When another process has written since, the stamps differ and
+    the index is reloaded from the database.
+    """
+
+    def __init__(self, loader: Callable[[int, int], UserVectorIndex], max_users: int = 1000):
+        self._loader = loader
+        self.max_users = max_users
+        self._indexes: "OrderedDict[int, UserVectorIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, version) -> UserVectorIndex:
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None and index.version == version:
+                self._indexes.move_to_end(user_id)
+                return index
+
+        index = self._loader(user_id, version)
+        with self._lock:
+            self._indexes[user_id] = index
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+        return index
+
+    def peek(self, user_id: int) -> Optional[UserVectorIndex]:
+        """The loaded index for a user, if any, without loading it"""
+        with self._lock:
+            return self._indexes.get(user_id)
+
+    def discard(self, user_id: int) -> None:
+        with self._lock:
+            self._indexes.pop(user_id, None)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from apps.embeddings.services import embedding_service
+from apps.thoughts.models import Thought
+
+class Command(BaseCommand):
+    help = "Embed thoughts that have no vector yet (or all of them with --force)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--user', type=int, help="Only embed this user's thoughts")
+        parser.add_argument('--force', action='store_true', help="Re-embed thoughts that already have a vector")
+
+    def handle(self, *args, **options):
+        thoughts = Thought.objects.only('id', 'user_id', 'text').order_by('id')
+        if options['user']:
+            thoughts = thoughts.filter(user_id=options['user'])
+
+        chunk, embedded = [], 0
+        for thought in thoughts.iterator(chunk_size=options['chunk_size']):
+            chunk.append(thought)
+            if len(chunk) == options['chunk_size']:
+                embedded += embedding_service.index_thoughts(chunk, force=options['force'])
+                chunk = []
+        if chunk:
+            embedded += embedding_service.index_thoughts(chunk, force=options['force'])
+
+        self.stdout.write(f"Embedded {embedded} thought(s)")
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-18 20:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('thoughts', '0006_thought_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThoughtEmbedding',
+            fields=[
+                ('thought', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='embedding', serialize=False, to='thoughts.thought')),
+                ('embedder', models.CharField(max_length=100)),
+                ('source_hash', models.CharField(max_length=64)),
+                ('vector', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'thought_embeddings',
+                'indexes': [models.Index(fields=['user', 'embedder'], name='thought_emb_user_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+import numpy as np
+from django.db import models
+from django.conf import settings
+from apps.thoughts.models import Thought
+
+class ThoughtEmbedding(models.Model):
+    """Embedding of a thought's text, stored as a packed float32 array"""
+    thought = models.OneToOneField(
+        Thought,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='embedding'
+    )
+    # Denormalized from the thought so a user's vectors load with one index scan
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    embedder = models.CharField(max_length=100)
+    source_hash = models.CharField(max_length=64)
+    vector = models.BinaryField()
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'thought_embeddings'
+        indexes = [
+            models.Index(fields=['user', 'embedder'], name='thought_emb_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"Embedding for thought {self.thought_id} ({self.embedder})"
+
+    def as_array(self) -> np.ndarray:
+        return np.frombuffer(self.vector, dtype=np.float32)
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.thoughts.models import Thought
+from apps.thoughts.signals import thoughts_bulk_created
+from .services import embedding_service
+
+@receiver(post_save, sender=Thought)
+def embed_saved_thought(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'text' not in update_fields:
+        return
+    embedding_service.enqueue([instance])
+
+@receiver(thoughts_bulk_created, sender=Thought)
+def embed_bulk_created_thoughts(sender, thoughts, **kwargs):
+    embedding_service.enqueue(thoughts)
+
+@receiver(post_delete, sender=Thought)
+def forget_deleted_thought(sender, instance, origin=None, **kwargs):
+    # Deleted along with their user: the whole index goes unused, no need to bump it per thought
+    if origin is not None and getattr(origin, 'model', type(origin)) is not Thought:
+        return
+    embedding_service.enqueue_forget(instance.user_id, instance.pk)
@@ -0,0 +1,250 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, transaction
+
+from apps.thoughts.models import Thought
+from .embedders import BaseEmbedder, get_embedder
+from .index import UserVectorIndex, VectorIndexRegistry
+from .models import ThoughtEmbedding
+
+logger = logging.getLogger(__name__)
+
+def source_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class ThoughtEmbeddingService:
+    """
+    Keeps thought embeddings and the per-user similarity indexes in step with writes.
+
+    Writes are embedded after they commit, off the request thread, so saving
+    a thought never waits on the embedder. Each user's index carries a
+    version kept in `shared_cache`; a write moves it on by one, and a process
+    holding an index at another version reloads it.
+
+    Backends:
+        thread: embed on a background worker, one job at a time in commit order (default)
+        sync: embed inline once the transaction commits, which is handy when debugging
+    """
+
+    BACKENDS = ('thread', 'sync')
+    # How long a claimed version step stays claimed if its writer dies before finishing it
+    CLAIM_TIMEOUT = 30
+
+    def __init__(self, backend='thread', shared_cache='default', max_indexed_users=1000, poll_interval=0.01):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown embeddings backend: {backend}")
+        self.backend = backend
+        self.shared_cache = shared_cache
+        self.poll_interval = poll_interval
+        self.registry = VectorIndexRegistry(self._load_index, max_users=max_indexed_users)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        options = settings.EMBEDDINGS
+        return cls(
+            backend=options.get('BACKEND', 'thread'),
+            shared_cache=options.get('SHARED_CACHE', 'default'),
+            max_indexed_users=options.get('MAX_INDEXED_USERS', 1000),
+        )
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # One worker, so two writes to a thought are embedded in the order they committed
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='embeddings')
+        return self._executor
+
+    def enqueue(self, thoughts: Iterable[Thought]) -> None:
+        """Embed saved thoughts once the current transaction commits"""
+        thought_ids = [thought.pk for thought in thoughts]
+        if thought_ids:
+            transaction.on_commit(lambda: self._dispatch(self._index_ids, thought_ids))
+
+    def enqueue_forget(self, user_id: int, thought_id: int) -> None:
+        """Drop a deleted thought from the index once the current transaction commits"""
+        transaction.on_commit(lambda: self._dispatch(self.forget, user_id, thought_id))
+
+    def _dispatch(self, job, *args) -> None:
+        if self.backend == 'sync':
+            self._run(job, *args)
+        else:
+            self._get_executor().submit(self._run_in_worker, job, *args)
+
+    def _run(self, job, *args) -> None:
+        # An embedding failure must not fail the write that triggered it;
+        # the similar endpoint embeds missing thoughts on demand
+        try:
+            job(*args)
+        except Exception as err:
+            logger.error(f"Embedding job failed: {err}", exc_info=True)
+
+    def _run_in_worker(self, job, *args) -> None:
+        close_old_connections()
+        try:
+            self._run(job, *args)
+        finally:
+            close_old_connections()
+
+    def _index_ids(self, thought_ids: List[int]) -> None:
+        # Read back, so the text embedded is the latest and deleted thoughts are skipped
+        self.index_thoughts(Thought.objects.filter(pk__in=thought_ids).only('id', 'user_id', 'text'))
+
+    @property
+    def embedder(self) -> BaseEmbedder:
+        return get_embedder()
+
+    def _version_key(self, user_id: int) -> str:
+        return f'embeddings:index-version:{user_id}'
+
+    def _get_version(self, user_id: int) -> int:
+        cache = caches[self.shared_cache]
+        key = self._version_key(user_id)
+        version = cache.get(key)
+        if version is None:
+            # New, or evicted: start past any version a process may still hold
+            initial = time.time_ns() // 1000
+            cache.add(key, initial, timeout=None)
+            version = cache.get(key, initial)
+        return version
+
+    def _bump_version(self, user_id: int) -> int:
+        """
+        Move the user's shared version on by one, telling other processes
+        that their copy of the index is stale
+
+        Each step is claimed with `add`, which only one caller can win, and
+        only its winner writes the next version. No two writers ever get the
+        same version, and it never goes backwards, on any cache backend.
+
+        Returns:
+            int: The new version; the one bumped from is one less
+        """
+        cache = caches[self.shared_cache]
+        key = self._version_key(user_id)
+        while True:
+            previous = self._get_version(user_id)
+            if cache.add(f'{key}:from:{previous}', 1, timeout=self.CLAIM_TIMEOUT):
+                cache.set(key, previous + 1, timeout=None)
+                return previous + 1
+            # Another writer took this step; wait for its version to land
+            time.sleep(self.poll_interval)
+
+    def _update_index(self, user_id: int, apply: Callable[[UserVectorIndex], None]) -> None:
+        """
+        Bump the user's shared version and patch this process's index to match
+
+        The index is patched only if the bump was the very next step from its
+        version. Otherwise another writer got in between, and patching would
+        stamp the index current while it misses that write, so it is dropped
+        and reloaded on next use instead.
+        """
+        version = self._bump_version(user_id)
+        index = self.registry.peek(user_id)
+        if index is None:
+            return
+        if index.version == version - 1:
+            apply(index)
+            index.version = version
+        else:
+            self.registry.discard(user_id)
+
+    def _load_index(self, user_id: int, version: int) -> UserVectorIndex:
+        embedder = self.embedder
+        index = UserVectorIndex(embedder.dimensions, version)
+        rows = ThoughtEmbedding.objects.filter(
+            user_id=user_id, embedder=embedder.name
+        ).values_list('thought_id', 'vector')
+        for thought_id, vector in rows.iterator(chunk_size=2000):
+            index.upsert(thought_id, np.frombuffer(vector, dtype=np.float32))
+        return index
+
+    def index_thoughts(self, thoughts: Iterable[Thought], force: bool = False) -> int:
+        """
+        Embed thoughts and store their vectors, skipping texts already embedded
+
+        Args:
+            thoughts: Saved thoughts
+            force: Re-embed even when the stored vector matches the text
+
+        Returns:
+            int: Number of thoughts embedded
+        """
+        embedder = self.embedder
+        thoughts = list(thoughts)
+        hashes = {thought.pk: source_hash(thought.text) for thought in thoughts}
+        if not force:
+            current = dict(
+                ThoughtEmbedding.objects.filter(
+                    thought_id__in=list(hashes), embedder=embedder.name
+                ).values_list('thought_id', 'source_hash')
+            )
+            thoughts = [thought for thought in thoughts if current.get(thought.pk) != hashes[thought.pk]]
+        if not thoughts:
+            return 0
+
+        vectors = embedder.embed([thought.text for thought in thoughts])
+        ThoughtEmbedding.objects.bulk_create(
+            [
+                ThoughtEmbedding(
+                    thought_id=thought.pk,
+                    user_id=thought.user_id,
+                    embedder=embedder.name,
+                    source_hash=hashes[thought.pk],
+                    vector=vector.tobytes()
+                )
+                for thought, vector in zip(thoughts, vectors)
+            ],
+            update_conflicts=True,
+            unique_fields=['thought'],
+            update_fields=['embedder', 'source_hash', 'vector', 'updated_at']
+        )
+
+        by_user = defaultdict(list)
+        for thought, vector in zip(thoughts, vectors):
+            by_user[thought.user_id].append((thought.pk, vector))
+        for user_id, items in by_user.items():
+            def upsert(index, items=items):
+                for thought_id, vector in items:
+                    index.upsert(thought_id, vector)
+            self._update_index(user_id, upsert)
+        return len(thoughts)
+
+    def forget(self, user_id: int, thought_id: int) -> None:
+        """Drop a deleted thought from the index (its row goes with the thought)"""
+        self._update_index(user_id, lambda index: index.remove(thought_id))
+
+    def similar(self, thought: Thought, k: int = 10) -> List[Tuple[int, float]]:
+        """
+        Find the user's thoughts closest in meaning to the given one
+
+        Args:
+            thought: The thought to compare against
+            k: Number of neighbours to return
+
+        Returns:
+            list: (thought_id, score) pairs, most similar first
+        """
+        index = self.registry.get(thought.user_id, self._get_version(thought.user_id))
+        vector = index.vector(thought.pk)
+        if vector is None:
+            # Written before embeddings existed, or embedding failed at write time
+            self.index_thoughts([thought])
+            index = self.registry.get(thought.user_id, self._get_version(thought.user_id))
+            vector = index.vector(thought.pk)
+            if vector is None:
+                return []
+        return index.search(vector, k, exclude=(thought.pk,))
+
+embedding_service = ThoughtEmbeddingService.from_settings()
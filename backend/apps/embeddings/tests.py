@@ -0,0 +1,93 @@
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+
+from apps.thoughts.models import Thought
+from .models import ThoughtEmbedding
+from .services import ThoughtEmbeddingService
+
+User = get_user_model()
+
+class ThoughtEmbeddingServiceTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.service = ThoughtEmbeddingService(backend='sync', shared_cache='default')
+        # The receivers hand writes to this service instead of the process-wide one
+        patcher = mock.patch('apps.embeddings.receivers.embedding_service', self.service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create(username='embedder')
+
+    def create_thought(self, text):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Thought.objects.create(user=self.user, text=text)
+
+    def test_write_is_embedded_once_it_commits(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            thought = Thought.objects.create(user=self.user, text='Walked by the river')
+            self.assertFalse(ThoughtEmbedding.objects.exists())
+
+        for callback in callbacks:
+            callback()
+
+        self.assertTrue(ThoughtEmbedding.objects.filter(thought=thought).exists())
+
+    def test_thought_deleted_before_its_job_is_skipped(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            thought = Thought.objects.create(user=self.user, text='Gone soon')
+        thought.delete()
+
+        for callback in callbacks:
+            callback()
+
+        self.assertFalse(ThoughtEmbedding.objects.exists())
+
+    def test_each_version_step_goes_to_one_writer(self):
+        start = self.service._get_version(self.user.pk)
+        versions = []
+
+        def bump():
+            versions.append(self.service._bump_version(self.user.pk))
+        threads = [threading.Thread(target=bump) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(versions), list(range(start + 1, start + 9)))
+
+    def test_current_index_is_patched_in_place(self):
+        first = self.create_thought('The cat sat on the mat')
+        index = self.service.registry.get(self.user.pk, self.service._get_version(self.user.pk))
+
+        second = self.create_thought('A cat sat on a mat')
+
+        self.assertIs(self.service.registry.peek(self.user.pk), index)
+        self.assertEqual(index.version, self.service._get_version(self.user.pk))
+        self.assertIn(second.pk, index)
+        self.assertIn(first.pk, index)
+
+    def test_index_behind_another_writer_is_reloaded(self):
+        self.create_thought('The cat sat on the mat')
+        self.service.registry.get(self.user.pk, self.service._get_version(self.user.pk))
+        # Another process writes without this one seeing it
+        self.service._bump_version(self.user.pk)
+
+        thought = self.create_thought('A cat sat on a mat')
+
+        self.assertIsNone(self.service.registry.peek(self.user.pk))
+        index = self.service.registry.get(self.user.pk, self.service._get_version(self.user.pk))
+        self.assertIn(thought.pk, index)
+
+    def test_similar_ranks_closest_thoughts_first(self):
+        thought = self.create_thought('The cat sat on the mat')
+        close = self.create_thought('A cat sat on a mat')
+        self.create_thought('Quarterly tax filing deadline')
+
+        ranked = [thought_id for thought_id, _ in self.service.similar(thought)]
+
+        self.assertEqual(ranked[0], close.pk)
+        self.assertNotIn(thought.pk, ranked)
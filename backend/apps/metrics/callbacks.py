@@ -0,0 +1,43 @@
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .instruments import llm_latency, llm_tokens
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """Records latency and token usage of every call made by a chat model"""
+
+    # Only updates counters, so it is safe to run on the event loop
+    run_inline = True
+
+    def __init__(self):
+        self._runs: Dict[UUID, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any) -> None:
+        params = kwargs.get('invocation_params') or {}
+        model = params.get('model_name') or params.get('model') or params.get('_type', 'unknown')
+        with self._lock:
+            self._runs[run_id] = (model, time.perf_counter())
+
+    def _finish(self, run_id: UUID, outcome: str) -> Optional[str]:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return None
+        model, started = run
+        llm_latency.labels(model, outcome).observe(time.perf_counter() - started)
+        return model
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        model = self._finish(run_id, 'success')
+        usage = (response.llm_output or {}).get('token_usage') or {}
+        for kind in ('prompt_tokens', 'completion_tokens'):
+            if model and usage.get(kind):
+                llm_tokens.labels(model, kind.split('_')[0]).inc(usage[kind])
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, 'error')
@@ -0,0 +1,72 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# Buckets in seconds, from a cache hit up to a slow model call
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+request_latency = Histogram(
+    'http_request_duration_seconds',
+    'Time to produce a response, by view',
+    ['view', 'method', 'status'],
+    buckets=LATENCY_BUCKETS,
+)
+request_db_queries = Histogram(
+    'http_request_db_queries',
+    'Database queries made while handling a request',
+    ['view'],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+request_db_time = Histogram(
+    'http_request_db_duration_seconds',
+    'Time spent in database queries while handling a request',
+    ['view'],
+    buckets=LATENCY_BUCKETS,
+)
+
+llm_latency = Histogram(
+    'llm_call_duration_seconds',
+    'Chat model call latency',
+    ['model', 'outcome'],
+    buckets=LATENCY_BUCKETS,
+)
+llm_tokens = Counter(
+    'llm_tokens',
+    'Tokens reported by the chat model provider',
+    ['model', 'type'],
+)
+llm_concurrency_limit = Gauge(
+    'llm_concurrency_limit',
+    'Chat model calls the adaptive limiter currently allows in flight',
+    multiprocess_mode='livesum',
+)
+llm_circuit_open = Gauge(
+    'llm_circuit_open',
+    '1 while the circuit breaker fails chat model calls fast',
+    multiprocess_mode='livemax',
+)
+llm_calls_rejected = Counter(
+    'llm_calls_rejected',
+    'Chat model calls refused before reaching the provider',
+    ['reason'],
+)
+llm_call_policy_events = Counter(
+    'llm_call_policy_events',
+    'Chat model retries, hedged requests and hedges that answered first',
+    ['event'],
+)
+
+introspection_cache_lookups = Counter(
+    'introspection_cache_lookups',
+    'Introspection cache lookups by result',
+    ['result'],
+)
+introspection_fallbacks = Counter(
+    'introspection_fallbacks',
+    'Thoughts whose original text was used because introspection failed',
+    ['source'],
+)
+introspection_jobs = Counter(
+    'introspection_jobs',
+    'Finished introspection job attempts by outcome',
+    ['outcome'],
+)
@@ -0,0 +1,73 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+
+from .instruments import request_db_queries, request_db_time, request_latency
+
+class RequestStats:
+    """Database work done on behalf of one request"""
+    __slots__ = ('queries', 'db_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+# Set for the duration of a request. sync_to_async copies the context into
+# its worker thread, so queries from async views are attributed correctly.
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar('metrics_request', default=None)
+
+def record_query(execute, sql, params, many, context):
+    stats = _current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver that hooks every new connection"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+def _observe(request, response, stats: RequestStats, started: float) -> None:
+    match = request.resolver_match
+    # The URL name rather than the path keeps label cardinality bounded
+    view = (match.view_name or match.route) if match else 'unmatched'
+    request_latency.labels(view, request.method, str(response.status_code)).observe(time.perf_counter() - started)
+    request_db_queries.labels(view).observe(stats.queries)
+    request_db_time.labels(view).observe(stats.db_time)
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """
+    Records latency and database usage for every request.
+
+    For streaming responses the latency is the time to the first byte.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            stats, started = RequestStats(), time.perf_counter()
+            token = _current_request.set(stats)
+            try:
+                response = await get_response(request)
+            finally:
+                _current_request.reset(token)
+            _observe(request, response, stats, started)
+            return response
+    else:
+        def middleware(request):
+            stats, started = RequestStats(), time.perf_counter()
+            token = _current_request.set(stats)
+            try:
+                response = get_response(request)
+            finally:
+                _current_request.reset(token)
+            _observe(request, response, stats, started)
+            return response
+    return middleware
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+
+class OutboundConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.outbound'
+
+    def ready(self):
+        from you_backend.lifespan import on_shutdown, on_startup
+        from .clients import outbound_http
+
+        on_startup(outbound_http.startup)
+        on_shutdown(outbound_http.shutdown)
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Dict, Optional
+
+import httpx
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+class OutboundHttp:
+    """
+    The process's pooled HTTP clients for calls to other services.
+
+    One sync client serves every thread, and one async client serves the
+    ASGI event loop. Connections are kept alive and, where the server
+    supports it, multiplexed over HTTP/2, so repeat calls to OpenAI or Google
+    skip the TCP and TLS handshakes. Hosts listed in `hosts` get their own
+    pool with its own limits, so a slow provider cannot take every connection.
+
+    An async pool belongs to the event loop that first used it. Code that
+    may run on another loop, such as `async_to_sync` in a worker thread, should
+    use `aclient()`, which gives each other loop a pool of its own, and close
+    that pool with `aclose_loop_client()` before the loop ends.
+    """
+
+    # Seconds to wait for another loop to close its pool during shutdown
+    SHUTDOWN_TIMEOUT = 5.0
+
+    def __init__(
+        self,
+        http2: bool = True,
+        timeout: Optional[Dict[str, float]] = None,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        hosts: Optional[Dict[str, Dict[str, int]]] = None
+    ):
+        timeout = timeout or {}
+        self.http2 = http2
+        self.timeout = httpx.Timeout(
+            connect=timeout.get('CONNECT', 5.0),
+            read=timeout.get('READ', 60.0),
+            write=timeout.get('WRITE', 10.0),
+            pool=timeout.get('POOL', 10.0),
+        )
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.hosts = hosts or {}
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        options = settings.OUTBOUND_HTTP
+        return cls(
+            http2=options.get('HTTP2', True),
+            timeout=options.get('TIMEOUT'),
+            max_connections=options.get('MAX_CONNECTIONS', 100),
+            max_keepalive_connections=options.get('MAX_KEEPALIVE_CONNECTIONS', 20),
+            keepalive_expiry=options.get('KEEPALIVE_EXPIRY', 30.0),
+            hosts=options.get('HOSTS'),
+        )
+
+    def _host_limits(self, host_options: Dict[str, int]) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=host_options.get('MAX_CONNECTIONS', self.limits.max_connections),
+            max_keepalive_connections=host_options.get(
+                'MAX_KEEPALIVE_CONNECTIONS', self.limits.max_keepalive_connections
+            ),
+            keepalive_expiry=self.limits.keepalive_expiry,
+        )
+
+    def _build(self) -> httpx.Client:
+        return httpx.Client(
+            http2=self.http2,
+            timeout=self.timeout,
+            limits=self.limits,
+            mounts={
+                f'all://{host}': httpx.HTTPTransport(http2=self.http2, limits=self._host_limits(host_options))
+                for host, host_options in self.hosts.items()
+            },
+        )
+
+    def _abuild(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            http2=self.http2,
+            timeout=self.timeout,
+            limits=self.limits,
+            mounts={
+                f'all://{host}': httpx.AsyncHTTPTransport(http2=self.http2, limits=self._host_limits(host_options))
+                for host, host_options in self.hosts.items()
+            },
+        )
+
+    @property
+    def client(self) -> httpx.Client:
+        """The shared sync client"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._build()
+        return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """The shared async client, for the ASGI event loop"""
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    self._async_client = self._abuild()
+        return self._async_client
+
+    def aclient(self) -> httpx.AsyncClient:
+        """The async client for the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # The first loop to ask is taken to be the server's, unless startup said otherwise
+            if self._loop is None:
+                self._loop = loop
+        if loop is self._loop:
+            return self.async_client
+
+        with self._lock:
+            client = self._loop_clients.get(loop)
+            if client is None:
+                client = self._loop_clients[loop] = self._abuild()
+            return client
+
+    async def aclose_loop_client(self) -> None:
+        """Close the running loop's own pool, if it has one; call before the loop ends"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._loop_clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+    async def startup(self) -> None:
+        """ASGI lifespan hook: adopt the server's event loop and open the async pool"""
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+        self.async_client
+
+    async def shutdown(self) -> None:
+        """
+        ASGI lifespan hook: close the async pools so connections end cleanly
+
+        The sync client is left open for the rest of the process: the model
+        clients built at startup hold it, and worker threads may still be
+        finishing calls with it.
+        """
+        with self._lock:
+            async_client, self._async_client = self._async_client, None
+            loop_clients = list(self._loop_clients.items())
+            self._loop_clients.clear()
+            self._loop = None
+        if async_client is not None:
+            await async_client.aclose()
+        for loop, client in loop_clients:
+            # A pool can only be closed on its own loop; one whose loop has
+            # stopped went without being closed and is left to the garbage collector
+            if loop.is_running():
+                try:
+                    await asyncio.wait_for(
+                        asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client.aclose(), loop)),
+                        self.SHUTDOWN_TIMEOUT
+                    )
+                except (asyncio.TimeoutError, RuntimeError) as err:
+                    logger.warning(f"Could not close an outbound HTTP pool: {err!r}")
+        logger.info("Closed outbound HTTP connection pools")
+
+outbound_http = OutboundHttp.from_settings()
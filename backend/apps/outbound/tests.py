@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+from django.test import SimpleTestCase
+
+from .clients import OutboundHttp
+
+class OutboundHttpTests(SimpleTestCase):
+    def setUp(self):
+        self.http = OutboundHttp(http2=False)
+        # Adopt a server loop, so every loop below gets a pool of its own
+        asyncio.run(self.http.startup())
+
+    def _start_loop(self):
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+
+        def stop():
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+        self.addCleanup(stop)
+        return loop
+
+    def test_loop_pool_is_closed_with_its_loop(self):
+        async def use_and_close():
+            client = self.http.aclient()
+            self.assertIs(self.http.aclient(), client)
+            await self.http.aclose_loop_client()
+            return client
+
+        client = asyncio.run(use_and_close())
+
+        self.assertTrue(client.is_closed)
+        self.assertEqual(len(self.http._loop_clients), 0)
+
+    def test_shutdown_closes_pools_of_running_loops(self):
+        async def get_client():
+            return self.http.aclient()
+        client = asyncio.run_coroutine_threadsafe(get_client(), self._start_loop()).result()
+
+        asyncio.run(self.http.shutdown())
+
+        self.assertTrue(client.is_closed)
+
+    def test_shutdown_leaves_the_sync_client_open(self):
+        client = self.http.client
+
+        asyncio.run(self.http.shutdown())
+
+        self.assertFalse(client.is_closed)
+        self.assertIs(self.http.client, client)
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Thought
+from django.contrib.postgres.search import SearchQuery
+from django.db.models import Q
+from .models import SEARCH_CONFIG, ImportJob, Thought
 
 @admin.register(Thought)
 class ThoughtAdmin(admin.ModelAdmin):
@@ -7,3 +9,16 @@ class ThoughtAdmin(admin.ModelAdmin):
     list_filter = ('created_at', 'user')
     search_fields = ('text', 'user__username')
     ordering = ('-created_at',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Match thought text through the indexed search vector rather than ILIKE scans
+        if not search_term:
+            return queryset, False
+        query = SearchQuery(search_term, search_type='websearch', config=SEARCH_CONFIG)
+        return queryset.filter(Q(search_vector=query) | Q(user__username=search_term)), False
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('user', 'format', 'status', 'rows_imported', 'rows_skipped', 'created_at')
+    list_filter = ('status', 'format')
+    readonly_fields = ('offset', 'rows_imported', 'rows_skipped', 'size')
@@ -1,6 +1,117 @@
 from django.apps import AppConfig
+from django.conf import settings
+
+
+def create_model_guard():
+    """Build the introspection agent's limiter and circuit breaker from settings"""
+    from agents.resilience import AdaptiveLimiter, CircuitBreaker, ModelCallGuard, OPEN
+    from apps.metrics.instruments import llm_calls_rejected, llm_circuit_open, llm_concurrency_limit
+
+    options = settings.INTROSPECTION_RESILIENCE
+    limiter = breaker = None
+
+    concurrency = options.get('CONCURRENCY', {})
+    if concurrency.get('ENABLED', True):
+        limiter = AdaptiveLimiter(
+            initial_limit=concurrency.get('INITIAL_LIMIT', 8),
+            min_limit=concurrency.get('MIN_LIMIT', 1),
+            max_limit=concurrency.get('MAX_LIMIT', 64),
+            queue_timeout=concurrency.get('QUEUE_TIMEOUT', 10.0),
+            latency_tolerance=concurrency.get('LATENCY_TOLERANCE', 2.0),
+            backoff=concurrency.get('BACKOFF', 0.75),
+            on_limit_change=llm_concurrency_limit.set,
+        )
+        llm_concurrency_limit.set(limiter.limit)
+
+    circuit = options.get('CIRCUIT_BREAKER', {})
+    if circuit.get('ENABLED', True):
+        breaker = CircuitBreaker(
+            failure_rate=circuit.get('FAILURE_RATE', 0.5),
+            min_calls=circuit.get('MIN_CALLS', 20),
+            window=circuit.get('WINDOW', 30),
+            reset_timeout=circuit.get('RESET_TIMEOUT', 30),
+            half_open_calls=circuit.get('HALF_OPEN_CALLS', 1),
+            on_state_change=lambda state: llm_circuit_open.set(state == OPEN),
+        )
+        llm_circuit_open.set(0)
+
+    return ModelCallGuard(
+        limiter=limiter,
+        breaker=breaker,
+        on_reject=lambda reason: llm_calls_rejected.labels(reason).inc(),
+    )
+
+
+def create_call_policy():
+    """Build the introspection agent's retry and hedging policy from settings"""
+    from agents.resilience import CallPolicy, HedgePolicy, RetryPolicy
+    from apps.metrics.instruments import llm_call_policy_events
+
+    options = settings.INTROSPECTION_RESILIENCE
+    retry = hedge = None
+
+    retries = options.get('RETRY', {})
+    if retries.get('MAX_ATTEMPTS', 3) > 1:
+        retry = RetryPolicy(
+            max_attempts=retries['MAX_ATTEMPTS'],
+            base_delay=retries.get('BASE_DELAY', 0.5),
+            max_delay=retries.get('MAX_DELAY', 8.0),
+        )
+
+    hedging = options.get('HEDGE', {})
+    if hedging.get('ENABLED', False):
+        hedge = HedgePolicy(
+            quantile=hedging.get('QUANTILE', 0.95),
+            min_samples=hedging.get('MIN_SAMPLES', 20),
+            budget=hedging.get('BUDGET', 0.1),
+        )
+
+    return CallPolicy(
+        retry=retry,
+        hedge=hedge,
+        on_event=lambda event: llm_call_policy_events.labels(event).inc(),
+    )
 
 
 class ThoughtsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.thoughts'
+
+    def ready(self):
+        from . import receivers  # noqa: F401
+        from agents.introspection import IntrospectionAgent
+        from agents.registry import INTROSPECTION, register_agent, warm_up
+        from agents.providers import OPENAI
+        from apps.metrics.callbacks import LLMMetricsHandler
+        from apps.outbound.clients import outbound_http
+
+        options = settings.INTROSPECTION_PROVIDER
+        provider = options.get('BACKEND', OPENAI)
+
+        def provider_options():
+            provider_options = dict(options.get('OPTIONS', {}))
+            if provider == OPENAI:
+                provider_options.update(
+                    http_client=outbound_http.client,
+                    http_async_client=outbound_http.async_client,
+                )
+            return provider_options
+
+        register_agent(INTROSPECTION, lambda: IntrospectionAgent(
+            model_name=options.get('MODEL', 'gpt-4o-mini'),
+            provider=provider,
+            provider_options=provider_options(),
+            callbacks=[LLMMetricsHandler()],
+            guard=create_model_guard(),
+            policy=create_call_policy(),
+        ))
+        if settings.INTROSPECTION_WARM_UP:
+            warm_up()
+
+        from you_backend.lifespan import on_shutdown, on_startup
+        from .imports import thought_importer
+        from .tasks import introspection_queue
+
+        on_startup(introspection_queue.startup)
+        on_startup(thought_importer.startup)
+        on_shutdown(thought_importer.shutdown)
@@ -0,0 +1,169 @@
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from apps.metrics.instruments import introspection_cache_lookups
+
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_thought(text: str) -> str:
+    """Canonical form of a thought used for cache lookups"""
+    text = unicodedata.normalize('NFKC', text)
+    return _WHITESPACE.sub(' ', text).strip().lower()
+
+def thought_hash(text: str) -> str:
+    """Hash of a thought's normalized text; edits that keep it need no new rewrite"""
+    return hashlib.sha256(normalize_thought(text).encode('utf-8')).hexdigest()
+
+class IntrospectionCache:
+    """
+    Two-tier cache of introspective rewrites.
+
+    Keys are content addresses over the normalized thought text, the prompt
+    version and the model name, so editing `create_introspection_prompt` or
+    switching models never serves an old rewrite. A rewrite made with a
+    user's context may draw on their other thoughts, so its key also names
+    that user and it is only served to them. The first tier is a
+    per-process LRU with TTL; the second is a Django cache shared by every
+    process. `clear()` empties the local tier and retires every shared
+    entry at once by bumping a generation number.
+    """
+
+    GENERATION_KEY = 'introspection:generation'
+
+    def __init__(self, enabled=True, local_max_entries=1024, local_ttl=300,
+                 shared_cache='default', shared_ttl=None):
+        self.enabled = enabled
+        self.local_max_entries = local_max_entries
+        self.local_ttl = local_ttl
+        self.shared_cache = shared_cache
+        self.shared_ttl = shared_ttl
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    @classmethod
+    def from_settings(cls):
+        options = settings.INTROSPECTION_CACHE
+        return cls(
+            enabled=options.get('ENABLED', True),
+            local_max_entries=options.get('LOCAL_MAX_ENTRIES', 1024),
+            local_ttl=options.get('LOCAL_TTL', 300),
+            shared_cache=options.get('SHARED_CACHE', 'default'),
+            shared_ttl=options.get('SHARED_TTL'),
+        )
+
+    @property
+    def _shared(self):
+        return caches[self.shared_cache]
+
+    @staticmethod
+    def make_key(thought_text: str, prompt_version: str, model_name: str, context_scope: str = '') -> str:
+        """
+        Build the content address for a thought
+
+        Args:
+            thought_text: The original thought text
+            prompt_version: Fingerprint of the introspection prompt
+            model_name: The model that produces the rewrite
+            context_scope: Whose context is sent with the thought, if any
+
+        Returns:
+            str: Hex digest identifying the rewrite
+        """
+        parts = (prompt_version, model_name, normalize_thought(thought_text))
+        if context_scope:
+            parts += (context_scope,)
+        material = '\x1f'.join(parts)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _get_generation(self) -> int:
+        # Re-read at most once per LOCAL_TTL, the same staleness the local tier allows
+        cached = self._generation
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        generation = self._shared.get_or_set(self.GENERATION_KEY, 1, timeout=None)
+        self._generation = (time.monotonic() + self.local_ttl, generation)
+        return generation
+
+    def _shared_key(self, key: str) -> str:
+        return f'introspection:{self._get_generation()}:{key}'
+
+    def _count(self, stat: str) -> None:
+        introspection_cache_lookups.labels(stat).inc()
+        with self._lock:
+            self._stats[stat] += 1
+
+    def get(self, key: str) -> Optional[str]:
+        """Look a rewrite up in the local tier, then the shared tier"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._local.move_to_end(key)
+                    self._stats['local_hits'] += 1
+                    introspection_cache_lookups.labels('local_hits').inc()
+                    return value
+                del self._local[key]
+
+        value = self._shared.get(self._shared_key(key))
+        if value is None:
+            self._count('misses')
+            return None
+
+        self._count('shared_hits')
+        self._set_local(key, value)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """Store a rewrite in both tiers"""
+        if not self.enabled:
+            return
+        self._set_local(key, value)
+        self._shared.set(self._shared_key(key), value, timeout=self.shared_ttl)
+
+    def _set_local(self, key: str, value: str) -> None:
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.local_ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_max_entries:
+                self._local.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        """Drop a single rewrite from both tiers"""
+        with self._lock:
+            self._local.pop(key, None)
+        self._shared.delete(self._shared_key(key))
+
+    def clear(self) -> None:
+        """
+        Drop every cached rewrite.
+
+        Other processes keep their local entries until LOCAL_TTL runs out.
+        """
+        with self._lock:
+            self._local.clear()
+            self._generation = None
+        try:
+            self._shared.incr(self.GENERATION_KEY)
+        except ValueError:
+            self._shared.set(self.GENERATION_KEY, 2, timeout=None)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters for this process"""
+        with self._lock:
+            return dict(self._stats, local_entries=len(self._local))
+
+introspection_cache = IntrospectionCache.from_settings()
@@ -0,0 +1,161 @@
+import base64
+import heapq
+import time
+from datetime import timedelta
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Thought, ThoughtTombstone
+
+class InvalidCursor(ValueError):
+    """Raised for a change cursor this server did not issue"""
+
+class CursorExpired(Exception):
+    """Raised for a cursor older than the tombstones kept; the client must reload everything"""
+
+class ChangePage:
+    """One page of a user's change feed"""
+
+    __slots__ = ('thoughts', 'deleted', 'cursor', 'has_more')
+
+    def __init__(self, thoughts: List[Thought], deleted: List[int], cursor: str, has_more: bool):
+        self.thoughts = thoughts
+        # Ids of thoughts deleted since the cursor
+        self.deleted = deleted
+        # Pass back as `since` to continue after this page
+        self.cursor = cursor
+        self.has_more = has_more
+
+class ThoughtChanges:
+    """
+    A feed of each user's thought changes, for incremental sync.
+
+    Postgres triggers stamp every written thought with the id of the
+    transaction that wrote it, and leave a tombstone stamped the same way when
+    one is deleted. The feed is both, ordered by (transaction id, thought id)
+    and read through (user, transaction id) indexes, so a sync costs time in
+    proportion to the changes rather than to the history.
+
+    Transaction ids are handed out when a transaction first writes, not when
+    it commits, so a change can appear behind a position a client has already
+    read past. A cursor therefore also remembers the snapshot xmin from the
+    start of its pass through the feed: every transaction below it had
+    finished, so all of their changes were seen by the end of the pass, and
+    the next pass starts from there. Changes at or above it may be sent
+    twice; applying a change is idempotent on the client.
+
+    Cursors also carry the time they were issued. Tombstones are pruned after
+    `tombstone_retention`, so a cursor older than that may have missed
+    deletions and is refused.
+    """
+
+    def __init__(self, page_size: int = 200, max_page_size: int = 1000, tombstone_retention_days: float = 30):
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+        self.tombstone_retention = timedelta(days=tombstone_retention_days)
+
+    @classmethod
+    def from_settings(cls):
+        options = settings.THOUGHT_CHANGES
+        return cls(
+            page_size=options.get('PAGE_SIZE', 200),
+            max_page_size=options.get('MAX_PAGE_SIZE', 1000),
+            tombstone_retention_days=options.get('TOMBSTONE_RETENTION_DAYS', 30),
+        )
+
+    def encode_cursor(self, floor: int, horizon: int = 0, after: Tuple[int, int] = (-1, -1)) -> str:
+        value = f"{floor}:{horizon}:{after[0]}:{after[1]}:{int(time.time())}"
+        return base64.urlsafe_b64encode(value.encode('ascii')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, cursor: str) -> Tuple[int, int, Tuple[int, int]]:
+        """
+        The pass a cursor stands for: (floor, horizon, position after)
+
+        Raises:
+            InvalidCursor: If the cursor is malformed
+            CursorExpired: If it was issued before the oldest tombstone kept
+        """
+        try:
+            value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+            floor, horizon, after_xid, after_id, issued = (int(part) for part in value.split(':'))
+        except ValueError:
+            raise InvalidCursor("Invalid cursor")
+        if issued < time.time() - self.tombstone_retention.total_seconds():
+            raise CursorExpired("Cursor expired; reload all thoughts")
+        return floor, horizon, (after_xid, after_id)
+
+    def since(self, user_id: int, cursor: Optional[str] = None, limit: Optional[int] = None) -> ChangePage:
+        """
+        A user's changes after a cursor, oldest first
+
+        Args:
+            user_id: Whose thoughts
+            cursor: A cursor from an earlier page, or None for every current thought
+            limit: Maximum number of changes, thoughts and deletions together
+
+        Returns:
+            ChangePage: The changes, and the cursor to continue from
+        """
+        limit = max(1, min(limit or self.page_size, self.max_page_size))
+        floor, horizon, (after_xid, after_id) = self.decode_cursor(cursor) if cursor else (0, 0, (-1, -1))
+
+        thoughts = Thought.objects.filter(user_id=user_id, change_xid__gte=floor)
+        tombstones = ThoughtTombstone.objects.filter(user_id=user_id, change_xid__gte=floor)
+        if after_xid >= 0:
+            thoughts = thoughts.filter(Q(change_xid__gt=after_xid) | Q(change_xid=after_xid, id__gt=after_id))
+            tombstones = tombstones.filter(
+                Q(change_xid__gt=after_xid) | Q(change_xid=after_xid, thought_id__gt=after_id)
+            )
+
+        # Inside a caller's transaction the isolation level is already set
+        nested = connection.in_atomic_block
+        with transaction.atomic():
+            with connection.cursor() as db:
+                if not nested:
+                    # One snapshot for the horizon and both tables
+                    db.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                db.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+                xmin = db.fetchone()[0]
+            # Under read committed each read sees a newer snapshot. Reading thoughts
+            # before tombstones means a deletion committing in between still shows
+            # up as its tombstone, rather than hiding the thought without one
+            thoughts = list(thoughts.order_by('change_xid', 'id')[:limit + 1])
+            # A first pass sends every current thought, so there is nothing to delete
+            tombstones = list(
+                tombstones.order_by('change_xid', 'thought_id').values_list('change_xid', 'thought_id')[:limit + 1]
+            ) if floor else []
+
+        merged = heapq.merge(
+            (((thought.change_xid, thought.pk), thought) for thought in thoughts),
+            ((key, None) for key in tombstones),
+            key=lambda item: item[0]
+        )
+        page = [item for _, item in zip(range(limit + 1), merged)]
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        # A pass's horizon is the xmin when it started
+        horizon = horizon or xmin
+        if has_more:
+            next_cursor = self.encode_cursor(floor, horizon, page[-1][0])
+        else:
+            next_cursor = self.encode_cursor(horizon)
+        return ChangePage(
+            thoughts=[thought for _, thought in page if thought is not None],
+            deleted=[thought_id for (_, thought_id), thought in page if thought is None],
+            cursor=next_cursor,
+            has_more=has_more
+        )
+
+    def prune(self) -> int:
+        """Delete tombstones older than the retention period"""
+        deleted, _ = ThoughtTombstone.objects.filter(
+            deleted_at__lt=timezone.now() - self.tombstone_retention
+        ).delete()
+        return deleted
+
+thought_changes = ThoughtChanges.from_settings()
@@ -0,0 +1,237 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Sequence
+
+from django.conf import settings
+from django.core.cache import caches
+from langchain_core.messages import BaseMessage, HumanMessage
+
+from .models import Thought
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_HEADER = "For context, these are some of my earlier thoughts, most recent first:"
+
+class TokenCounter:
+    """
+    Counts tokens with the model's tokenizer.
+
+    When tiktoken does not know the model or cannot load its encoding, falls
+    back to an estimate of one token per three bytes of UTF-8.
+    """
+
+    BYTES_PER_TOKEN = 3
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._encoding = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _get_encoding(self):
+        # Loaded on first use; tiktoken may have to download the encoding
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    try:
+                        import tiktoken
+                        self._encoding = tiktoken.encoding_for_model(self.model_name)
+                    except Exception as err:
+                        logger.warning(f"No tokenizer for {self.model_name}, estimating token counts: {err}")
+                    self._loaded = True
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        encoding = self._get_encoding()
+        if encoding is not None:
+            return len(encoding.encode(text))
+        return -(-len(text.encode('utf-8')) // self.BYTES_PER_TOKEN)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """The longest prefix of text that fits in max_tokens"""
+        encoding = self._get_encoding()
+        if encoding is not None:
+            tokens = encoding.encode(text)
+            return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+        encoded = text.encode('utf-8')
+        limit = max_tokens * self.BYTES_PER_TOKEN
+        return text if len(encoded) <= limit else encoded[:limit].decode('utf-8', errors='ignore')
+
+class ContextWindow:
+    """The context handed to the agent along with one thought"""
+
+    __slots__ = ('messages', 'scope', 'tokens')
+
+    def __init__(self, messages: Sequence[BaseMessage] = (), scope: str = '', tokens: int = 0):
+        self.messages = tuple(messages)
+        # Whose thoughts the context shows, part of the rewrite's cache key. Not
+        # the content: it changes with every thought, and a user's repeated
+        # thought should reuse its rewrite rather than call the model again
+        self.scope = scope
+        self.tokens = tokens
+
+EMPTY_CONTEXT = ContextWindow()
+
+class ThoughtContext:
+    """
+    A rolling window of each user's recent thoughts, given to the agent as context.
+
+    The window is cached newest first as (id, text, tokens) entries. Each
+    introspection job adds its own thought to it, so building a context reads
+    one cache entry rather than the user's history. Only a cold cache reads
+    the latest thoughts from the database, through the timeline index.
+
+    Long thoughts are truncated to `max_thought_tokens`, and older thoughts
+    drop out once the rendered context would exceed `max_tokens`. This keeps
+    prompt size and latency the same however long the history grows. A
+    thought only ever sees thoughts written before it.
+
+    Updates to one user's window are serialized, so two jobs finishing
+    together cannot each write back a window missing the other's thought.
+    A per-process lock covers jobs in this process; with `lock_cache` set,
+    a lock in that cache covers other processes too. A job that cannot get
+    the lock within `lock_timeout` drops the window instead, and it is
+    rebuilt from the database on next use.
+    """
+
+    KEY = 'thought-context:{user_id}'
+    LOCK_KEY = 'thought-context-lock:{user_id}'
+    # Users are spread over this many process-local locks
+    LOCK_STRIPES = 64
+
+    def __init__(self, enabled: bool = True, max_tokens: int = 512, max_thought_tokens: int = 96,
+                 max_entries: int = 50, cache: str = 'default', ttl: Optional[float] = 3600,
+                 model_name: str = 'gpt-4o-mini', lock_cache: Optional[str] = None,
+                 lock_timeout: float = 5, poll_interval: float = 0.05):
+        self.enabled = enabled
+        self.max_tokens = max_tokens
+        self.max_thought_tokens = max_thought_tokens
+        self.max_entries = max_entries
+        self.cache = cache
+        self.ttl = ttl
+        self.lock_cache = lock_cache
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.counter = TokenCounter(model_name)
+        self._locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+
+    @classmethod
+    def from_settings(cls):
+        options = settings.THOUGHT_CONTEXT
+        return cls(
+            enabled=options.get('ENABLED', True),
+            max_tokens=options.get('MAX_TOKENS', 512),
+            max_thought_tokens=options.get('MAX_THOUGHT_TOKENS', 96),
+            max_entries=options.get('MAX_ENTRIES', 50),
+            cache=options.get('CACHE', 'default'),
+            ttl=options.get('TTL', 3600),
+            model_name=settings.INTROSPECTION_PROVIDER.get('MODEL', 'gpt-4o-mini'),
+            lock_cache=options.get('LOCK_CACHE'),
+            lock_timeout=options.get('LOCK_TIMEOUT', 5),
+        )
+
+    def _key(self, user_id: int) -> str:
+        return self.KEY.format(user_id=user_id)
+
+    def _entry(self, thought_id: int, text: str) -> list:
+        text = self.counter.truncate(text, self.max_thought_tokens)
+        return [thought_id, text, self.counter.count(f"\n- {text}")]
+
+    def _fit(self, entries: List[list]) -> List[list]:
+        budget = self.max_tokens - self.counter.count(CONTEXT_HEADER)
+        fitted = []
+        for entry in entries[:self.max_entries]:
+            budget -= entry[2]
+            if budget < 0:
+                break
+            fitted.append(entry)
+        return fitted
+
+    @contextmanager
+    def _locked(self, user_id: int) -> Iterator[bool]:
+        """Hold the user's window for a read-modify-write; yields False if it could not be had in time"""
+        with self._locks[user_id % self.LOCK_STRIPES]:
+            if self.lock_cache is None:
+                yield True
+                return
+
+            cache = caches[self.lock_cache]
+            key = self.LOCK_KEY.format(user_id=user_id)
+            deadline = time.monotonic() + self.lock_timeout
+            # cache.add only writes when the key is absent, which makes it a lock
+            while not cache.add(key, 1, timeout=self.lock_timeout):
+                if time.monotonic() > deadline:
+                    yield False
+                    return
+                time.sleep(self.poll_interval)
+            try:
+                yield True
+            finally:
+                cache.delete(key)
+
+    def _build(self, user_id: int) -> List[list]:
+        recent = (
+            Thought.objects.filter(user_id=user_id)
+            .order_by('-created_at', '-id')
+            .values_list('id', 'text')[:self.max_entries]
+        )
+        entries = sorted((self._entry(thought_id, text) for thought_id, text in recent), reverse=True)
+        return self._fit(entries)
+
+    def for_thought(self, user_id: int, thought_id: int, text: str) -> ContextWindow:
+        """
+        The context for introspecting a thought, adding the thought to its user's window
+
+        Args:
+            user_id: The thought's author
+            thought_id: Primary key of the thought
+            text: The thought's current text
+
+        Returns:
+            ContextWindow: The user's earlier thoughts, within the token budget
+        """
+        if not self.enabled:
+            return EMPTY_CONTEXT
+
+        cache = caches[self.cache]
+        key = self._key(user_id)
+        entry = self._entry(thought_id, text)
+        with self._locked(user_id) as locked:
+            if not locked:
+                # Another process has held the window too long; start it over
+                # from the database, which has every thought up to this one
+                cache.delete(key)
+                entries = self._build(user_id)
+                return self._render(user_id, [other for other in entries if other[0] < thought_id])
+
+            entries = cache.get(key)
+            stale = entries is None
+            if stale:
+                entries = self._build(user_id)
+            if entry not in entries:
+                # New or edited: slot it in by id, which follows creation order
+                updated = sorted([other for other in entries if other[0] != thought_id] + [entry], reverse=True)
+                entries = self._fit(updated)
+                stale = True
+            if stale:
+                cache.set(key, entries, timeout=self.ttl)
+
+        return self._render(user_id, [other for other in entries if other[0] < thought_id])
+
+    def _render(self, user_id: int, entries: List[list]) -> ContextWindow:
+        while entries:
+            content = CONTEXT_HEADER + ''.join(f"\n- {text}" for _, text, _ in entries)
+            tokens = self.counter.count(content)
+            # Entries are counted one by one; check the joined text against the hard limit
+            if tokens <= self.max_tokens:
+                return ContextWindow([HumanMessage(content=content)], f'user:{user_id}', tokens)
+            entries = entries[:-1]
+        return EMPTY_CONTEXT
+
+    def forget(self, user_id: int) -> None:
+        """Drop a user's window, e.g. after a thought is deleted; it is rebuilt on next use"""
+        caches[self.cache].delete(self._key(user_id))
+
+thought_context = ThoughtContext.from_settings()
@@ -0,0 +1,393 @@
+import csv
+import io
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import IO, Iterator, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .context import thought_context
+from .models import ImportFormat, ImportJob, ImportStatus, IntrospectionStatus, Thought
+from .signals import thoughts_bulk_created
+from .tasks import introspection_queue
+
+logger = logging.getLogger(__name__)
+
+# Every non-null column of a thought row that has no database default
+COPY_COLUMNS = (
+    'user_id', 'text', 'introspection_status', 'introspection_attempts', 'introspection_error',
+    'introspection_prompt_version', 'introspection_model', 'introspection_text_hash',
+    'created_at', 'updated_at',
+)
+
+class ImportTooLarge(Exception):
+    """Raised when an upload is bigger than the import size limit"""
+
+class _LimitedReader:
+    """Reads an upload through, refusing to go past the size limit"""
+
+    def __init__(self, stream: IO[bytes], limit: int):
+        self._stream = stream
+        self._limit = limit
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        self.size += len(data)
+        if self.size > self._limit:
+            raise ImportTooLarge(f"Imports are limited to {self._limit} bytes")
+        return data
+
+def _ndjson_records(source: IO[bytes], offset: int) -> Iterator[Tuple[Optional[dict], int]]:
+    source.seek(offset)
+    for line in iter(source.readline, b''):
+        offset += len(line)
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield (record if isinstance(record, dict) else None), offset
+
+def _csv_records(source: IO[bytes], offset: int) -> Iterator[Tuple[Optional[dict], int]]:
+    position = 0
+
+    def lines():
+        # Read a line at a time so the position always falls on a row boundary
+        nonlocal position
+        for line in iter(source.readline, b''):
+            position += len(line)
+            yield line.decode('utf-8', errors='replace')
+
+    source.seek(0)
+    reader = csv.reader(lines())
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [column.lstrip('\ufeff').strip().lower() for column in header]
+    if offset > position:
+        # Resuming: the header is read again, then the rows already loaded are skipped
+        source.seek(offset)
+        position = offset
+
+    for row in reader:
+        if row:
+            yield dict(zip(header, row)), position
+
+RECORD_READERS = {
+    ImportFormat.NDJSON: _ndjson_records,
+    ImportFormat.CSV: _csv_records,
+}
+
+def _parse_record(record: Optional[dict], now: datetime) -> Optional[Tuple[str, datetime]]:
+    """The text and creation time of an imported thought, or None to skip it"""
+    if record is None or not isinstance(record.get('text'), str):
+        return None
+    # Postgres text cannot hold NUL characters
+    text = record['text'].replace('\x00', '').strip()
+    if not text:
+        return None
+
+    created_at = None
+    if isinstance(record.get('created_at'), str):
+        try:
+            created_at = parse_datetime(record['created_at'])
+        except ValueError:
+            pass
+    if created_at is None:
+        created_at = now
+    elif timezone.is_naive(created_at):
+        created_at = timezone.make_aware(created_at, dt_timezone.utc)
+    return text, created_at
+
+class ThoughtImporter:
+    """
+    Loads uploaded files of thoughts into the thoughts table with Postgres COPY.
+
+    The upload is saved first and loaded in the background, `chunk_size`
+    rows per transaction. Each transaction also records how far into the
+    file it got, so an import that fails, or whose process dies, resumes at
+    the first row not yet loaded without duplicating any.
+
+    Imported thoughts are not introspected straight away. They are stored as
+    deferred and fed to the introspection queue at `introspection_rate`
+    thoughts per second, so importing years of notes neither floods the
+    model provider nor holds up thoughts written live. Every process runs
+    the feed, but a batch is only released by the process that takes the
+    feed slot in `lock_cache`, which stays taken for as long as the batch
+    earns at that rate; the rate holds however many processes there are.
+
+    Backends:
+        thread: imports and the feed run on background threads (default)
+        off: run `manage.py process_imports --loop` instead
+    """
+
+    BACKENDS = ('thread', 'off')
+    FEED_SLOT_KEY = 'thought-imports:feed-slot'
+
+    def __init__(self, backend: str = 'thread', chunk_size: int = 5000, max_bytes: int = 100 * 1024 * 1024,
+                 stale_after: float = 900, introspection_rate: float = 2.0, introspection_batch: int = 20,
+                 poll_interval: float = 10.0, lock_cache: str = 'default'):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown thought import backend: {backend}")
+        self.backend = backend
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.stale_after = timedelta(seconds=stale_after)
+        self.introspection_rate = introspection_rate
+        self.introspection_batch = introspection_batch
+        self.poll_interval = poll_interval
+        self.lock_cache = lock_cache
+        self._executor = None
+        # Jobs handed to the executor and not yet finished, so polling never queues one twice
+        self._submitted: Set[int] = set()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    @classmethod
+    def from_settings(cls):
+        options = settings.THOUGHT_IMPORTS
+        return cls(
+            backend=options.get('BACKEND', 'thread'),
+            chunk_size=options.get('CHUNK_SIZE', 5000),
+            max_bytes=options.get('MAX_BYTES', 100 * 1024 * 1024),
+            stale_after=options.get('STALE_AFTER', 900),
+            introspection_rate=options.get('INTROSPECTION_RATE', 2.0),
+            introspection_batch=options.get('INTROSPECTION_BATCH', 20),
+            poll_interval=options.get('POLL_INTERVAL', 10.0),
+            lock_cache=options.get('LOCK_CACHE', 'default'),
+        )
+
+    def create_job(self, user, upload: IO[bytes], import_format: str, size: Optional[int] = None) -> ImportJob:
+        """
+        Save an upload and schedule its import
+
+        Args:
+            user: The user the thoughts belong to
+            upload: The file, read in chunks and never held in memory whole
+            import_format: A value of ImportFormat
+            size: The upload's size, if known up front
+
+        Raises:
+            ImportTooLarge: If the upload is bigger than max_bytes
+        """
+        if size is not None and size > self.max_bytes:
+            raise ImportTooLarge(f"Imports are limited to {self.max_bytes} bytes")
+        reader = _LimitedReader(upload, self.max_bytes)
+        job = ImportJob(user=user, format=import_format)
+        job.source.save(f'{user.pk}.{import_format}', reader, save=False)
+        job.size = reader.size
+        job.save()
+        transaction.on_commit(lambda: self._dispatch(job.pk))
+        return job
+
+    def retry(self, job: ImportJob) -> bool:
+        """Resume a failed import where it stopped"""
+        retried = ImportJob.objects.filter(pk=job.pk, status=ImportStatus.FAILED).update(
+            status=ImportStatus.PENDING, updated_at=timezone.now()
+        ) == 1
+        if retried:
+            transaction.on_commit(lambda: self._dispatch(job.pk))
+        return retried
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='thought-import')
+        return self._executor
+
+    def _dispatch(self, job_id: int) -> None:
+        if self.backend == 'thread':
+            self.start()
+            self._submit(job_id)
+
+    def _submit(self, job_id: int) -> None:
+        with self._lock:
+            if job_id in self._submitted:
+                return
+            self._submitted.add(job_id)
+        self._get_executor().submit(self._run_in_worker, job_id)
+
+    def _run_in_worker(self, job_id: int) -> None:
+        close_old_connections()
+        try:
+            self.run(job_id)
+        except Exception as err:
+            logger.error(f"Import job {job_id} crashed: {err}", exc_info=True)
+        finally:
+            with self._lock:
+                self._submitted.discard(job_id)
+            close_old_connections()
+
+    def run(self, job_id: int) -> None:
+        """
+        Claim a pending import and load it, from its last checkpoint on
+
+        Args:
+            job_id: Primary key of the import job
+        """
+        # A conditional update is the lock: only one worker moves a job out of pending
+        claimed = ImportJob.objects.filter(pk=job_id, status=ImportStatus.PENDING).update(
+            status=ImportStatus.RUNNING, error='', updated_at=timezone.now()
+        )
+        if not claimed:
+            return
+        job = ImportJob.objects.get(pk=job_id)
+
+        try:
+            with job.source.open('rb') as source:
+                self._load(job, source)
+        except Exception as err:
+            logger.warning(f"Import job {job_id} failed at byte {job.offset}: {err}")
+            ImportJob.objects.filter(pk=job_id).update(
+                status=ImportStatus.FAILED, error=str(err), updated_at=timezone.now()
+            )
+            return
+        finally:
+            # The imported thoughts belong in the user's context window
+            thought_context.forget(job.user_id)
+
+        job.source.delete(save=False)
+        ImportJob.objects.filter(pk=job_id).update(
+            status=ImportStatus.COMPLETED, source='', updated_at=timezone.now()
+        )
+        logger.info(f"Import job {job_id} loaded {job.rows_imported} thought(s)")
+
+    def _load(self, job: ImportJob, source: IO[bytes]) -> None:
+        now = timezone.now()
+        rows, skipped, offset = [], 0, job.offset
+        for record, offset in RECORD_READERS[job.format](source, job.offset):
+            row = _parse_record(record, now)
+            if row is None:
+                skipped += 1
+            else:
+                rows.append(row)
+            if len(rows) >= self.chunk_size:
+                self._copy(job, rows, skipped, offset)
+                rows, skipped = [], 0
+        self._copy(job, rows, skipped, offset)
+
+    def _copy(self, job: ImportJob, rows: List[Tuple[str, datetime]], skipped: int, offset: int) -> None:
+        now = timezone.now()
+        buffer = io.StringIO()
+        # Quote everything: in COPY's CSV format an unquoted empty value is NULL
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+        for text, created_at in rows:
+            writer.writerow((
+                job.user_id, text, IntrospectionStatus.DEFERRED, 0, '', '', '', '',
+                created_at.isoformat(), now.isoformat(),
+            ))
+        buffer.seek(0)
+
+        quote = connection.ops.quote_name
+        sql = (
+            f"COPY {quote(Thought._meta.db_table)} ({', '.join(quote(column) for column in COPY_COLUMNS)}) "
+            f"FROM STDIN WITH (FORMAT csv)"
+        )
+        # The rows and the checkpoint commit together, so a resumed import never loads a row twice
+        with transaction.atomic():
+            if rows:
+                with connection.cursor() as cursor:
+                    cursor.copy_expert(sql, buffer)
+                    cursor.execute("SELECT pg_current_xact_id()::text::bigint")
+                    xid = cursor.fetchone()[0]
+                # COPY skips post_save like bulk_create does. The rows just
+                # copied are the newest ones stamped with this transaction
+                thoughts = list(
+                    Thought.objects.filter(user_id=job.user_id, change_xid=xid).order_by('-id')[:len(rows)]
+                )
+                thoughts.reverse()
+                thoughts_bulk_created.send(sender=Thought, thoughts=thoughts)
+            ImportJob.objects.filter(pk=job.pk).update(
+                offset=offset,
+                rows_imported=F('rows_imported') + len(rows),
+                rows_skipped=F('rows_skipped') + skipped,
+                updated_at=now
+            )
+        job.offset = offset
+        job.rows_imported += len(rows)
+        job.rows_skipped += skipped
+
+    def feed(self) -> int:
+        """
+        Release one batch of deferred thoughts to the introspection queue
+
+        Returns:
+            int: Number of thoughts released; 0 if another process holds the feed slot
+        """
+        cache = caches[self.lock_cache]
+        # cache.add only writes when the key is absent, so one process takes each slot
+        if not cache.add(self.FEED_SLOT_KEY, 1, timeout=self.introspection_batch / self.introspection_rate):
+            return 0
+        released = 0
+        try:
+            released = introspection_queue.release_deferred(self.introspection_batch)
+        finally:
+            if released:
+                # Hold the slot for as long as what was released earns at the rate
+                cache.touch(self.FEED_SLOT_KEY, timeout=self.feed_delay(released))
+            else:
+                # Nothing was waiting: let the next process that finds some take the slot
+                cache.delete(self.FEED_SLOT_KEY)
+        return released
+
+    def feed_delay(self, released: int) -> float:
+        """Seconds to wait after releasing a batch, keeping to introspection_rate"""
+        return released / self.introspection_rate if released else self.poll_interval
+
+    def requeue_stale(self) -> int:
+        """Return imports orphaned by a crashed worker to the pending state"""
+        return ImportJob.objects.filter(
+            status=ImportStatus.RUNNING,
+            updated_at__lt=timezone.now() - self.stale_after
+        ).update(status=ImportStatus.PENDING)
+
+    def pending(self) -> List[int]:
+        return list(ImportJob.objects.filter(status=ImportStatus.PENDING).order_by('id').values_list('id', flat=True))
+
+    def start(self) -> None:
+        """Start the background thread if this importer runs one and it is not running yet"""
+        if self.backend != 'thread' or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run_background, name='thought-import-feed', daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    async def startup(self) -> None:
+        """ASGI lifespan hook: pick up imports and deferred thoughts left by the last run"""
+        self.start()
+
+    async def shutdown(self) -> None:
+        self.stop()
+
+    def _run_background(self) -> None:
+        while not self._stopped.is_set():
+            close_old_connections()
+            released = 0
+            try:
+                self.requeue_stale()
+                for job_id in self.pending():
+                    self._submit(job_id)
+                released = self.feed()
+            except Exception as err:
+                logger.error(f"Thought import background run failed: {err}", exc_info=True)
+            finally:
+                close_old_connections()
+            self._stopped.wait(self.feed_delay(released))
+
+thought_importer = ThoughtImporter.from_settings()
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from apps.thoughts.cache import introspection_cache
+
+class Command(BaseCommand):
+    help = "Drop every cached introspective rewrite, e.g. after tuning the prompt by hand"
+
+    def handle(self, *args, **options):
+        introspection_cache.clear()
+        self.stdout.write("Introspection cache cleared")
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.thoughts.imports import thought_importer
+from apps.thoughts.models import ImportJob, ImportStatus
+
+class Command(BaseCommand):
+    help = (
+        "Load pending thought imports and feed their thoughts to the introspection queue "
+        "(the worker for THOUGHT_IMPORT_BACKEND=off)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep running as imports arrive")
+        parser.add_argument('--retry-failed', action='store_true', help="Resume failed imports too")
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            for job in ImportJob.objects.filter(status=ImportStatus.FAILED):
+                thought_importer.retry(job)
+
+        while True:
+            requeued = thought_importer.requeue_stale()
+            if requeued:
+                self.stdout.write(f"Requeued {requeued} stalled import(s)")
+
+            for job_id in thought_importer.pending():
+                thought_importer.run(job_id)
+                job = ImportJob.objects.get(pk=job_id)
+                self.stdout.write(
+                    f"Import {job_id} {job.status}: {job.rows_imported} imported, {job.rows_skipped} skipped"
+                    + (f" ({job.error})" if job.error else "")
+                )
+
+            released = thought_importer.feed()
+            if released:
+                self.stdout.write(f"Queued {released} imported thought(s) for introspection")
+
+            if not options['loop']:
+                break
+            time.sleep(thought_importer.feed_delay(released))
@@ -0,0 +1,35 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apps.thoughts.tasks import introspection_queue
+
+class Command(BaseCommand):
+    help = "Process thoughts waiting for introspection (the worker for the 'database' queue backend)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new jobs")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to sleep when idle")
+        parser.add_argument(
+            '--stale-after', type=int, default=15,
+            help="Minutes after which a job stuck in processing is requeued"
+        )
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(minutes=options['stale_after'])
+
+        while True:
+            requeued = introspection_queue.requeue_stale(stale_after)
+            if requeued:
+                self.stdout.write(f"Requeued {requeued} stale job(s)")
+
+            processed = introspection_queue.process_pending(limit=options['batch_size'])
+            if processed:
+                self.stdout.write(f"Processed {processed} thought(s)")
+
+            if not options['loop']:
+                break
+            if not processed:
+                time.sleep(options['poll_interval'])
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from apps.thoughts.changes import thought_changes
+
+class Command(BaseCommand):
+    help = "Delete tombstones of deleted thoughts older than THOUGHT_CHANGES['TOMBSTONE_RETENTION_DAYS']"
+
+    def handle(self, *args, **options):
+        pruned = thought_changes.prune()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {pruned} tombstone(s)"))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from apps.thoughts.recompute import introspection_recompute
+
+class Command(BaseCommand):
+    help = "Recompute rewrites made with an older prompt or model, resuming from the last checkpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=None,
+            help="Thoughts per batch; defaults to INTROSPECTION_RECOMPUTE['CHUNK_SIZE']"
+        )
+        parser.add_argument(
+            '--rate', type=float, default=None,
+            help="Thoughts per second, 0 for no limit; defaults to INTROSPECTION_RECOMPUTE['RATE']"
+        )
+        parser.add_argument('--limit', type=int, default=None, help="Stop after this many thoughts")
+        parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint and start from the first thought")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many rewrites are stale")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] is not None:
+            introspection_recompute.chunk_size = options['chunk_size']
+        if options['rate'] is not None:
+            introspection_recompute.rate = options['rate']
+
+        if options['restart'] and not options['dry_run']:
+            introspection_recompute.reset()
+
+        checkpoint = 0 if options['restart'] else introspection_recompute.checkpoint()
+        stale = introspection_recompute.stale().filter(pk__gt=checkpoint).count()
+        self.stdout.write(
+            f"{stale} stale rewrite(s)" + (f" after thought {checkpoint}" if checkpoint else "")
+        )
+        if options['dry_run']:
+            return
+
+        def report(after, totals):
+            self.stdout.write(
+                f"Up to thought {after}: {totals['recomputed']} recomputed, "
+                f"{totals['failed']} failed, {totals['skipped']} skipped"
+            )
+
+        totals = introspection_recompute.run(limit=options['limit'], on_chunk=report)
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {totals['recomputed']} recomputed, {totals['failed']} failed, {totals['skipped']} skipped"
+        ))
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.6 on 2026-10-18 20:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_existing_completed(apps, schema_editor):
+    # Thoughts created before the queue existed were introspected inline
+    Thought = apps.get_model('thoughts', 'Thought')
+    Thought.objects.filter(introspective_version__isnull=False).update(introspection_status='completed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thoughts', '0003_thought_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thought',
+            name='introspection_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='thought',
+            name='introspection_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='thought',
+            name='introspection_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=16),
+        ),
+        migrations.RunPython(mark_existing_completed, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='thought',
+            index=models.Index(condition=models.Q(('introspection_status', 'pending')), fields=['id'], name='thoughts_intro_pending_idx'),
+        ),
+    ]
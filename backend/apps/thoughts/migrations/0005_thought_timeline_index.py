@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-18 20:14
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking writes to a large thoughts table
+    atomic = False
+
+    dependencies = [
+        ('thoughts', '0004_thought_introspection_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='thought',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        AddIndexConcurrently(
+            model_name='thought',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='thoughts_user_created_idx'),
+        ),
+    ]
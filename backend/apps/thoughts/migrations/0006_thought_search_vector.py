@@ -0,0 +1,69 @@
+# Generated by Django 5.1.6 on 2026-10-18 20:15
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+BACKFILL_BATCH = 5000
+
+# A generated column would be added by rewriting the whole table under an
+# exclusive lock. A plain column is added instantly and kept current by a
+# trigger, which also covers writes that bypass the ORM such as COPY
+SEARCH_VECTOR_SQL = """
+CREATE FUNCTION thought_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english'::regconfig, COALESCE(NEW.text, '')), 'A')
+        || setweight(to_tsvector('english'::regconfig, COALESCE(NEW.introspective_version, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER thoughts_search_vector
+    BEFORE INSERT OR UPDATE OF text, introspective_version, search_vector ON thoughts
+    FOR EACH ROW EXECUTE FUNCTION thought_search_vector();
+"""
+
+DROP_SEARCH_VECTOR_SQL = """
+DROP TRIGGER thoughts_search_vector ON thoughts;
+DROP FUNCTION thought_search_vector();
+"""
+
+
+def backfill_search_vectors(apps, schema_editor):
+    # One short transaction per batch, so rows are never locked for long;
+    # touching search_vector makes the trigger compute it
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM thoughts")
+        last_id = cursor.fetchone()[0]
+        for start in range(0, last_id, BACKFILL_BATCH):
+            cursor.execute(
+                "UPDATE thoughts SET search_vector = NULL WHERE id > %s AND id <= %s AND search_vector IS NULL",
+                [start, start + BACKFILL_BATCH]
+            )
+
+
+class Migration(migrations.Migration):
+    # The backfill commits batch by batch and the index is built without blocking writes
+    atomic = False
+
+    dependencies = [
+        ('thoughts', '0005_thought_timeline_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thought',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_VECTOR_SQL, DROP_SEARCH_VECTOR_SQL),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='thought',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='thoughts_search_idx'),
+        ),
+    ]
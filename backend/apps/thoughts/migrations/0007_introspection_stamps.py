@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thoughts', '0006_thought_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thought',
+            name='introspection_model',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='thought',
+            name='introspection_prompt_version',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='thought',
+            name='introspection_text_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
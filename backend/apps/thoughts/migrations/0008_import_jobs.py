@@ -0,0 +1,53 @@
+# Generated by Django 5.1.6 on 2026-10-18 21:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking writes to a large thoughts table
+    atomic = False
+
+    dependencies = [
+        ('thoughts', '0007_introspection_stamps'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('format', models.CharField(choices=[('ndjson', 'NDJSON'), ('csv', 'CSV')], max_length=16)),
+                ('source', models.FileField(blank=True, upload_to='imports/')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('size', models.BigIntegerField(default=0)),
+                ('offset', models.BigIntegerField(default=0)),
+                ('rows_imported', models.PositiveIntegerField(default=0)),
+                ('rows_skipped', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'thought_import_jobs',
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='thought',
+            name='introspection_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed'), ('deferred', 'Deferred')], default='pending', max_length=16),
+        ),
+        AddIndexConcurrently(
+            model_name='thought',
+            index=models.Index(condition=models.Q(('introspection_status', 'deferred')), fields=['id'], name='thoughts_intro_deferred_idx'),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.1.6 on 2026-10-18 21:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+# Every insert and update of a thought records the id of the writing
+# transaction, and every delete leaves a tombstone with the deleting one,
+# whatever wrote it: the ORM, update(), COPY or a cascade
+CHANGE_FEED_SQL = """
+CREATE FUNCTION thought_change_stamp() RETURNS trigger AS $$
+BEGIN
+    NEW.change_xid := pg_current_xact_id()::text::bigint;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER thoughts_change_stamp
+    BEFORE INSERT OR UPDATE ON thoughts
+    FOR EACH ROW EXECUTE FUNCTION thought_change_stamp();
+
+CREATE FUNCTION thought_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO thought_tombstones (thought_id, user_id, change_xid, deleted_at)
+    VALUES (OLD.id, OLD.user_id, pg_current_xact_id()::text::bigint, now());
+    RETURN OLD;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER thoughts_tombstone
+    AFTER DELETE ON thoughts
+    FOR EACH ROW EXECUTE FUNCTION thought_tombstone();
+"""
+
+DROP_CHANGE_FEED_SQL = """
+DROP TRIGGER thoughts_tombstone ON thoughts;
+DROP FUNCTION thought_tombstone();
+DROP TRIGGER thoughts_change_stamp ON thoughts;
+DROP FUNCTION thought_change_stamp();
+"""
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking writes to a large thoughts table
+    atomic = False
+
+    dependencies = [
+        ('thoughts', '0008_import_jobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThoughtTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('thought_id', models.BigIntegerField()),
+                ('change_xid', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'thought_tombstones',
+            },
+        ),
+        migrations.AddField(
+            model_name='thought',
+            name='change_xid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        AddIndexConcurrently(
+            model_name='thought',
+            index=models.Index(fields=['user', 'change_xid', 'id'], name='thoughts_user_change_idx'),
+        ),
+        migrations.AddField(
+            model_name='thoughttombstone',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='thoughttombstone',
+            index=models.Index(fields=['user', 'change_xid', 'thought_id'], name='tombstones_user_change_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='thoughttombstone',
+            index=models.Index(fields=['deleted_at'], name='tombstones_deleted_idx'),
+        ),
+        migrations.RunSQL(CHANGE_FEED_SQL, DROP_CHANGE_FEED_SQL),
+    ]
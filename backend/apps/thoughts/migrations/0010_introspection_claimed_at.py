@@ -0,0 +1,24 @@
+# Generated by Django 5.1.6 on 2026-10-18 23:05
+
+from django.db import migrations, models
+
+# Jobs already processing were claimed when they were last updated
+BACKFILL_SQL = """
+UPDATE thoughts SET introspection_claimed_at = updated_at WHERE introspection_status = 'processing'
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thoughts', '0009_thought_changes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thought',
+            name='introspection_claimed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ]
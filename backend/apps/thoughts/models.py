@@ -1,5 +1,19 @@
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+
+# Text search configuration used for the stored vector and for queries against it
+SEARCH_CONFIG = 'english'
+
+class IntrospectionStatus(models.TextChoices):
+    """Lifecycle of the background introspection job for a thought"""
+    PENDING = 'pending', 'Pending'
+    PROCESSING = 'processing', 'Processing'
+    COMPLETED = 'completed', 'Completed'
+    FAILED = 'failed', 'Failed'
+    # Imported; fed to the queue a few at a time so live thoughts go first
+    DEFERRED = 'deferred', 'Deferred'
 
 class Thought(models.Model):
     """Model to store user thoughts"""
@@ -11,12 +25,129 @@ class Thought(models.Model):
     text = models.TextField()
     introspective_version = models.TextField(null=True, blank=True)
 
+    introspection_status = models.CharField(
+        max_length=16,
+        choices=IntrospectionStatus.choices,
+        default=IntrospectionStatus.PENDING
+    )
+    introspection_attempts = models.PositiveSmallIntegerField(default=0)
+    introspection_error = models.TextField(blank=True, default='')
+    # When a worker last claimed the job, so one orphaned by a crash can be
+    # found. Queue bookkeeping leaves updated_at to edits and rewrites
+    introspection_claimed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # What produced the current rewrite: the prompt fingerprint, the model and
+    # a hash of the normalized text it was made from. Blank until a model
+    # rewrite is stored, and for fallbacks
+    introspection_prompt_version = models.CharField(max_length=16, blank=True, default='')
+    introspection_model = models.CharField(max_length=100, blank=True, default='')
+    introspection_text_hash = models.CharField(max_length=64, blank=True, default='')
+
+    # Maintained by a Postgres trigger on every write (migration 0006), so
+    # searching never re-parses text: the text weighted A and the
+    # introspective version weighted B, in SEARCH_CONFIG
+    search_vector = SearchVectorField(null=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Id of the transaction that last wrote the row, set by a Postgres trigger
+    # however the row is written. Orders the change feed; 0 for thoughts last
+    # written before the feed existed
+    change_xid = models.BigIntegerField(default=0, editable=False)
+
     class Meta:
         db_table = 'thoughts'
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Serves the timeline: one user's thoughts, newest first, with id as tie-breaker
+            models.Index(fields=['user', '-created_at', '-id'], name='thoughts_user_created_idx'),
+            GinIndex(fields=['search_vector'], name='thoughts_search_idx'),
+            # Lets queue workers find outstanding jobs without scanning the table
+            models.Index(
+                fields=['id'],
+                name='thoughts_intro_pending_idx',
+                condition=models.Q(introspection_status=IntrospectionStatus.PENDING)
+            ),
+            # Lets the import feed find deferred thoughts the same way
+            models.Index(
+                fields=['id'],
+                name='thoughts_intro_deferred_idx',
+                condition=models.Q(introspection_status=IntrospectionStatus.DEFERRED)
+            ),
+            # Serves delta sync: one user's changes after a cursor
+            models.Index(fields=['user', 'change_xid', 'id'], name='thoughts_user_change_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username}'s thought: {self.text[:50]}..."
+
+class ThoughtTombstone(models.Model):
+    """
+    Marks a deleted thought in its user's change feed.
+
+    Written by a Postgres trigger when the thought's row is deleted, and
+    pruned after THOUGHT_CHANGES['TOMBSTONE_RETENTION_DAYS'].
+    """
+    thought_id = models.BigIntegerField()
+    # No foreign key constraint: tombstones are written while a deleted user's
+    # thoughts cascade, and are pruned with the rest
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+    # Id of the deleting transaction
+    change_xid = models.BigIntegerField()
+    deleted_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'thought_tombstones'
+        indexes = [
+            models.Index(fields=['user', 'change_xid', 'thought_id'], name='tombstones_user_change_idx'),
+            models.Index(fields=['deleted_at'], name='tombstones_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"Thought {self.thought_id} deleted at {self.deleted_at}"
+
+class ImportFormat(models.TextChoices):
+    NDJSON = 'ndjson', 'NDJSON'
+    CSV = 'csv', 'CSV'
+
+class ImportStatus(models.TextChoices):
+    """Lifecycle of a bulk import"""
+    PENDING = 'pending', 'Pending'
+    RUNNING = 'running', 'Running'
+    COMPLETED = 'completed', 'Completed'
+    FAILED = 'failed', 'Failed'
+
+class ImportJob(models.Model):
+    """An uploaded file of thoughts being loaded into a user's timeline"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='import_jobs'
+    )
+    format = models.CharField(max_length=16, choices=ImportFormat.choices)
+    # Kept until the import completes, so a failed one can be resumed
+    source = models.FileField(upload_to='imports/', blank=True)
+    status = models.CharField(max_length=16, choices=ImportStatus.choices, default=ImportStatus.PENDING)
+
+    size = models.BigIntegerField(default=0)
+    # Bytes of the source already loaded; a resumed import starts here
+    offset = models.BigIntegerField(default=0)
+    rows_imported = models.PositiveIntegerField(default=0)
+    rows_skipped = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'thought_import_jobs'
+        ordering = ['-created_at', '-id']
+
+    def __str__(self):
+        return f"{self.user.username}'s {self.format} import ({self.status})"
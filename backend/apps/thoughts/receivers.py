@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .context import thought_context
+from .models import Thought
+from .signals import thoughts_bulk_created
+from .versions import thought_versions
+
+@receiver(post_save, sender=Thought)
+def touch_saved_thought(sender, instance, **kwargs):
+    thought_versions.touch(instance.user_id)
+
+@receiver(thoughts_bulk_created, sender=Thought)
+def touch_bulk_created_thoughts(sender, thoughts, **kwargs):
+    thought_versions.touch(*(thought.user_id for thought in thoughts))
+
+@receiver(post_delete, sender=Thought)
+def forget_context_of_deleted_thought(sender, instance, origin=None, **kwargs):
+    # Deleted along with their user: nothing reads the window again
+    if origin is not None and getattr(origin, 'model', type(origin)) is not Thought:
+        return
+    # The window is rebuilt from what is left the next time it is used
+    user_id = instance.user_id
+    transaction.on_commit(lambda: thought_context.forget(user_id))
+    thought_versions.touch(user_id)
@@ -0,0 +1,159 @@
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .cache import thought_hash
+from .context import thought_context
+from .models import IntrospectionStatus, Thought
+from .services import ThoughtIntrospectionService
+from .signals import thoughts_updated
+from .versions import thought_versions
+
+logger = logging.getLogger(__name__)
+
+class IntrospectionRecompute:
+    """
+    Brings stored rewrites up to the current prompt and model.
+
+    A rewrite is stale when its prompt version or model differs from what the
+    introspection agent uses now, which includes rewrites stored before they
+    were stamped. Stale thoughts are walked in id order a chunk at a time and
+    paced to `rate` thoughts per second, so a backfill cannot crowd live
+    traffic out of the provider's rate limit.
+
+    The last id finished is checkpointed in a shared cache under the target
+    version, so an interrupted run resumes where it stopped and a later
+    prompt or model change starts over. A rewrite is only ever replaced by a
+    successful one; thoughts that fail keep theirs and are picked up again
+    by the next full run.
+    """
+
+    CHECKPOINT_KEY = 'introspection:recompute:{prompt_version}:{model}'
+
+    def __init__(self, chunk_size: int = 100, rate: Optional[float] = 2.0, concurrency: int = 4,
+                 checkpoint_cache: str = 'default'):
+        self.chunk_size = chunk_size
+        self.rate = rate
+        self.concurrency = concurrency
+        self.checkpoint_cache = checkpoint_cache
+        self._service = ThoughtIntrospectionService()
+
+    @classmethod
+    def from_settings(cls):
+        options = settings.INTROSPECTION_RECOMPUTE
+        return cls(
+            chunk_size=options.get('CHUNK_SIZE', 100),
+            rate=options.get('RATE', 2.0),
+            concurrency=options.get('CONCURRENCY', 4),
+            checkpoint_cache=options.get('CHECKPOINT_CACHE', 'default'),
+        )
+
+    def stale(self) -> QuerySet:
+        """Completed thoughts whose rewrite was made with another prompt or model"""
+        prompt_version, model = self._service.version
+        return Thought.objects.filter(
+            introspection_status=IntrospectionStatus.COMPLETED
+        ).exclude(
+            introspection_prompt_version=prompt_version,
+            introspection_model=model
+        )
+
+    def _checkpoint_key(self) -> str:
+        prompt_version, model = self._service.version
+        return self.CHECKPOINT_KEY.format(prompt_version=prompt_version, model=model)
+
+    def checkpoint(self) -> int:
+        """Id of the last thought a previous run finished, or 0"""
+        return caches[self.checkpoint_cache].get(self._checkpoint_key(), 0)
+
+    def reset(self) -> None:
+        """Forget the checkpoint so the next run starts from the first thought"""
+        caches[self.checkpoint_cache].delete(self._checkpoint_key())
+
+    def run(self, limit: Optional[int] = None,
+            on_chunk: Optional[Callable[[int, Dict[str, int]], None]] = None) -> Dict[str, int]:
+        """
+        Recompute stale rewrites from the checkpoint on
+
+        Args:
+            limit: Stop after this many thoughts; the checkpoint lets a later run continue
+            on_chunk: Called with the checkpoint and running totals after each chunk
+
+        Returns:
+            dict: Counts of thoughts recomputed, failed, and skipped because
+            they were edited or deleted mid-run
+        """
+        prompt_version, model = self._service.version
+        key = self._checkpoint_key()
+        cache = caches[self.checkpoint_cache]
+        after = cache.get(key, 0)
+        totals = {'recomputed': 0, 'failed': 0, 'skipped': 0}
+        started, seen = time.monotonic(), 0
+
+        while limit is None or seen < limit:
+            size = self.chunk_size if limit is None else min(self.chunk_size, limit - seen)
+            chunk = list(
+                self.stale().filter(pk__gt=after).order_by('pk').values_list('pk', 'user_id', 'text')[:size]
+            )
+            if not chunk:
+                # A finished run leaves no checkpoint, so the next one retries failures
+                cache.delete(key)
+                break
+
+            outputs = self._service.introspect_many(
+                [text for _, _, text in chunk],
+                max_concurrency=self.concurrency,
+                contexts=[thought_context.for_thought(user_id, thought_id, text) for thought_id, user_id, text in chunk]
+            )
+            touched, updated_ids = set(), []
+            for (thought_id, user_id, text), output in zip(chunk, outputs):
+                if isinstance(output, Exception):
+                    logger.warning(f"Recomputing the rewrite of thought {thought_id} failed: {output}")
+                    totals['failed'] += 1
+                    continue
+                # Conditional on the text, so an edit made meanwhile is never overwritten
+                updated = Thought.objects.filter(
+                    pk=thought_id,
+                    text=text,
+                    introspection_status=IntrospectionStatus.COMPLETED
+                ).update(
+                    introspective_version=output,
+                    introspection_prompt_version=prompt_version,
+                    introspection_model=model,
+                    introspection_text_hash=thought_hash(text),
+                    updated_at=timezone.now()
+                )
+                totals['recomputed' if updated else 'skipped'] += 1
+                if updated:
+                    touched.add(user_id)
+                    updated_ids.append(thought_id)
+            thought_versions.touch(*touched)
+            if updated_ids:
+                thoughts_updated.send(
+                    sender=Thought,
+                    thoughts=list(Thought.objects.filter(pk__in=updated_ids)),
+                    update_fields=[
+                        'introspective_version', 'introspection_prompt_version', 'introspection_model',
+                        'introspection_text_hash', 'updated_at',
+                    ]
+                )
+
+            after = chunk[-1][0]
+            cache.set(key, after, timeout=None)
+            seen += len(chunk)
+            if on_chunk is not None:
+                on_chunk(after, totals)
+
+            if self.rate:
+                delay = started + seen / self.rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+        return totals
+
+introspection_recompute = IntrospectionRecompute.from_settings()
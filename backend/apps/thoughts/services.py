@@ -1,4 +1,14 @@
-from agents.introspection import IntrospectionAgent
+import asyncio
+from itertools import zip_longest
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from asgiref.sync import sync_to_async
+from pydantic import ValidationError
+from agents.introspection import IntrospectionAgent, IntrospectionError, IntrospectiveThought
+from agents.registry import INTROSPECTION, get_agent
+from apps.metrics.instruments import introspection_fallbacks
+from .cache import introspection_cache
+from .context import EMPTY_CONTEXT, ContextWindow
+from .singleflight import introspection_flights
 import logging
 
 logger = logging.getLogger(__name__)
@@ -6,30 +16,217 @@ logger = logging.getLogger(__name__)
 class ThoughtIntrospectionService:
     """Service for handling thought introspection"""
 
-    def __init__(self):
-        self._agent = IntrospectionAgent()
+    cache = introspection_cache
+    flights = introspection_flights
 
-    def process_thought(self, thought_text: str) -> str:
+    @property
+    def _agent(self) -> IntrospectionAgent:
+        # Resolved on use so that building the service stays free; the agent
+        # itself is shared by every request in this process
+        return get_agent(INTROSPECTION)
+
+    @property
+    def version(self) -> Tuple[str, str]:
+        """The prompt version and model name that new rewrites are made with"""
+        agent = self._agent
+        return agent.prompt_version, agent.model_name
+
+    def introspect(self, thought_text: str, context: ContextWindow = EMPTY_CONTEXT) -> str:
         """
-        Process a thought text and return its introspective version
+        Return the introspective version of a thought, raising on failure
 
         Args:
             thought_text: The original thought text
+            context: What the agent is told about the user
 
         Returns:
             str: The introspective version of the thought
+
+        Raises:
+            IntrospectionError: If the agent could not transform the thought
         """
-        try:
-            if not thought_text:
-                return ""
+        if not thought_text:
+            return ""
 
-            result = self._agent.process_thought(thought_text)
+        agent = self._agent
+        cache_key = self.cache.make_key(thought_text, agent.prompt_version, agent.model_name, context.scope)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-            # The agent now always returns an IntrospectiveThought object
-            # even in case of errors
+        def compute() -> str:
+            result = agent.process_thought(thought_text, raise_on_error=True, messages=context.messages)
+            # Only successful rewrites are cached; failures fall through to a retry
+            self.cache.set(cache_key, result.introspective_rewrite)
             return result.introspective_rewrite
 
+        # Identical thoughts submitted at the same time share one model call
+        return self.flights.do(cache_key, compute, lookup=lambda: self.cache.get(cache_key))
+
+    async def aintrospect(self, thought_text: str, context: ContextWindow = EMPTY_CONTEXT) -> str:
+        """
+        Async version of introspect; the model call does not hold a thread
+
+        Raises:
+            IntrospectionError: If the agent could not transform the thought
+        """
+        if not thought_text:
+            return ""
+
+        agent = self._agent
+        cache_key = self.cache.make_key(thought_text, agent.prompt_version, agent.model_name, context.scope)
+        cached = await sync_to_async(self.cache.get)(cache_key)
+        if cached is not None:
+            return cached
+
+        async def compute() -> str:
+            result = await agent.aprocess_thought(thought_text, raise_on_error=True, messages=context.messages)
+            await sync_to_async(self.cache.set)(cache_key, result.introspective_rewrite)
+            return result.introspective_rewrite
+
+        return await self.flights.ado(cache_key, compute, lookup=lambda: self.cache.get(cache_key))
+
+    def introspect_many(
+        self,
+        thought_texts: List[str],
+        max_concurrency: int = 4,
+        contexts: Optional[List[ContextWindow]] = None
+    ) -> List[str | IntrospectionError]:
+        """
+        Introspect a batch of thoughts with as few model calls as possible
+
+        Cached rewrites are served directly and texts that share a cache key
+        are sent to the model once. Texts already being introspected by
+        another caller in this process wait for that call instead.
+
+        Args:
+            thought_texts: The original thought texts
+            max_concurrency: Maximum number of model calls in flight at once
+            contexts: What the agent is told about each thought's author, in order
+
+        Returns:
+            list: The introspective version of each thought, in order, or an
+            IntrospectionError for thoughts that could not be transformed
+        """
+        agent = self._agent
+        contexts = contexts or [EMPTY_CONTEXT] * len(thought_texts)
+        results: List[str | IntrospectionError | None] = [None] * len(thought_texts)
+        pending = {}
+
+        for index, thought_text in enumerate(thought_texts):
+            if not thought_text:
+                results[index] = ""
+                continue
+            cache_key = self.cache.make_key(
+                thought_text, agent.prompt_version, agent.model_name, contexts[index].scope
+            )
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.setdefault(cache_key, []).append(index)
+
+        leading, following = [], {}
+        for cache_key in pending:
+            future, leader = self.flights.claim(cache_key)
+            if leader:
+                leading.append((cache_key, future))
+            else:
+                following[cache_key] = future
+
+        if leading:
+            outputs = []
+            try:
+                outputs = agent.process_thoughts(
+                    [thought_texts[pending[key][0]] for key, _ in leading],
+                    max_concurrency=max_concurrency,
+                    messages=[contexts[pending[key][0]].messages for key, _ in leading]
+                )
+            finally:
+                # Settle every claim, even if the batch itself blew up
+                for (cache_key, future), output in zip_longest(leading, outputs):
+                    if output is None:
+                        output = IntrospectionError("Batch did not complete")
+                    if isinstance(output, IntrospectionError):
+                        value = output
+                        self.flights.resolve(cache_key, future, error=output)
+                    else:
+                        value = output.introspective_rewrite
+                        self.cache.set(cache_key, value)
+                        self.flights.resolve(cache_key, future, value)
+                    for index in pending[cache_key]:
+                        results[index] = value
+
+        for cache_key, future in following.items():
+            try:
+                value = future.result()
+            except IntrospectionError as err:
+                value = err
+            except Exception as err:
+                value = IntrospectionError(str(err))
+            for index in pending[cache_key]:
+                results[index] = value
+
+        return results
+
+    async def astream(self, thought_text: str, context: ContextWindow = EMPTY_CONTEXT) -> AsyncIterator[Dict[str, str]]:
+        """
+        Stream the introspective version of a thought as it is generated
+
+        Args:
+            thought_text: The original thought text
+            context: What the agent is told about the user
+
+        Yields:
+            dict: The output fields generated so far; the last one is complete
+
+        Raises:
+            IntrospectionError: If the agent could not transform the thought
+        """
+        agent = self._agent
+        cache_key = self.cache.make_key(thought_text, agent.prompt_version, agent.model_name, context.scope)
+        cached = await sync_to_async(self.cache.get)(cache_key)
+        if cached is not None:
+            yield {'introspective_rewrite': cached}
+            return
+
+        future, leader = self.flights.claim(cache_key)
+        if not leader:
+            # The same thought is already being introspected; wait for its result
+            yield {'introspective_rewrite': await asyncio.wrap_future(future)}
+            return
+
+        try:
+            output = {}
+            async for output in agent.astream_thought(thought_text, messages=context.messages):
+                yield output
+
+            try:
+                result = IntrospectiveThought(**output)
+            except ValidationError as err:
+                raise IntrospectionError(f"Incomplete model output: {err}") from err
+            await sync_to_async(self.cache.set)(cache_key, result.introspective_rewrite)
+        except BaseException as err:
+            # Includes the client going away mid-stream; waiters must not hang
+            self.flights.resolve(cache_key, future, error=err)
+            raise
+        self.flights.resolve(cache_key, future, result.introspective_rewrite)
+
+    def process_thought(self, thought_text: str) -> str:
+        """
+        Process a thought text and return its introspective version
+
+        Args:
+            thought_text: The original thought text
+
+        Returns:
+            str: The introspective version of the thought
+        """
+        try:
+            return self.introspect(thought_text)
+
         except Exception as err:
             logger.error(f"Error processing thought: {err}", exc_info=True)
+            introspection_fallbacks.labels('service').inc()
             # In case of any error, return the original text
             return thought_text
@@ -0,0 +1,10 @@
+from django.dispatch import Signal
+
+# Sent after thoughts are written with bulk_create, which skips post_save.
+# Arguments: sender (the Thought model), thoughts (list of saved Thought instances)
+thoughts_bulk_created = Signal()
+
+# Sent after thoughts are changed with update(), which skips post_save.
+# Arguments: sender (the Thought model), thoughts (list of Thought instances
+# as updated), update_fields (the fields that were written)
+thoughts_updated = Signal()
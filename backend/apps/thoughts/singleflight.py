@@ -0,0 +1,178 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+T = TypeVar('T')
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key becomes the leader and runs the work; anyone
+    asking for the same key meanwhile waits on the leader's future and gets
+    its result, or its exception. Futures are thread-safe and can be awaited
+    from any event loop, so sync workers, async views and streams all share
+    one in-flight table.
+
+    With `lock_cache` set, a leader also takes a lock in that Django cache
+    so other processes wait for it too. A waiting process polls `lookup`
+    (normally the shared result cache) until the result appears or the
+    lock goes away, and runs the work itself if the lock outlives
+    `lock_timeout`.
+    """
+
+    def __init__(self, lock_cache: Optional[str] = None, lock_timeout: float = 60, poll_interval: float = 0.25):
+        self.lock_cache = lock_cache
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {'leaders': 0, 'followers': 0}
+
+    @classmethod
+    def from_settings(cls):
+        options = settings.INTROSPECTION_SINGLE_FLIGHT
+        return cls(
+            lock_cache=options.get('LOCK_CACHE'),
+            lock_timeout=options.get('LOCK_TIMEOUT', 60),
+            poll_interval=options.get('POLL_INTERVAL', 0.25),
+        )
+
+    def claim(self, key: str) -> Tuple[Future, bool]:
+        """
+        Join the in-flight call for a key, or start one
+
+        Returns:
+            tuple: The call's future and whether the caller is its leader. A
+            leader must settle the future with `resolve`.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._stats['followers'] += 1
+                return future, False
+            future = self._calls[key] = Future()
+            self._stats['leaders'] += 1
+            return future, True
+
+    def resolve(self, key: str, future: Future, result=None, error: Optional[BaseException] = None) -> None:
+        """Publish a leader's outcome to its followers and retire the key"""
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if error is not None and not isinstance(error, Exception):
+            # A cancelled or interrupted leader must not cancel its followers
+            error = RuntimeError(f"In-flight call was abandoned: {error!r}")
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: str, fn: Callable[[], T], lookup: Optional[Callable[[], Optional[T]]] = None) -> T:
+        """
+        Run `fn` once for all concurrent callers with the same key
+
+        Args:
+            key: Identifies the work, e.g. an introspection cache key
+            fn: The work itself
+            lookup: Reads a finished result published by another process
+
+        Returns:
+            The leader's result
+        """
+        future, leader = self.claim(key)
+        if not leader:
+            return future.result()
+
+        try:
+            result = self._run_locked(key, fn, lookup)
+        except BaseException as err:
+            self.resolve(key, future, error=err)
+            raise
+        self.resolve(key, future, result)
+        return result
+
+    async def ado(
+        self, key: str, fn: Callable[[], Awaitable[T]], lookup: Optional[Callable[[], Optional[T]]] = None
+    ) -> T:
+        """Async version of do; `fn` returns an awaitable and waiting never blocks the loop"""
+        future, leader = self.claim(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        try:
+            result = await self._arun_locked(key, fn, lookup)
+        except BaseException as err:
+            self.resolve(key, future, error=err)
+            raise
+        self.resolve(key, future, result)
+        return result
+
+    def _lock_key(self, key: str) -> str:
+        return f'singleflight:{key}'
+
+    def _acquire(self, key: str) -> bool:
+        # cache.add only writes when the key is absent, which makes it a lock
+        return caches[self.lock_cache].add(self._lock_key(key), 1, timeout=self.lock_timeout)
+
+    def _release(self, key: str) -> None:
+        caches[self.lock_cache].delete(self._lock_key(key))
+
+    def _run_locked(self, key, fn, lookup):
+        if self.lock_cache is None:
+            return fn()
+
+        deadline = time.monotonic() + self.lock_timeout
+        waited = False
+        while not self._acquire(key):
+            waited = True
+            if lookup is not None:
+                result = lookup()
+                if result is not None:
+                    return result
+            if time.monotonic() > deadline:
+                # The other process is stuck or gone; do the work ourselves
+                return fn()
+            time.sleep(self.poll_interval)
+
+        try:
+            # The previous holder may have published the result just before releasing
+            result = lookup() if waited and lookup is not None else None
+            return result if result is not None else fn()
+        finally:
+            self._release(key)
+
+    async def _arun_locked(self, key, fn, lookup):
+        if self.lock_cache is None:
+            return await fn()
+
+        deadline = time.monotonic() + self.lock_timeout
+        waited = False
+        while not await sync_to_async(self._acquire)(key):
+            waited = True
+            if lookup is not None:
+                result = await sync_to_async(lookup)()
+                if result is not None:
+                    return result
+            if time.monotonic() > deadline:
+                return await fn()
+            await asyncio.sleep(self.poll_interval)
+
+        try:
+            result = await sync_to_async(lookup)() if waited and lookup is not None else None
+            return result if result is not None else await fn()
+        finally:
+            await sync_to_async(self._release)(key)
+
+    def stats(self) -> Dict[str, int]:
+        """Leader/follower counters for this process"""
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+introspection_flights = SingleFlight.from_settings()
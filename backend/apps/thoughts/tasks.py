@@ -0,0 +1,371 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from agents.resilience import is_transient
+from apps.metrics.instruments import introspection_fallbacks, introspection_jobs
+from .cache import thought_hash
+from .context import thought_context
+from .models import IntrospectionStatus, Thought
+from .services import ThoughtIntrospectionService
+from .versions import thought_versions
+
+logger = logging.getLogger(__name__)
+
+class IntrospectionQueue:
+    """
+    Fills in `Thought.introspective_version` off the request thread.
+
+    Backends:
+        thread: jobs run on an in-process worker pool (default)
+        asyncio: jobs enqueued from async views run as tasks on the ASGI event
+            loop, so many model calls wait concurrently without holding a thread
+        database: pending rows are left for `manage.py process_introspections`
+        sync: jobs run inline, which is handy when debugging
+    """
+
+    BACKENDS = ('thread', 'asyncio', 'database', 'sync')
+
+    def __init__(self, backend='thread', workers=4, max_attempts=3, retry_delay=5.0, batch_concurrency=8,
+                 stale_after=900, recovery_batch=20, model_retries=False):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown introspection queue backend: {backend}")
+        self.backend = backend
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.batch_concurrency = batch_concurrency
+        self.stale_after = timedelta(seconds=stale_after)
+        self.recovery_batch = recovery_batch
+        # The model call policy retries transient failures itself; a job that
+        # still fails with one is not run again, so the two retry layers never multiply
+        self.model_retries = model_retries
+        self._service = ThoughtIntrospectionService()
+        self._executor = None
+        self._lock = threading.Lock()
+        self._loop = None
+        self._tasks = set()
+
+    @classmethod
+    def from_settings(cls):
+        options = settings.THOUGHT_INTROSPECTION_QUEUE
+        return cls(
+            backend=options.get('BACKEND', 'thread'),
+            workers=options.get('WORKERS', 4),
+            max_attempts=options.get('MAX_ATTEMPTS', 3),
+            retry_delay=options.get('RETRY_DELAY', 5.0),
+            batch_concurrency=options.get('BATCH_CONCURRENCY', 8),
+            stale_after=options.get('STALE_AFTER', 900),
+            recovery_batch=options.get('RECOVERY_BATCH', 20),
+            model_retries=settings.INTROSPECTION_RESILIENCE.get('RETRY', {}).get('MAX_ATTEMPTS', 3) > 1,
+        )
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Started on first use so management commands never spawn threads
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix='introspection'
+                    )
+        return self._executor
+
+    def enqueue(self, thought_id: int) -> None:
+        """Schedule introspection for a thought once the current transaction commits"""
+        transaction.on_commit(lambda: self._dispatch(thought_id))
+
+    def enqueue_many(self, thought_ids) -> None:
+        """Schedule one batched introspection job for several thoughts"""
+        thought_ids = list(thought_ids)
+        transaction.on_commit(lambda: self._dispatch_many(thought_ids))
+
+    async def aenqueue(self, thought_id: int) -> None:
+        """Schedule introspection for a thought from async code"""
+        if self.backend != 'asyncio':
+            await sync_to_async(self.enqueue)(thought_id)
+            return
+        self._loop = asyncio.get_running_loop()
+        self._spawn(thought_id)
+
+    def _spawn(self, thought_id: int) -> None:
+        task = self._loop.create_task(self.arun(thought_id))
+        # The loop only keeps weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _dispatch(self, thought_id: int) -> None:
+        if self.backend == 'sync':
+            self.run(thought_id)
+        elif self.backend == 'asyncio' and self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._spawn, thought_id)
+        elif self.backend in ('thread', 'asyncio'):
+            # No event loop seen yet (e.g. under WSGI): use the worker pool
+            self._get_executor().submit(self._run_in_worker, self.run, thought_id)
+
+    def _dispatch_many(self, thought_ids) -> None:
+        if self.backend == 'sync':
+            self.run_many(thought_ids)
+        elif self.backend in ('thread', 'asyncio'):
+            self._get_executor().submit(self._run_in_worker, self.run_many, thought_ids)
+
+    def _run_in_worker(self, job, arg) -> None:
+        close_old_connections()
+        try:
+            job(arg)
+        except Exception as err:
+            logger.error(f"Introspection job for {arg} crashed: {err}", exc_info=True)
+        finally:
+            close_old_connections()
+
+    def _claim(self, thought_id: int) -> bool:
+        # A conditional update is the lock: only one worker moves a row out of pending
+        return Thought.objects.filter(
+            pk=thought_id,
+            introspection_status=IntrospectionStatus.PENDING
+        ).update(
+            introspection_status=IntrospectionStatus.PROCESSING,
+            introspection_attempts=F('introspection_attempts') + 1,
+            introspection_claimed_at=timezone.now()
+        ) == 1
+
+    def run(self, thought_id: int) -> None:
+        """
+        Claim a pending thought and introspect it
+
+        Args:
+            thought_id: Primary key of the thought to process
+        """
+        if not self._claim(thought_id):
+            return
+
+        thought = Thought.objects.filter(pk=thought_id).only('user_id', 'text', 'introspection_attempts').first()
+        if thought is None:
+            return
+        # The claim changed the thought's status behind the ORM's back
+        thought_versions.touch(thought.user_id)
+
+        try:
+            context = thought_context.for_thought(thought.user_id, thought_id, thought.text)
+            introspective_version = self._service.introspect(thought.text, context)
+        except Exception as err:
+            logger.warning(f"Introspection attempt {thought.introspection_attempts} failed for thought {thought_id}: {err}")
+            self._schedule_retry(thought_id, self._record_failure(thought_id, thought.text, err))
+            return
+
+        self._finish(thought_id, thought.text, IntrospectionStatus.COMPLETED, introspective_version, '')
+
+    async def arun(self, thought_id: int) -> None:
+        """Async version of run; retries wait on the event loop"""
+        while await sync_to_async(self._claim)(thought_id):
+            thought = await Thought.objects.filter(pk=thought_id).only('user_id', 'text', 'introspection_attempts').afirst()
+            if thought is None:
+                return
+            await sync_to_async(thought_versions.touch)(thought.user_id)
+
+            try:
+                context = await sync_to_async(thought_context.for_thought)(thought.user_id, thought_id, thought.text)
+                introspective_version = await self._service.aintrospect(thought.text, context)
+            except Exception as err:
+                logger.warning(f"Introspection attempt {thought.introspection_attempts} failed for thought {thought_id}: {err}")
+                delay = await sync_to_async(self._record_failure)(thought_id, thought.text, err)
+                if delay is None:
+                    return
+                await asyncio.sleep(delay)
+                continue
+
+            await sync_to_async(self._finish)(
+                thought_id, thought.text, IntrospectionStatus.COMPLETED, introspective_version, ''
+            )
+            return
+
+    def _schedule_retry(self, thought_id: int, delay) -> None:
+        if delay is None:
+            return
+        # Through _run_in_worker: the sync backend runs the job on the timer thread itself
+        timer = threading.Timer(delay, self._run_in_worker, args=(self._dispatch, thought_id))
+        timer.daemon = True
+        timer.start()
+
+    def run_many(self, thought_ids) -> None:
+        """
+        Claim pending thoughts and introspect them through one batched agent run
+
+        Args:
+            thought_ids: Primary keys of the thoughts to process
+        """
+        with transaction.atomic():
+            claimed = dict(
+                Thought.objects.select_for_update(skip_locked=True)
+                .filter(pk__in=thought_ids, introspection_status=IntrospectionStatus.PENDING)
+                .values_list('id', 'user_id')
+            )
+            Thought.objects.filter(pk__in=claimed).update(
+                introspection_status=IntrospectionStatus.PROCESSING,
+                introspection_attempts=F('introspection_attempts') + 1,
+                introspection_claimed_at=timezone.now()
+            )
+            thought_versions.touch(*set(claimed.values()))
+
+        thoughts = list(Thought.objects.filter(pk__in=claimed).order_by('id').only('user_id', 'text'))
+        if not thoughts:
+            return
+
+        # In id order, so each thought's context holds the ones sent before it
+        contexts = [thought_context.for_thought(thought.user_id, thought.pk, thought.text) for thought in thoughts]
+        outputs = self._service.introspect_many(
+            [thought.text for thought in thoughts],
+            max_concurrency=self.batch_concurrency,
+            contexts=contexts
+        )
+        for thought, output in zip(thoughts, outputs):
+            if isinstance(output, Exception):
+                logger.warning(f"Batched introspection failed for thought {thought.pk}: {output}")
+                self._schedule_retry(thought.pk, self._record_failure(thought.pk, thought.text, output))
+            else:
+                self._finish(thought.pk, thought.text, IntrospectionStatus.COMPLETED, output, '')
+
+    def _record_failure(self, thought_id: int, text: str, error: Exception):
+        """
+        Put a failed thought back in the queue, or mark it failed when out of attempts
+
+        With `model_retries`, a transient failure has already been retried by
+        the model call policy and is not retried again here.
+
+        Returns:
+            float | None: Seconds to wait before retrying, or None for no retry
+        """
+        with transaction.atomic():
+            thought = Thought.objects.select_for_update().filter(pk=thought_id).first()
+            if thought is None or thought_hash(thought.text) != thought_hash(text):
+                return None
+
+            retried_by_policy = self.model_retries and is_transient(error)
+            if thought.introspection_attempts < self.max_attempts and not retried_by_policy:
+                thought.introspection_status = IntrospectionStatus.PENDING
+                thought.introspection_error = str(error)
+                thought.save(update_fields=['introspection_status', 'introspection_error'])
+                introspection_jobs.labels('retried').inc()
+                return self.retry_delay * 2 ** (thought.introspection_attempts - 1)
+
+        # Out of attempts: keep the original text as the fallback rewrite
+        self._finish(thought_id, text, IntrospectionStatus.FAILED, text, str(error))
+        return None
+
+    def _finish(self, thought_id, text, status, introspective_version, error):
+        with transaction.atomic():
+            thought = Thought.objects.select_for_update().filter(pk=thought_id).first()
+            # The text was edited while we were working; the newer job owns the row.
+            # Edits that only touch whitespace or case keep the job's rewrite
+            if thought is None or thought_hash(thought.text) != thought_hash(text):
+                introspection_jobs.labels('superseded').inc()
+                return
+            thought.introspective_version = introspective_version
+            thought.introspection_status = status
+            thought.introspection_error = error
+            if status == IntrospectionStatus.COMPLETED:
+                thought.introspection_prompt_version, thought.introspection_model = self._service.version
+                thought.introspection_text_hash = thought_hash(text)
+            else:
+                # A fallback is not a rewrite, so it is not stamped
+                thought.introspection_prompt_version = thought.introspection_model = ''
+                thought.introspection_text_hash = ''
+            thought.save(update_fields=[
+                'introspective_version', 'introspection_status', 'introspection_error',
+                'introspection_prompt_version', 'introspection_model', 'introspection_text_hash', 'updated_at'
+            ])
+
+        introspection_jobs.labels(status).inc()
+        if status == IntrospectionStatus.FAILED:
+            introspection_fallbacks.labels('queue').inc()
+
+    def process_pending(self, limit: int = 100) -> int:
+        """
+        Run queued jobs in the calling thread, oldest first, as one batch
+
+        Args:
+            limit: Maximum number of thoughts to process
+
+        Returns:
+            int: Number of thoughts picked up
+        """
+        thought_ids = list(
+            Thought.objects.filter(introspection_status=IntrospectionStatus.PENDING)
+            .order_by('id')
+            .values_list('id', flat=True)[:limit]
+        )
+        if thought_ids:
+            self.run_many(thought_ids)
+        return len(thought_ids)
+
+    def release_deferred(self, limit: int) -> int:
+        """
+        Move the oldest deferred thoughts into the queue
+
+        Args:
+            limit: Maximum number of thoughts to release
+
+        Returns:
+            int: Number of thoughts released
+        """
+        with transaction.atomic():
+            released = list(
+                Thought.objects.select_for_update(skip_locked=True)
+                .filter(introspection_status=IntrospectionStatus.DEFERRED)
+                .order_by('id')
+                .values_list('id', 'user_id')[:limit]
+            )
+            thought_ids = [thought_id for thought_id, _ in released]
+            Thought.objects.filter(pk__in=thought_ids).update(introspection_status=IntrospectionStatus.PENDING)
+            if thought_ids:
+                self.enqueue_many(thought_ids)
+                thought_versions.touch(*(user_id for _, user_id in released))
+        return len(thought_ids)
+
+    def recover(self) -> int:
+        """
+        Pick up the jobs a previous run left behind: requeue the ones stuck in
+        processing and dispatch every pending thought, including those that
+        were waiting for a retry
+
+        Returns:
+            int: Number of thoughts dispatched
+        """
+        self.requeue_stale(self.stale_after)
+        thought_ids = list(
+            Thought.objects.filter(introspection_status=IntrospectionStatus.PENDING)
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+        for start in range(0, len(thought_ids), self.recovery_batch):
+            self._dispatch_many(thought_ids[start:start + self.recovery_batch])
+        return len(thought_ids)
+
+    async def startup(self) -> None:
+        """ASGI lifespan hook: recover jobs lost when the last process stopped"""
+        if self.backend in ('thread', 'asyncio'):
+            # Claims are conditional, so workers starting together never run a job twice
+            self._get_executor().submit(self._run_in_worker, lambda _: self.recover(), 'recovery')
+
+    def requeue_stale(self, older_than: timedelta) -> int:
+        """Return jobs orphaned by a crashed worker to the pending state"""
+        stale = Thought.objects.filter(
+            introspection_status=IntrospectionStatus.PROCESSING,
+            introspection_claimed_at__lt=timezone.now() - older_than
+        )
+        user_ids = set(stale.values_list('user_id', flat=True))
+        if not user_ids:
+            return 0
+        requeued = stale.update(introspection_status=IntrospectionStatus.PENDING)
+        thought_versions.touch(*user_ids)
+        return requeued
+
+introspection_queue = IntrospectionQueue.from_settings()
@@ -1,3 +1,502 @@
-from django.test import TestCase
+import asyncio
+import io
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from apps.embeddings.services import embedding_service
+from .cache import IntrospectionCache, thought_hash
+from .changes import CursorExpired, InvalidCursor, ThoughtChanges
+from .context import EMPTY_CONTEXT, thought_context
+from .imports import ThoughtImporter, _csv_records
+from .models import ImportFormat, ImportStatus, IntrospectionStatus, Thought
+from .services import ThoughtIntrospectionService
+from .signals import thoughts_bulk_created
+from .singleflight import SingleFlight
+from .tasks import IntrospectionQueue, introspection_queue
+from .versions import ThoughtVersions
+
+User = get_user_model()
+
+class IntrospectionQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='writer')
+        self.thought = Thought.objects.create(
+            user=self.user, text='Original thought', introspection_status=IntrospectionStatus.PENDING
+        )
+        self.queue = IntrospectionQueue(backend='sync', max_attempts=2, retry_delay=1.0)
+        self.queue._service = mock.Mock(version=('prompt-v1', 'model-a'))
+        patcher = mock.patch.object(thought_context, 'for_thought', return_value=EMPTY_CONTEXT)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _reload(self):
+        self.thought.refresh_from_db()
+        return self.thought
+
+    def test_claim_is_taken_once(self):
+        updated_at = self.thought.updated_at
+        self.assertTrue(self.queue._claim(self.thought.pk))
+        self.assertFalse(self.queue._claim(self.thought.pk))
+
+        thought = self._reload()
+        self.assertEqual(thought.introspection_status, IntrospectionStatus.PROCESSING)
+        self.assertEqual(thought.introspection_attempts, 1)
+        self.assertIsNotNone(thought.introspection_claimed_at)
+        # Bookkeeping is not an edit
+        self.assertEqual(thought.updated_at, updated_at)
+
+    def test_run_stores_stamped_rewrite(self):
+        self.queue._service.introspect.return_value = 'Rewritten thought'
+
+        self.queue.run(self.thought.pk)
+
+        thought = self._reload()
+        self.assertEqual(thought.introspection_status, IntrospectionStatus.COMPLETED)
+        self.assertEqual(thought.introspective_version, 'Rewritten thought')
+        self.assertEqual(thought.introspection_prompt_version, 'prompt-v1')
+        self.assertEqual(thought.introspection_model, 'model-a')
+        self.assertEqual(thought.introspection_text_hash, thought_hash('Original thought'))
+
+    def test_run_skips_thoughts_it_cannot_claim(self):
+        Thought.objects.filter(pk=self.thought.pk).update(introspection_status=IntrospectionStatus.PROCESSING)
+
+        self.queue.run(self.thought.pk)
+
+        self.queue._service.introspect.assert_not_called()
+
+    def test_failures_are_retried_with_backoff_then_fall_back(self):
+        self.queue._service.introspect.side_effect = RuntimeError('provider down')
+
+        with mock.patch.object(self.queue, '_schedule_retry') as schedule_retry:
+            self.queue.run(self.thought.pk)
+            schedule_retry.assert_called_once_with(self.thought.pk, 1.0)
+            thought = self._reload()
+            self.assertEqual(thought.introspection_status, IntrospectionStatus.PENDING)
+            self.assertEqual(thought.introspection_error, 'provider down')
+
+            schedule_retry.reset_mock()
+            self.queue.run(self.thought.pk)
+            schedule_retry.assert_called_once_with(self.thought.pk, None)
+
+        thought = self._reload()
+        self.assertEqual(thought.introspection_status, IntrospectionStatus.FAILED)
+        self.assertEqual(thought.introspection_attempts, 2)
+        # The original text stands in for the rewrite, and is not stamped as one
+        self.assertEqual(thought.introspective_version, 'Original thought')
+        self.assertEqual(thought.introspection_prompt_version, '')
+
+    def test_failures_retried_by_the_call_policy_are_not_run_again(self):
+        self.queue.model_retries = True
+        self.queue._service.introspect.side_effect = ConnectionError('provider unreachable')
+
+        with mock.patch.object(self.queue, '_schedule_retry') as schedule_retry:
+            self.queue.run(self.thought.pk)
+
+        schedule_retry.assert_called_once_with(self.thought.pk, None)
+        self.assertEqual(self._reload().introspection_status, IntrospectionStatus.FAILED)
+
+    def test_failures_the_call_policy_skips_are_still_run_again(self):
+        self.queue.model_retries = True
+        self.queue._service.introspect.side_effect = ValueError('unparseable answer')
+
+        with mock.patch.object(self.queue, '_schedule_retry') as schedule_retry:
+            self.queue.run(self.thought.pk)
+
+        schedule_retry.assert_called_once_with(self.thought.pk, 1.0)
+        self.assertEqual(self._reload().introspection_status, IntrospectionStatus.PENDING)
+
+    def test_edit_during_run_supersedes_the_job(self):
+        def edit_then_rewrite(text, context):
+            Thought.objects.filter(pk=self.thought.pk).update(
+                text='Edited thought', introspection_status=IntrospectionStatus.PENDING
+            )
+            return 'Rewrite of the old text'
+        self.queue._service.introspect.side_effect = edit_then_rewrite
+
+        self.queue.run(self.thought.pk)
+
+        thought = self._reload()
+        self.assertEqual(thought.introspection_status, IntrospectionStatus.PENDING)
+        self.assertIsNone(thought.introspective_version)
+
+    def test_whitespace_edit_during_run_keeps_the_rewrite(self):
+        def edit_then_rewrite(text, context):
+            Thought.objects.filter(pk=self.thought.pk).update(text='  original   THOUGHT ')
+            return 'Rewritten thought'
+        self.queue._service.introspect.side_effect = edit_then_rewrite
+
+        self.queue.run(self.thought.pk)
+
+        thought = self._reload()
+        self.assertEqual(thought.introspection_status, IntrospectionStatus.COMPLETED)
+        self.assertEqual(thought.introspective_version, 'Rewritten thought')
+
+    def test_run_many_only_claims_pending_thoughts(self):
+        running = Thought.objects.create(
+            user=self.user, text='Already running', introspection_status=IntrospectionStatus.PROCESSING
+        )
+        self.queue._service.introspect_many.return_value = ['Rewritten thought']
+
+        self.queue.run_many([self.thought.pk, running.pk])
+
+        texts = self.queue._service.introspect_many.call_args.args[0]
+        self.assertEqual(texts, ['Original thought'])
+        self.assertEqual(self._reload().introspection_status, IntrospectionStatus.COMPLETED)
+        running.refresh_from_db()
+        self.assertEqual(running.introspection_status, IntrospectionStatus.PROCESSING)
+
+    def test_requeue_stale_returns_orphaned_jobs(self):
+        self.queue._claim(self.thought.pk)
+
+        self.assertEqual(self.queue.requeue_stale(timedelta(hours=1)), 0)
+        Thought.objects.filter(pk=self.thought.pk).update(introspection_claimed_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(self.queue.requeue_stale(timedelta(hours=1)), 1)
+        self.assertEqual(self._reload().introspection_status, IntrospectionStatus.PENDING)
+
+class RepeatedThoughtTests(TestCase):
+    # With the default settings: each thought is sent with its user's context
+
+    def setUp(self):
+        caches['default'].clear()
+        self.agent = mock.Mock(prompt_version='prompt-v1', model_name='model-a')
+        self.agent.process_thought.return_value = mock.Mock(introspective_rewrite='Rewritten thought')
+        for patcher in (
+            mock.patch('apps.thoughts.services.get_agent', return_value=self.agent),
+            mock.patch.object(ThoughtIntrospectionService, 'cache', IntrospectionCache(shared_cache='default')),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.queue = IntrospectionQueue(backend='sync')
+        self.user = User.objects.create(username='repeater')
+        Thought.objects.create(user=self.user, text='An earlier thought', introspection_status=IntrospectionStatus.COMPLETED)
+
+    def _submit(self, text, user=None):
+        thought = Thought.objects.create(
+            user=user or self.user, text=text, introspection_status=IntrospectionStatus.PENDING
+        )
+        self.queue.run(thought.pk)
+        thought.refresh_from_db()
+        return thought
+
+    def test_repeated_thought_makes_one_model_call(self):
+        self.assertTrue(thought_context.enabled)
+
+        first, second = self._submit('Tell me a joke.'), self._submit('Tell me a joke.')
+
+        self.assertEqual(self.agent.process_thought.call_count, 1)
+        self.assertEqual(first.introspective_version, second.introspective_version)
+        self.assertEqual(second.introspection_status, IntrospectionStatus.COMPLETED)
+
+    def test_simultaneous_thoughts_share_a_flight_key(self):
+        first, second = (
+            Thought.objects.create(user=self.user, text='Tell me a joke.') for _ in range(2)
+        )
+        contexts = [thought_context.for_thought(self.user.pk, thought.pk, thought.text) for thought in (first, second)]
+
+        # The second sees the first, but both coalesce on one key
+        self.assertNotEqual(contexts[0].messages, contexts[1].messages)
+        self.assertEqual(contexts[0].scope, contexts[1].scope)
+
+    def test_rewrites_made_with_context_stay_with_their_user(self):
+        other = User.objects.create(username='someone-else')
+        Thought.objects.create(user=other, text='Their earlier thought', introspection_status=IntrospectionStatus.COMPLETED)
+
+        self._submit('Tell me a joke.')
+        self._submit('Tell me a joke.', user=other)
+
+        self.assertEqual(self.agent.process_thought.call_count, 2)
+
+class IntrospectionCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.cache = IntrospectionCache(shared_cache='default')
+
+    def test_key_ignores_whitespace_and_case(self):
+        self.assertEqual(
+            IntrospectionCache.make_key('Hello   World ', 'v1', 'model-a'),
+            IntrospectionCache.make_key('hello world', 'v1', 'model-a')
+        )
+
+    def test_key_changes_with_prompt_model_and_context(self):
+        key = IntrospectionCache.make_key('hello', 'v1', 'model-a')
+        self.assertNotEqual(key, IntrospectionCache.make_key('hello', 'v2', 'model-a'))
+        self.assertNotEqual(key, IntrospectionCache.make_key('hello', 'v1', 'model-b'))
+        self.assertNotEqual(key, IntrospectionCache.make_key('hello', 'v1', 'model-a', 'context'))
+
+    def test_invalidate_drops_both_tiers(self):
+        other_process = IntrospectionCache(shared_cache='default')
+        self.cache.set('key', 'rewrite')
+
+        self.cache.invalidate('key')
+
+        self.assertIsNone(self.cache.get('key'))
+        self.assertIsNone(other_process.get('key'))
+
+    def test_clear_retires_shared_entries(self):
+        # No local tier to outlive the clear
+        other_process = IntrospectionCache(shared_cache='default', local_ttl=0)
+        self.cache.set('key', 'rewrite')
+        self.assertEqual(other_process.get('key'), 'rewrite')
+
+        self.cache.clear()
+
+        self.assertIsNone(self.cache.get('key'))
+        self.assertIsNone(other_process.get('key'))
+
+    def test_disabled_cache_stores_nothing(self):
+        cache = IntrospectionCache(enabled=False, shared_cache='default')
+        cache.set('key', 'rewrite')
+        self.assertIsNone(cache.get('key'))
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.flights = SingleFlight()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def work(self):
+        self.calls += 1
+        self.release.wait(5)
+        return 'result'
+
+    def _wait_for_followers(self, count):
+        deadline = time.monotonic() + 5
+        while self.flights.stats()['followers'] < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_concurrent_callers_share_one_call(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(self.flights.do, 'key', self.work) for _ in range(4)]
+            self._wait_for_followers(3)
+            self.release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(results, ['result'] * 4)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.flights.stats()['in_flight'], 0)
+
+    def test_leader_error_reaches_followers_and_retires_the_key(self):
+        def fail():
+            self.work()
+            raise ValueError('provider down')
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(self.flights.do, 'key', fail) for _ in range(2)]
+            self._wait_for_followers(1)
+            self.release.set()
+            for future in futures:
+                with self.assertRaises(ValueError):
+                    future.result()
+
+        self.assertEqual(self.flights.do('key', self.work), 'result')
+        self.assertEqual(self.calls, 2)
+
+    def test_async_callers_share_one_call(self):
+        async def work():
+            self.calls += 1
+            await asyncio.sleep(0.05)
+            return 'result'
+
+        async def call_together():
+            return await asyncio.gather(*(self.flights.ado('key', work) for _ in range(3)))
+
+        self.assertEqual(asyncio.run(call_together()), ['result'] * 3)
+        self.assertEqual(self.calls, 1)
+
+    def test_other_process_result_is_used_while_it_holds_the_lock(self):
+        flights = SingleFlight(lock_cache='default', lock_timeout=5, poll_interval=0.01)
+        self.assertTrue(flights._acquire('key'))
+        published = iter([None, 'their result'])
+
+        self.assertEqual(flights.do('key', self.work, lookup=lambda: next(published)), 'their result')
+        self.assertEqual(self.calls, 0)
+
+    def test_stuck_lock_holder_is_given_up_on(self):
+        flights = SingleFlight(lock_cache='default', lock_timeout=0.05, poll_interval=0.01)
+        self.assertTrue(flights._acquire('key'))
+        self.release.set()
+
+        self.assertEqual(flights.do('key', self.work, lookup=lambda: None), 'result')
+        self.assertEqual(self.calls, 1)
+
+class ThoughtVersionsTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create(username='versioned')
+        self.versions = ThoughtVersions(cache='default')
+
+    def test_touch_replaces_version_once_committed(self):
+        version = self.versions.get(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.versions.touch(self.user.pk)
+            self.versions.touch(self.user.pk)
+            self.assertEqual(self.versions.get(self.user.pk), version)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertNotEqual(self.versions.get(self.user.pk), version)
+
+    def test_rolled_back_touch_keeps_version(self):
+        version = self.versions.get(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.versions.touch(self.user.pk)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        self.assertEqual(self.versions.get(self.user.pk), version)
+
+class ThoughtChangesTests(TransactionTestCase):
+    # Each write commits on its own, so every change gets its own transaction id
+
+    def setUp(self):
+        # Embed inline, so no worker is still writing when the tables are flushed
+        patcher = mock.patch.object(embedding_service, 'backend', 'sync')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create(username='syncer')
+        self.thoughts = [Thought.objects.create(user=self.user, text=f'Thought {n}') for n in range(3)]
+        Thought.objects.create(user=User.objects.create(username='someone-else'), text='Not mine')
+        self.changes = ThoughtChanges(page_size=2)
+
+    def test_first_pass_pages_through_current_thoughts(self):
+        first = self.changes.since(self.user.pk)
+        second = self.changes.since(self.user.pk, first.cursor)
+
+        self.assertTrue(first.has_more)
+        self.assertFalse(second.has_more)
+        self.assertEqual(
+            [thought.pk for thought in first.thoughts + second.thoughts],
+            [thought.pk for thought in self.thoughts]
+        )
+        self.assertEqual(first.deleted + second.deleted, [])
+
+    def test_cursor_returns_only_later_changes(self):
+        synced = self.changes.since(self.user.pk, limit=10)
+        edited, deleted, _ = self.thoughts
+        edited.text = 'Edited'
+        edited.save()
+        deleted_id = deleted.pk
+        deleted.delete()
+
+        page = self.changes.since(self.user.pk, synced.cursor)
+
+        self.assertEqual([thought.pk for thought in page.thoughts], [edited.pk])
+        self.assertEqual(page.thoughts[0].text, 'Edited')
+        self.assertEqual(page.deleted, [deleted_id])
+        caught_up = self.changes.since(self.user.pk, page.cursor)
+        self.assertEqual((caught_up.thoughts, caught_up.deleted), ([], []))
+
+    def test_malformed_cursor_is_refused(self):
+        with self.assertRaises(InvalidCursor):
+            self.changes.since(self.user.pk, 'not-a-cursor')
+
+    def test_cursor_older_than_tombstones_is_refused(self):
+        issued = time.time() - self.changes.tombstone_retention.total_seconds() - 60
+        with mock.patch('apps.thoughts.changes.time.time', return_value=issued):
+            cursor = self.changes.encode_cursor(1)
+
+        with self.assertRaises(CursorExpired):
+            self.changes.since(self.user.pk, cursor)
+
+class ThoughtImporterTests(TestCase):
+    RECORDS = (
+        b'{"text": "First"}\n'
+        b'{"text": "Second", "created_at": "2020-01-02T03:04:05Z"}\n'
+        b'not json\n'
+        b'{"text": "Third"}\n'
+        b'{"text": "Fourth"}\n'
+        b'{"text": "Fifth"}\n'
+    )
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, True)
+        override = self.settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create(username='importer')
+        self.importer = ThoughtImporter(backend='off', chunk_size=2)
+
+    def _imported_texts(self):
+        return list(Thought.objects.filter(user=self.user).order_by('id').values_list('text', flat=True))
+
+    def test_failed_import_resumes_after_last_checkpoint(self):
+        job = self.importer.create_job(self.user, io.BytesIO(self.RECORDS), ImportFormat.NDJSON)
+        copy, calls = self.importer._copy, []
+
+        def fail_second_chunk(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError('connection lost')
+            copy(*args)
+
+        with mock.patch.object(self.importer, '_copy', side_effect=fail_second_chunk):
+            self.importer.run(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportStatus.FAILED)
+        self.assertEqual(job.rows_imported, 2)
+        self.assertEqual(job.offset, self.RECORDS.index(b'not json'))
+        self.assertEqual(self._imported_texts(), ['First', 'Second'])
+
+        self.assertTrue(self.importer.retry(job))
+        self.importer.run(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportStatus.COMPLETED)
+        self.assertEqual((job.rows_imported, job.rows_skipped), (5, 1))
+        self.assertEqual(self._imported_texts(), ['First', 'Second', 'Third', 'Fourth', 'Fifth'])
+        self.assertFalse(
+            Thought.objects.filter(user=self.user).exclude(introspection_status=IntrospectionStatus.DEFERRED).exists()
+        )
+
+    def test_each_chunk_is_announced_once_it_is_copied(self):
+        chunks = []
+
+        def receiver(sender, thoughts, **kwargs):
+            chunks.append([thought.text for thought in thoughts])
+        thoughts_bulk_created.connect(receiver, sender=Thought)
+        self.addCleanup(thoughts_bulk_created.disconnect, receiver, sender=Thought)
+        job = self.importer.create_job(self.user, io.BytesIO(self.RECORDS), ImportFormat.NDJSON)
+
+        self.importer.run(job.pk)
+
+        self.assertEqual(chunks, [['First', 'Second'], ['Third', 'Fourth'], ['Fifth']])
+
+    def test_idle_feed_frees_its_slot(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+
+        with mock.patch.object(introspection_queue, 'release_deferred', return_value=0):
+            self.assertEqual(self.importer.feed(), 0)
+        self.assertIsNone(caches['default'].get(ThoughtImporter.FEED_SLOT_KEY))
+
+        with mock.patch.object(introspection_queue, 'release_deferred', return_value=20):
+            self.assertEqual(self.importer.feed(), 20)
+            self.assertEqual(self.importer.feed(), 0)
+
+    def test_csv_resume_keeps_the_header(self):
+        source = io.BytesIO(b'text,created_at\nFirst,\nSecond,\nThird,\n')
+        records = list(_csv_records(source, 0))
+
+        resumed = list(_csv_records(source, records[0][1]))
+
+        self.assertEqual(resumed, records[1:])
+        self.assertEqual(resumed[0][0], {'text': 'Second', 'created_at': ''})
@@ -0,0 +1,136 @@
+import hashlib
+import uuid
+from datetime import datetime
+from typing import Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Thought, ThoughtTombstone
+
+# (tag, last modified): tag changes whenever any of the user's thoughts does
+Version = Tuple[str, Optional[datetime]]
+
+class ThoughtVersions:
+    """
+    A version for each user's thoughts, used to answer conditional requests.
+
+    The version is derived from the change stamps the database puts on every
+    written thought and every tombstone (see changes.py), read with one
+    indexed query: the latest stamp of each, and their times for
+    Last-Modified. Stamps are transaction ids, handed out before commit, so
+    while an older transaction may still be running the snapshot xmin is
+    part of the tag too, and the tag moves on once it finishes. Writes of
+    any kind, including `update()` and COPY, change the version without
+    any bookkeeping.
+
+    With `cache` set, the version is kept in that cache instead, so checking
+    a list costs a cache read. Writes then have to replace it: receivers
+    cover writes through the ORM, and code that changes thoughts with
+    `update()` or COPY calls `touch()` itself. All touches in a transaction
+    are written together once it commits.
+    """
+
+    KEY = 'thought-version:{user_id}'
+
+    def __init__(self, cache: Optional[str] = None, ttl: Optional[float] = 86400):
+        self.cache = cache
+        self.ttl = ttl
+
+    @classmethod
+    def from_settings(cls):
+        options = settings.THOUGHT_VERSIONS
+        return cls(
+            cache=options.get('CACHE'),
+            ttl=options.get('TTL', 86400),
+        )
+
+    def _key(self, user_id: int) -> str:
+        return self.KEY.format(user_id=user_id)
+
+    def _derive(self, user_id: int) -> Version:
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT t.change_xid, t.updated_at, d.change_xid, d.deleted_at,
+                       pg_snapshot_xmin(pg_current_snapshot())::text::bigint
+                FROM (SELECT 1) AS one
+                LEFT JOIN LATERAL (
+                    SELECT change_xid, updated_at FROM {quote(Thought._meta.db_table)}
+                    WHERE user_id = %s ORDER BY change_xid DESC LIMIT 1
+                ) AS t ON true
+                LEFT JOIN LATERAL (
+                    SELECT change_xid, deleted_at FROM {quote(ThoughtTombstone._meta.db_table)}
+                    WHERE user_id = %s ORDER BY change_xid DESC LIMIT 1
+                ) AS d ON true
+                """,
+                [user_id, user_id]
+            )
+            written_xid, updated_at, deleted_xid, deleted_at, xmin = cursor.fetchone()
+
+        latest = max(written_xid or 0, deleted_xid or 0)
+        # Transactions below xmin have all finished; one above it may still commit behind the latest stamp
+        pending = xmin if xmin <= latest else ''
+        source = f"{user_id}:{written_xid or 0}:{deleted_xid or 0}:{pending}"
+        times = [time for time in (updated_at, deleted_at) if time is not None]
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()[:32], max(times) if times else None
+
+    def get(self, user_id: int) -> Version:
+        """The current version of a user's thoughts"""
+        if self.cache is None:
+            return self._derive(user_id)
+        cache = caches[self.cache]
+        key = self._key(user_id)
+        version = cache.get(key)
+        if version is None:
+            version = self._derive(user_id)
+            # add, not set: a write that committed since the derivation wins
+            if not cache.add(key, version, timeout=self.ttl):
+                version = cache.get(key, version)
+        return version
+
+    async def aget(self, user_id: int) -> Version:
+        """Async version of get"""
+        if self.cache is None:
+            return await sync_to_async(self._derive)(user_id)
+        cache = caches[self.cache]
+        key = self._key(user_id)
+        version = await cache.aget(key)
+        if version is None:
+            version = await sync_to_async(self._derive)(user_id)
+            if not await cache.aadd(key, version, timeout=self.ttl):
+                version = await cache.aget(key, version)
+        return version
+
+    def touch(self, *user_ids: int) -> None:
+        """Give users' thoughts a new version once the current transaction commits"""
+        if self.cache is None or not user_ids:
+            return
+
+        db = transaction.get_connection()
+        if db.in_atomic_block:
+            # Join a bump already waiting on this transaction, unless it was
+            # registered in a savepoint that could still roll back without ours
+            savepoints = set(db.savepoint_ids)
+            for savepoint_ids, callback, _ in db.run_on_commit:
+                pending = getattr(callback, 'thought_versions_pending', None)
+                if pending is not None and savepoint_ids <= savepoints:
+                    pending.update(user_ids)
+                    return
+
+        pending = set(user_ids)
+
+        def bump():
+            now = timezone.now()
+            caches[self.cache].set_many(
+                {self._key(user_id): (uuid.uuid4().hex, now) for user_id in pending},
+                timeout=self.ttl
+            )
+        bump.thought_versions_pending = pending
+        transaction.on_commit(bump)
+
+thought_versions = ThoughtVersions.from_settings()
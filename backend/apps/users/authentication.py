@@ -0,0 +1,31 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .claims import user_from_claims
+from .resolver import user_resolver
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that takes the user from the token's signed claims.
+
+    The token's `user_stamp` is compared with the user's current one from
+    the resolver, which is normally in memory. A match means the claims are
+    up to date, so no user row is read. A mismatch means the user changed
+    after the token was issued, and the client has to refresh it.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+            token_stamp = validated_token['user_stamp']
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        current_stamp = user_resolver.stamp(user_id)
+        if current_stamp is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if current_stamp != token_stamp:
+            raise InvalidToken(_("Token is out of date; refresh it"))
+        return user_from_claims(user_id, validated_token)
@@ -8,3 +8,21 @@ class CustomUser(AbstractUser):
 
     class Meta:
         db_table = 'custom_users'
+
+class ClaimsUser(CustomUser):
+    """
+    A user rebuilt from signed token claims, without a database query.
+
+    It has the real primary key, so it works in queries and as a foreign
+    key value, but fields that are not in the token, such as the password,
+    are blank, so it refuses to be saved or deleted.
+    """
+
+    class Meta:
+        proxy = True
+
+    def save(self, *args, **kwargs):
+        raise TypeError("A user built from token claims cannot be saved; load it from the database first")
+
+    def delete(self, *args, **kwargs):
+        raise TypeError("A user built from token claims cannot be deleted; load it from the database first")
@@ -0,0 +1,18 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .resolver import user_resolver
+
+User = get_user_model()
+
+@receiver(post_save, sender=User)
+def update_user_stamp(sender, instance, **kwargs):
+    """Tokens issued before a change to the user stop matching once it commits"""
+    transaction.on_commit(lambda: user_resolver.update(instance))
+
+@receiver(post_delete, sender=User)
+def forget_user_stamp(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: user_resolver.forget(user_id))
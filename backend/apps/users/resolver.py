@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+
+from .claims import user_stamp
+
+User = get_user_model()
+
+# Stored in the shared cache for users that no longer exist or are inactive
+_GONE = ''
+
+class UserResolver:
+    """
+    Current `user_stamp` of each user, so tokens can be checked without a query.
+
+    A token whose stamp matches describes the user as they are now, and its
+    claims can stand in for the user row. Stamps are kept in a per-process
+    LRU with TTL and in a Django cache shared by every process; the database
+    is only read on a miss. Saving or deleting a user rewrites the shared
+    entry at once (see receivers.py). Other processes see the change within
+    `local_ttl` seconds.
+
+    A miss only adds the stamp it read from the database, so a stamp that a
+    save wrote in the meantime is kept rather than overwritten with the older
+    one. Shared entries still expire after `shared_ttl` seconds, bounding how
+    long any stale stamp can survive.
+    """
+
+    def __init__(self, local_max_entries=10000, local_ttl=30, shared_cache='default', shared_ttl=60 * 60 * 24):
+        self.local_max_entries = local_max_entries
+        self.local_ttl = local_ttl
+        self.shared_cache = shared_cache
+        self.shared_ttl = shared_ttl
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        options = settings.USER_RESOLVER
+        return cls(
+            local_max_entries=options.get('LOCAL_MAX_ENTRIES', 10000),
+            local_ttl=options.get('LOCAL_TTL', 30),
+            shared_cache=options.get('SHARED_CACHE', 'default'),
+            shared_ttl=options.get('SHARED_TTL', 60 * 60 * 24),
+        )
+
+    @property
+    def _shared(self):
+        return caches[self.shared_cache]
+
+    @staticmethod
+    def _key(user_id) -> str:
+        return f'auth:user-stamp:{user_id}'
+
+    def _get_local(self, user_id) -> Optional[str]:
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is None:
+                return None
+            stamp, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._local[user_id]
+                return None
+            self._local.move_to_end(user_id)
+            return stamp
+
+    def _set_local(self, user_id, stamp: str) -> None:
+        with self._lock:
+            self._local[user_id] = (stamp, time.monotonic() + self.local_ttl)
+            self._local.move_to_end(user_id)
+            while len(self._local) > self.local_max_entries:
+                self._local.popitem(last=False)
+
+    def stamp(self, user_id) -> Optional[str]:
+        """
+        The user's current stamp
+
+        Returns:
+            str | None: The stamp, or None if the user is gone or inactive
+        """
+        stamp = self._get_local(user_id)
+        if stamp is None:
+            stamp = self._shared.get(self._key(user_id))
+        if stamp is None:
+            user = User.objects.filter(pk=user_id, is_active=True).first()
+            stamp = user_stamp(user) if user is not None else _GONE
+            if not self._shared.add(self._key(user_id), stamp, self.shared_ttl):
+                # A save got there first, and its stamp is at least as new as ours
+                stamp = self._shared.get(self._key(user_id), stamp)
+        self._set_local(user_id, stamp)
+        return stamp or None
+
+    def update(self, user) -> None:
+        """Record a saved user's new stamp"""
+        stamp = user_stamp(user) if user.is_active else _GONE
+        self._shared.set(self._key(user.pk), stamp, self.shared_ttl)
+        self._set_local(user.pk, stamp)
+
+    def forget(self, user_id) -> None:
+        """Record that a user was deleted"""
+        self._shared.set(self._key(user_id), _GONE, self.shared_ttl)
+        self._set_local(user_id, _GONE)
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._local.clear()
+
+user_resolver = UserResolver.from_settings()
@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from .claims import add_user_claims, auth_stamp
 
 User = get_user_model()
 
@@ -22,3 +26,61 @@ class UserSerializer(serializers.ModelSerializer):
         validated_data.pop('password2')
         user = User.objects.create_user(**validated_data)
         return user
+
+class UserProfileSerializer(serializers.ModelSerializer):
+    """Read-only view of a user, as returned alongside tokens"""
+
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'email', 'first_name', 'last_name')
+        read_only_fields = fields
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Issues tokens carrying the user's claims, and returns the user that logged in"""
+
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        # The user authenticate() already loaded, so no second query
+        data['user'] = UserProfileSerializer(self.user).data
+        return data
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refreshes tokens with the user's current claims
+
+    A refresh token whose auth stamp no longer matches, because the password
+    changed or the account was deactivated, is refused.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        user = User.objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh.payload.get(api_settings.USER_ID_CLAIM)}
+        ).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        # Tokens from before claims were added have no stamp and are upgraded here
+        if refresh.payload.get('auth_stamp', auth_stamp(user)) != auth_stamp(user):
+            raise AuthenticationFailed('Token is no longer valid; log in again', 'token_not_valid')
+
+        add_user_claims(refresh, user)
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    # The blacklist app is not installed
+                    pass
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+
+        return data
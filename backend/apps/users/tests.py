@@ -1,3 +1,83 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
 
-# Create your tests here.
+from .authentication import ClaimsJWTAuthentication
+from .resolver import user_resolver
+from .serializers import ClaimsTokenObtainPairSerializer
+
+User = get_user_model()
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        caches[user_resolver.shared_cache].clear()
+        user_resolver.clear_local()
+        self.user = User.objects.create_user(username='claims', email='claims@example.com', password='secret-pass')
+        token = ClaimsTokenObtainPairSerializer.get_token(self.user).access_token
+        self.authorization = f'Bearer {token}'
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=self.authorization)
+
+    def _change_user(self, **fields):
+        # The resolver learns of the change once it commits
+        with self.captureOnCommitCallbacks(execute=True):
+            for field, value in fields.items():
+                setattr(self.user, field, value)
+            self.user.save()
+
+    def test_current_token_is_accepted(self):
+        self.assertEqual(self.client.get('/api/thoughts/').status_code, 200)
+
+    def test_request_user_comes_from_claims(self):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=self.authorization)
+        authentication = ClaimsJWTAuthentication()
+        authentication.authenticate(request)
+
+        with self.assertNumQueries(0):
+            user, _ = authentication.authenticate(request)
+
+        self.assertEqual((user.pk, user.username, user.email), (self.user.pk, 'claims', 'claims@example.com'))
+
+    def test_profile_change_retires_token(self):
+        self._change_user(email='changed@example.com')
+        self.assertEqual(self.client.get('/api/thoughts/').status_code, 401)
+
+    def test_password_change_retires_token(self):
+        self.user.set_password('another-pass')
+        self._change_user()
+        self.assertEqual(self.client.get('/api/thoughts/').status_code, 401)
+
+    def test_deactivation_retires_token(self):
+        self._change_user(is_active=False)
+        self.assertEqual(self.client.get('/api/thoughts/').status_code, 401)
+
+    def test_deletion_retires_token(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertEqual(self.client.get('/api/thoughts/').status_code, 401)
+
+    def test_change_outside_claims_keeps_token(self):
+        self._change_user(last_login=timezone.now())
+        self.assertEqual(self.client.get('/api/thoughts/').status_code, 200)
+
+    def test_refresh_issues_token_with_current_claims(self):
+        refresh = ClaimsTokenObtainPairSerializer.get_token(self.user)
+        self._change_user(email='changed@example.com')
+
+        response = self.client.post('/api/token/refresh/', {'refresh': str(refresh)}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get('/api/thoughts/').status_code, 200)
+
+    def test_refresh_is_refused_after_password_change(self):
+        refresh = ClaimsTokenObtainPairSerializer.get_token(self.user)
+        self.user.set_password('another-pass')
+        self._change_user()
+
+        response = self.client.post('/api/token/refresh/', {'refresh': str(refresh)}, format='json')
+
+        self.assertEqual(response.status_code, 401)
@@ -5,19 +5,13 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
 from django.contrib.auth import get_user_model
-from .serializers import UserSerializer
+from .serializers import ClaimsTokenObtainPairSerializer, UserSerializer
 
 User = get_user_model()
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     """Custom token view that returns user data along with tokens"""
-    def post(self, request, *args, **kwargs):
-        response = super().post(request, *args, **kwargs)
-        if response.status_code == status.HTTP_200_OK:
-            user = User.objects.get(username=request.data['username'])
-            user_data = UserSerializer(user).data
-            response.data['user'] = user_data
-        return response
+    serializer_class = ClaimsTokenObtainPairSerializer
 
 class RegisterView(APIView):
     """View for user registration"""
@@ -0,0 +1,122 @@
+import itertools
+import uuid
+
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+
+from agents.introspection import IntrospectiveThought
+from agents.registry import INTROSPECTION, register_agent
+from apps.agent_integrations.gemini.models import GeminiIntegration
+from apps.api.serializers import ThoughtSerializer
+from apps.embeddings.services import embedding_service
+from apps.thoughts.cache import introspection_cache
+from apps.thoughts.models import IntrospectionStatus, Thought
+from apps.thoughts.tasks import introspection_queue
+from apps.users.serializers import ClaimsTokenObtainPairSerializer
+from .runner import benchmark
+
+User = get_user_model()
+PASSWORD = 'benchmark-Pa55word'
+
+class StubAgent:
+    """Answers instantly, so the benchmarks time our code rather than a provider"""
+    model_name = 'benchmark-stub'
+    prompt_version = 'benchmark'
+
+    def process_thought(self, thought_text, raise_on_error=False, messages=()):
+        return IntrospectiveThought(introspective_rewrite=f"I wonder: {thought_text}", reasoning="stub")
+
+    async def aprocess_thought(self, thought_text, raise_on_error=False, messages=()):
+        return self.process_thought(thought_text)
+
+    def process_thoughts(self, thought_texts, max_concurrency=4, messages=None):
+        return [self.process_thought(text) for text in thought_texts]
+
+def make_user():
+    return User.objects.create_user(f'bench-{uuid.uuid4().hex[:12]}', password=PASSWORD)
+
+def make_client(user):
+    client = APIClient()
+    client.credentials(
+        HTTP_AUTHORIZATION=f'Bearer {ClaimsTokenObtainPairSerializer.get_token(user).access_token}'
+    )
+    return client
+
+def make_thoughts(user, count):
+    Thought.objects.bulk_create(
+        Thought(
+            user=user,
+            text=f'benchmark thought {n} about the shape of the day',
+            introspective_version=f'I wonder about benchmark thought {n}',
+            introspection_status=IntrospectionStatus.COMPLETED,
+        )
+        for n in range(count)
+    )
+    return list(Thought.objects.filter(user=user))
+
+def serializer_list(count):
+    def setup():
+        thoughts = make_thoughts(make_user(), count)
+        return lambda: ThoughtSerializer(thoughts, many=True).data
+    return setup
+
+benchmark('serializer_list_1k', repeat=20)(serializer_list(1_000))
+benchmark('serializer_list_10k', repeat=5)(serializer_list(10_000))
+
+def use_stub_agent():
+    register_agent(INTROSPECTION, StubAgent)
+    introspection_cache.clear()
+    # Introspect inline so the job's queries are counted with the request
+    introspection_queue.backend = 'sync'
+    # Embedding runs on a background worker after the request; left running,
+    # it would compete with the next request and blur its timing
+    embedding_service.enqueue = lambda thoughts: None
+
+@benchmark('thought_create', repeat=20)
+def thought_create():
+    use_stub_agent()
+    client = make_client(make_user())
+    counter = itertools.count()
+
+    def create():
+        response = client.post('/api/thoughts/', {'text': f'new thought {next(counter)}'}, format='json')
+        assert response.status_code == 202, response.content
+    return create
+
+@benchmark('thought_update', repeat=20)
+def thought_update():
+    use_stub_agent()
+    user = make_user()
+    client = make_client(user)
+    thought = make_thoughts(user, 1)[0]
+    counter = itertools.count()
+
+    def update():
+        response = client.patch(
+            f'/api/thoughts/{thought.pk}/', {'text': f'edited thought {next(counter)}'}, format='json'
+        )
+        assert response.status_code == 202, response.content
+    return update
+
+@benchmark('token_obtain', repeat=5)
+def token_obtain():
+    user = make_user()
+    client = APIClient()
+
+    def obtain():
+        response = client.post(
+            '/api/token/', {'username': user.username, 'password': PASSWORD}, format='json'
+        )
+        assert response.status_code == 200, response.content
+    return obtain
+
+@benchmark('gemini_config', repeat=20)
+def gemini_config():
+    user = make_user()
+    GeminiIntegration.objects.create(user=user, api_key='benchmark-key')
+    client = make_client(user)
+
+    def config():
+        response = client.get('/api/agents/gemini/config/')
+        assert response.status_code == 200, response.content
+    return config
@@ -0,0 +1,116 @@
+import gc
+import json
+import statistics
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from django.core.cache import caches
+from django.db import connection
+
+# Registered benchmarks, in definition order
+BENCHMARKS: Dict[str, "Benchmark"] = {}
+
+class Benchmark:
+    """
+    One timed hot path.
+
+    `setup` prepares whatever data the path needs and returns a zero-argument
+    callable that runs the path once. The callable is run once to warm
+    caches. Then one run is made under query capture, one under tracemalloc,
+    and `repeat` runs are timed with neither.
+    """
+
+    def __init__(self, name: str, setup: Callable[[], Callable[[], object]], repeat: int = 10):
+        self.name = name
+        self.setup = setup
+        self.repeat = repeat
+
+    def run(self) -> Dict[str, float]:
+        """
+        Measure the benchmark
+
+        Returns:
+            dict: Median and fastest wall time in ms, query count, and peak
+            traced allocation in KiB
+        """
+        # Cached state left by an earlier run would change the query count
+        for cache in caches.all():
+            cache.clear()
+        target = self.setup()
+        target()
+
+        # Counted with a wrapper: CaptureQueriesContext loses queries when a
+        # request resets the query log part way through
+        queries = []
+        with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+            target()
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            target()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        timings: List[float] = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            target()
+            timings.append(time.perf_counter() - started)
+
+        return {
+            'time_ms': statistics.median(timings) * 1000,
+            'min_ms': min(timings) * 1000,
+            'queries': len(queries),
+            'peak_kib': peak / 1024,
+        }
+
+def benchmark(name: str, repeat: int = 10):
+    """Register the decorated setup function as a benchmark"""
+    def register(setup):
+        BENCHMARKS[name] = Benchmark(name, setup, repeat)
+        return setup
+    return register
+
+def load_baselines(path) -> Dict[str, Dict[str, float]]:
+    try:
+        with open(path) as baselines:
+            return json.load(baselines)
+    except FileNotFoundError:
+        return {}
+
+def save_baselines(path, results: Dict[str, Dict[str, float]]) -> None:
+    with open(path, 'w') as baselines:
+        rounded = {
+            name: {metric: round(value, 3) for metric, value in result.items()}
+            for name, result in results.items()
+        }
+        json.dump(rounded, baselines, indent=2, sort_keys=True)
+        baselines.write('\n')
+
+def find_regressions(
+    result, baseline, time_tolerance: float, memory_tolerance: float, time_floor_ms: float = 0.0
+) -> List[str]:
+    """
+    Compare a result with its baseline
+
+    Any extra query is a regression. The fastest run and the peak memory may
+    grow by the given fraction before they count, to absorb noise; the
+    fastest run is used because it is the least disturbed by other load.
+    Slowdowns under `time_floor_ms` are ignored, since timer noise alone
+    can move very fast paths by a large fraction.
+
+    Returns:
+        list: One message per regressed metric
+    """
+    problems = []
+    if result['queries'] > baseline['queries']:
+        problems.append(f"queries {baseline['queries']} -> {result['queries']}")
+    allowed_ms = max(baseline['min_ms'] * time_tolerance, time_floor_ms)
+    if result['min_ms'] > baseline['min_ms'] + allowed_ms:
+        problems.append(f"fastest run {baseline['min_ms']:.2f}ms -> {result['min_ms']:.2f}ms")
+    if result['peak_kib'] > baseline['peak_kib'] * (1 + memory_tolerance):
+        problems.append(f"peak memory {baseline['peak_kib']:.0f}KiB -> {result['peak_kib']:.0f}KiB")
+    return problems
@@ -13,4 +13,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'you_backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from apps.api.push import thought_event_socket  # noqa: E402
+from you_backend.lifespan import LifespanMiddleware  # noqa: E402
+from you_backend.websockets import WebSocketRouter  # noqa: E402
+
+application = LifespanMiddleware(WebSocketRouter(django_application, {
+    '/api/thoughts/events/': thought_event_socket,
+}))
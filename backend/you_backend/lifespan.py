@@ -0,0 +1,61 @@
+"""
+ASGI lifespan support for the Django application.
+
+Django's ASGI handler only speaks HTTP, so `LifespanMiddleware` answers the
+server's lifespan events itself and runs the hooks apps register with
+`on_startup` and `on_shutdown`, typically from `AppConfig.ready`.
+"""
+
+import logging
+from typing import Awaitable, Callable, List
+
+logger = logging.getLogger(__name__)
+
+Hook = Callable[[], Awaitable[None]]
+
+_startup_hooks: List[Hook] = []
+_shutdown_hooks: List[Hook] = []
+
+
+def on_startup(hook: Hook) -> Hook:
+    """Run `hook` when the server starts, before it accepts requests"""
+    _startup_hooks.append(hook)
+    return hook
+
+
+def on_shutdown(hook: Hook) -> Hook:
+    """Run `hook` when the server stops, after the last request"""
+    _shutdown_hooks.append(hook)
+    return hook
+
+
+class LifespanMiddleware:
+    """Handles `lifespan` scopes and passes everything else to the wrapped application"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'lifespan':
+            return await self.app(scope, receive, send)
+
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    for hook in _startup_hooks:
+                        await hook()
+                except Exception as err:
+                    logger.error(f"Startup hook failed: {err}", exc_info=True)
+                    await send({'type': 'lifespan.startup.failed', 'message': str(err)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # Shut down in reverse order, and keep going if one hook fails
+                for hook in reversed(_shutdown_hooks):
+                    try:
+                        await hook()
+                    except Exception as err:
+                        logger.error(f"Shutdown hook failed: {err}", exc_info=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
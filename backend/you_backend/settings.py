@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/5.1/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
+import json
 import os
 from pathlib import Path
 
@@ -45,6 +46,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # Third Party Apps
     'rest_framework',
@@ -54,10 +56,15 @@ INSTALLED_APPS = [
     # Custom Apps
     'apps.api',
     'apps.thoughts',
+    'apps.embeddings',
     'apps.agent_integrations.gemini',
+    'apps.metrics',
+    'apps.outbound',
 ]
 
 MIDDLEWARE = [
+    # First, so its timings include the rest of the stack
+    'apps.metrics.middleware.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -70,6 +77,25 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'you_backend.urls'
 
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'standard': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'standard'},
+    },
+    'loggers': {
+        'agents': {'handlers': ['console'], 'level': os.environ.get('APP_LOG_LEVEL', 'INFO')},
+        'apps': {'handlers': ['console'], 'level': os.environ.get('APP_LOG_LEVEL', 'INFO')},
+    },
+}
+
+# Bearer token required to scrape /metrics. Without one, /metrics is open
+# only while DEBUG is on and refuses every scrape otherwise
+METRICS_AUTH_TOKEN = os.environ.get('METRICS_AUTH_TOKEN', '')
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -104,6 +130,22 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# 'shared' must be visible to every worker process; create its table with
+# `python manage.py createcachetable`
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'shared_cache',
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -140,6 +182,10 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded files, such as thought imports waiting to be loaded. Every
+# process that runs imports must see the same directory
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', BASE_DIR / 'media')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -150,7 +196,7 @@ AUTH_USER_MODEL = 'users.CustomUser'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.ClaimsJWTAuthentication',
     ),
 }
 
@@ -161,6 +207,18 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    # Tokens carry the user's fields, so requests are authenticated without a user query
+    'TOKEN_OBTAIN_SERIALIZER': 'apps.users.serializers.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'apps.users.serializers.ClaimsTokenRefreshSerializer',
+}
+
+# Current stamp of each user's token claims, checked on every request: a
+# per-process LRU with TTL in front of a cache shared by all processes
+USER_RESOLVER = {
+    'LOCAL_MAX_ENTRIES': 10000,
+    'LOCAL_TTL': 30,  # seconds another process may take to see a user change
+    'SHARED_CACHE': 'shared',
+    'SHARED_TTL': 60 * 60 * 24,  # seconds
 }
 
 # CORS settings
@@ -182,11 +240,221 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'if-modified-since',
+    'if-none-match',
     'origin',
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
 ]
+# Lets the frontend read the validators of thought responses
+CORS_EXPOSE_HEADERS = [
+    'etag',
+    'last-modified',
+]
+
+# Introspection agent settings
+# Build the shared introspection agent when the app loads rather than on the
+# first request that needs it
+INTROSPECTION_WARM_UP = os.environ.get('INTROSPECTION_WARM_UP', 'false').lower() == 'true'
+
+# Pooled HTTP clients shared by every outbound call (OpenAI, Google OAuth).
+# Connections are kept alive and use HTTP/2 where the server supports it.
+# HOSTS gives a host its own connection pool and limits
+OUTBOUND_HTTP = {
+    'HTTP2': os.environ.get('OUTBOUND_HTTP2', 'true').lower() == 'true',
+    'TIMEOUT': {'CONNECT': 5.0, 'READ': 60.0, 'WRITE': 10.0, 'POOL': 10.0},  # seconds
+    'MAX_CONNECTIONS': 100,
+    'MAX_KEEPALIVE_CONNECTIONS': 20,
+    'KEEPALIVE_EXPIRY': 30.0,  # seconds
+    'HOSTS': {
+        'api.openai.com': {'MAX_CONNECTIONS': 64},
+        'oauth2.googleapis.com': {'MAX_CONNECTIONS': 10},
+    },
+}
+
+# Chat model behind the introspection agent. BACKEND is 'openai' or 'fake', a
+# local stand-in with simulated latency and failures for load tests. Fake
+# OPTIONS: latency_p50 and latency_p99 (seconds), errors (kind -> probability
+# for 'rate_limit', 'server_error' and 'timeout'), seed
+INTROSPECTION_PROVIDER = {
+    'BACKEND': os.environ.get('INTROSPECTION_PROVIDER', 'openai'),
+    'MODEL': os.environ.get('INTROSPECTION_MODEL', 'gpt-4o-mini'),
+    'OPTIONS': json.loads(os.environ.get('INTROSPECTION_PROVIDER_OPTIONS', '{}')),
+}
+
+# Protects the chat provider and the API from each other. CONCURRENCY caps the
+# model calls in flight per process: the cap grows while calls return in normal
+# time and shrinks on rate limits or calls LATENCY_TOLERANCE times slower than
+# usual, and callers wait at most QUEUE_TIMEOUT for a slot. CIRCUIT_BREAKER
+# fails calls fast, into the usual fallback, for RESET_TIMEOUT once FAILURE_RATE
+# of at least MIN_CALLS calls in the last WINDOW seconds have failed. RETRY
+# tries transient failures again after a random wait of up to BASE_DELAY * 2^n
+# seconds. HEDGE sends a duplicate of a call still running after the QUANTILE
+# of recent latencies, spending at most BUDGET extra calls per call
+INTROSPECTION_RESILIENCE = {
+    'CONCURRENCY': {
+        'ENABLED': os.environ.get('INTROSPECTION_CONCURRENCY_LIMIT_ENABLED', 'true').lower() == 'true',
+        'INITIAL_LIMIT': 8,
+        'MIN_LIMIT': 1,
+        'MAX_LIMIT': int(os.environ.get('INTROSPECTION_CONCURRENCY_MAX_LIMIT', '64')),
+        'QUEUE_TIMEOUT': float(os.environ.get('INTROSPECTION_QUEUE_TIMEOUT', '10')),  # seconds
+        'LATENCY_TOLERANCE': 2.0,
+        'BACKOFF': 0.75,
+    },
+    'CIRCUIT_BREAKER': {
+        'ENABLED': os.environ.get('INTROSPECTION_CIRCUIT_BREAKER_ENABLED', 'true').lower() == 'true',
+        'FAILURE_RATE': 0.5,
+        'MIN_CALLS': 20,
+        'WINDOW': 30,  # seconds
+        'RESET_TIMEOUT': 30,  # seconds
+        'HALF_OPEN_CALLS': 1,
+    },
+    'RETRY': {
+        'MAX_ATTEMPTS': int(os.environ.get('INTROSPECTION_MAX_ATTEMPTS', '3')),  # 1 disables retries
+        'BASE_DELAY': 0.5,  # seconds
+        'MAX_DELAY': 8.0,  # seconds
+    },
+    'HEDGE': {
+        'ENABLED': os.environ.get('INTROSPECTION_HEDGING_ENABLED', 'false').lower() == 'true',
+        'QUANTILE': 0.95,
+        'MIN_SAMPLES': 20,
+        'BUDGET': 0.1,
+    },
+}
+
+# Introspective rewrites are cached per process (LRU + TTL) and in a shared cache
+INTROSPECTION_CACHE = {
+    'ENABLED': os.environ.get('INTROSPECTION_CACHE_ENABLED', 'true').lower() == 'true',
+    'LOCAL_MAX_ENTRIES': 2048,
+    'LOCAL_TTL': 300,  # seconds
+    'SHARED_CACHE': 'shared',
+    'SHARED_TTL': 60 * 60 * 24 * 7,  # seconds
+}
+
+# Concurrent introspections of the same thought share one model call. Set
+# LOCK_CACHE to a cache shared by all processes to coalesce across them too
+INTROSPECTION_SINGLE_FLIGHT = {
+    'LOCK_CACHE': os.environ.get('INTROSPECTION_SINGLE_FLIGHT_LOCK_CACHE') or None,
+    'LOCK_TIMEOUT': 60,  # seconds
+    'POLL_INTERVAL': 0.25,  # seconds
+}
+
+# Thought embeddings for similarity search. HashingEmbedder runs offline;
+# use 'apps.embeddings.embedders.OpenAIEmbedder' for semantic vectors.
+# BACKEND is 'thread' (embed writes on a background worker) or 'sync' (inline)
+EMBEDDINGS = {
+    'BACKEND': os.environ.get('EMBEDDINGS_BACKEND', 'thread'),
+    'EMBEDDER': os.environ.get('EMBEDDINGS_EMBEDDER', 'apps.embeddings.embedders.HashingEmbedder'),
+    'OPTIONS': {'dimensions': 256},
+    'SHARED_CACHE': 'shared',
+    'MAX_INDEXED_USERS': 1000,  # per-user indexes kept in memory per process
+}
+
+# Background introspection queue. BACKEND is 'thread' (in-process worker pool),
+# 'asyncio' (tasks on the ASGI event loop, falling back to the pool elsewhere),
+# 'database' (run `manage.py process_introspections`) or 'sync' (inline).
+# With 'thread' and 'asyncio', a retry waits on an in-memory timer: retries
+# still waiting when the process stops are dispatched by the next start
+# Transient model errors are retried by INTROSPECTION_RESILIENCE['RETRY'], not
+# here; the queue reruns other failures and refused calls. A thought therefore
+# costs at most RETRY MAX_ATTEMPTS + MAX_ATTEMPTS - 1 model calls (5 by
+# default), each of which may also be hedged once
+THOUGHT_INTROSPECTION_QUEUE = {
+    'BACKEND': os.environ.get('INTROSPECTION_QUEUE_BACKEND', 'thread'),
+    'WORKERS': int(os.environ.get('INTROSPECTION_QUEUE_WORKERS', '4')),
+    'MAX_ATTEMPTS': 3,
+    'RETRY_DELAY': 5.0,  # seconds, doubled after each failed attempt
+    'BATCH_CONCURRENCY': 8,  # model calls in flight per batched job
+    # On startup, jobs processing for longer than this are taken to be orphaned
+    # by the last run and requeued, and pending ones are dispatched in batches
+    'STALE_AFTER': 15 * 60,  # seconds
+    'RECOVERY_BATCH': 20,
+}
+
+# Each user's recent thoughts are sent with every new one, so rewrites can
+# draw on what the user has been thinking about. The window is cached and
+# capped at MAX_TOKENS, so prompts stay the same size however long the
+# history grows. Rewrites made with a context are cached per user, so a
+# repeated thought reuses its rewrite and simultaneous ones share one model
+# call; turning this off lets different users share them too. Set
+# LOCK_CACHE to a cache shared by all processes so their updates to one
+# user's window never overwrite each other
+THOUGHT_CONTEXT = {
+    'ENABLED': os.environ.get('THOUGHT_CONTEXT_ENABLED', 'true').lower() == 'true',
+    'MAX_TOKENS': int(os.environ.get('THOUGHT_CONTEXT_MAX_TOKENS', '512')),
+    'MAX_THOUGHT_TOKENS': 96,  # longer thoughts are truncated
+    'MAX_ENTRIES': 50,
+    'CACHE': 'shared',
+    'TTL': 60 * 60,  # seconds
+    'LOCK_CACHE': os.environ.get('THOUGHT_CONTEXT_LOCK_CACHE') or None,
+    'LOCK_TIMEOUT': 5,  # seconds
+}
+
+# Thought list and detail responses carry an ETag and Last-Modified, and
+# matching conditional requests get a 304. The list's validators are read
+# from the latest change stamps with one indexed query. Set CACHE to keep a
+# version of each user's thoughts in a cache instead; every write then costs
+# a cache write, so only use a cache that is cheaper to write than that query
+THOUGHT_VERSIONS = {
+    'CACHE': os.environ.get('THOUGHT_VERSIONS_CACHE') or None,
+    'TTL': 24 * 60 * 60,  # seconds
+}
+
+# `manage.py recompute_introspections` re-runs rewrites made with an older
+# prompt or model, paced to RATE thoughts per second (0 for no limit) and
+# checkpointed in CHECKPOINT_CACHE so an interrupted run resumes
+INTROSPECTION_RECOMPUTE = {
+    'CHUNK_SIZE': 100,
+    'RATE': float(os.environ.get('INTROSPECTION_RECOMPUTE_RATE', '2.0')),
+    'CONCURRENCY': 4,  # model calls in flight per chunk
+    'CHECKPOINT_CACHE': 'shared',
+}
+
+# Largest list accepted by POST /api/thoughts/bulk/
+THOUGHTS_BULK_MAX_ITEMS = 500
+
+# Rows fetched and written per step of GET /api/thoughts/export/
+THOUGHTS_EXPORT_CHUNK_SIZE = 1000
+
+# GET /api/thoughts/changes/ returns up to PAGE_SIZE changes by default and
+# MAX_PAGE_SIZE at most. Tombstones of deleted thoughts are kept for
+# TOMBSTONE_RETENTION_DAYS (`manage.py prune_tombstones`); cursors older than
+# that are refused and the client reloads everything
+THOUGHT_CHANGES = {
+    'PAGE_SIZE': 200,
+    'MAX_PAGE_SIZE': 1000,
+    'TOMBSTONE_RETENTION_DAYS': int(os.environ.get('THOUGHT_TOMBSTONE_RETENTION_DAYS', '30')),
+}
+
+# Thought events pushed to clients over a WebSocket at /api/thoughts/events/,
+# or as Server-Sent Events from the same URL. BROKER carries events from the
+# code that writes thoughts to the connections listening; LocalBroker only
+# reaches connections in its own process, so run the introspection queue
+# in-process or plug in a broker shared between processes. A connection that
+# falls QUEUE_SIZE events behind is closed and the client resyncs
+THOUGHT_EVENTS = {
+    'BROKER': os.environ.get('THOUGHT_EVENTS_BROKER', 'apps.api.events.LocalBroker'),
+    'OPTIONS': {'queue_size': 100, 'max_subscriptions_per_user': 10},
+    'AUTH_TIMEOUT': 10,  # seconds for a WebSocket client to send its token
+    'HEARTBEAT': 25,  # seconds between keepalive comments on an idle event stream
+}
+
+# Uploads to POST /api/imports/ are loaded CHUNK_SIZE rows per COPY. Their
+# thoughts are introspected later, at INTROSPECTION_RATE thoughts per second
+# across all imports. With BACKEND 'off', run `manage.py process_imports --loop`.
+# Processes take turns feeding through LOCK_CACHE, which has to be shared by
+# all of them for the rate to hold across processes
+THOUGHT_IMPORTS = {
+    'BACKEND': os.environ.get('THOUGHT_IMPORT_BACKEND', 'thread'),
+    'CHUNK_SIZE': 5000,
+    'MAX_BYTES': 100 * 1024 * 1024,
+    'STALE_AFTER': 15 * 60,  # seconds without progress before a running import is resumed elsewhere
+    'INTROSPECTION_RATE': float(os.environ.get('THOUGHT_IMPORT_INTROSPECTION_RATE', '2.0')),
+    'INTROSPECTION_BATCH': 20,
+    'POLL_INTERVAL': 10.0,  # seconds between checks when there is nothing to do
+    'LOCK_CACHE': 'shared',
+}
 
 # Gemini Integration Settings
 GEMINI_CLIENT_ID = os.environ.get('GEMINI_CLIENT_ID', '')
@@ -194,3 +462,16 @@ GEMINI_CLIENT_SECRET = os.environ.get('GEMINI_CLIENT_SECRET', '')
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', '')
 GEMINI_REDIRECT_URI = os.environ.get('GEMINI_REDIRECT_URI', 'http://localhost:8000/api/agents/gemini/callback/')
 GEMINI_AUTH_SUCCESS_URL = os.environ.get('GEMINI_AUTH_SUCCESS_URL', 'http://localhost:3000/settings?tab=pairagents&status=success')
+
+# Gemini OAuth access tokens are cached per process and refreshed REFRESH_AHEAD
+# seconds before they expire. SCHEDULER 'thread' checks every INTERVAL seconds
+# from each process, for the integrations it served within IDLE_AFTER seconds;
+# with 'off', run `manage.py refresh_gemini_tokens --loop`.
+# Point LOCK_CACHE at a shared cache so processes never refresh the same token
+GEMINI_TOKENS = {
+    'REFRESH_AHEAD': 300,  # seconds
+    'SCHEDULER': os.environ.get('GEMINI_TOKEN_SCHEDULER', 'thread'),
+    'INTERVAL': 60,  # seconds
+    'IDLE_AFTER': 60 * 60,  # seconds
+    'LOCK_CACHE': os.environ.get('GEMINI_TOKEN_LOCK_CACHE') or None,
+}
@@ -17,6 +17,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenRefreshView
+from apps.metrics.views import metrics
 from apps.users.views import CustomTokenObtainPairView, RegisterView
 
 urlpatterns = [
@@ -26,4 +27,5 @@ urlpatterns = [
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/register/', RegisterView.as_view(), name='register'),
     path('api/agents/', include('apps.agent_integrations.gemini.urls')),
+    path('metrics', metrics, name='metrics'),
 ]
@@ -0,0 +1,34 @@
+"""
+WebSocket routing for the Django application.
+
+Django's ASGI handler only speaks HTTP, so `WebSocketRouter` hands
+`websocket` scopes to the ASGI application registered for their path, and
+everything else to the wrapped application. The same path can serve HTTP
+from a Django view and a WebSocket from its application.
+"""
+
+from typing import Dict
+
+
+def _normalize(path: str) -> str:
+    return path.rstrip('/') or '/'
+
+
+class WebSocketRouter:
+    """Routes `websocket` scopes by path and passes everything else to the wrapped application"""
+
+    def __init__(self, app, routes: Dict[str, object]):
+        self.app = app
+        self.routes = {_normalize(path): handler for path, handler in routes.items()}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'websocket':
+            return await self.app(scope, receive, send)
+
+        handler = self.routes.get(_normalize(scope['path']))
+        if handler is None:
+            # Closing before accepting makes the server reject the handshake with a 403
+            await receive()
+            await send({'type': 'websocket.close'})
+            return
+        return await handler(scope, receive, send)
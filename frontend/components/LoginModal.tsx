@@ -36,7 +36,7 @@ export default function LoginModal({ isOpen, onClose }: LoginModalProps) {
       }
 
       const data = await response.json();
-      login(data.access);
+      login(data.access, data.refresh);
       onClose();
     } catch (err) {
       setError(
@@ -9,8 +9,10 @@ import {
 interface AuthContextType {
   isAuthenticated: boolean;
   token: string | null;
-  login: (token: string) => void;
+  login: (token: string, refreshToken?: string) => void;
   logout: () => void;
+  // Trades the refresh token for a new access token; null if the session is over
+  refresh: () => Promise<string | null>;
 }
 
 const AuthContext = createContext<AuthContextType | undefined>(undefined);
@@ -28,14 +30,16 @@ export function AuthProvider({ children }: { children: ReactNode }) {
     }
   }, []);
 
-  const login = (newToken: string) => {
+  const login = (newToken: string, refreshToken?: string) => {
     localStorage.setItem("auth_token", newToken);
+    if (refreshToken) localStorage.setItem("refresh_token", refreshToken);
     setToken(newToken);
     setIsAuthenticated(true);
   };
 
   const logout = () => {
     localStorage.removeItem("auth_token");
+    localStorage.removeItem("refresh_token");
     setToken(null);
     setIsAuthenticated(false);
     // Optional: Clear any other stored data
@@ -44,8 +48,33 @@ export function AuthProvider({ children }: { children: ReactNode }) {
     window.location.href = "/";
   };
 
+  const refresh = async () => {
+    const refreshToken = localStorage.getItem("refresh_token");
+    if (!refreshToken) return null;
+    try {
+      const response = await fetch(
+        `${process.env.NEXT_PUBLIC_API_URL}/api/token/refresh/`,
+        {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({ refresh: refreshToken }),
+        }
+      );
+      if (!response.ok) return null;
+      const data = await response.json();
+      // Refresh tokens rotate: the response carries the next one
+      login(data.access, data.refresh);
+      return data.access as string;
+    } catch (error) {
+      console.error("Error refreshing token:", error);
+      return null;
+    }
+  };
+
   return (
-    <AuthContext.Provider value={{ isAuthenticated, token, login, logout }}>
+    <AuthContext.Provider
+      value={{ isAuthenticated, token, login, logout, refresh }}
+    >
       {children}
     </AuthContext.Provider>
   );
@@ -1,4 +1,4 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import InputBar from "../components/InputBar";
 import ThoughtBubble from "../components/ThoughtBubble";
 import AgentMessage from "../components/AgentMessage";
@@ -6,14 +6,43 @@ import NavBar from "../components/NavBar";
 import SettingsModal from "../components/SettingsModal";
 import LoginModal from "../components/LoginModal";
 import { useAuth } from "../contexts/AuthContext";
+import {
+  thoughtEventService,
+  ThoughtEvent,
+} from "../services/thoughtEventService";
+
+type TimelineThought = {
+  id?: number;
+  text: string;
+  introspective_version: string;
+  updated_at?: string;
+  isLoading?: boolean;
+};
+
+// Keeps whichever copy of a thought is newer: a pushed event can overtake
+// the response to the request that caused it
+const upsert = (prev: TimelineThought[], thought: TimelineThought) => {
+  const index = prev.findIndex((t) => t.id === thought.id);
+  if (index === -1) return [...prev, thought];
+  const current = prev[index];
+  if (
+    current.updated_at &&
+    thought.updated_at &&
+    current.updated_at > thought.updated_at
+  )
+    return prev;
+  return prev.map((t, i) => (i === index ? thought : t));
+};
 
 export default function Home() {
-  const [thoughts, setThoughts] = useState<
-    Array<{ text: string; introspective_version: string; isLoading?: boolean }>
-  >([]);
+  const [thoughts, setThoughts] = useState<TimelineThought[]>([]);
+  // Cursor URL of the next older page, or null once the history is loaded
+  const [olderPage, setOlderPage] = useState<string | null>(null);
   const [isSettingsOpen, setIsSettingsOpen] = useState(false);
   const [isLoginOpen, setIsLoginOpen] = useState(false);
-  const { isAuthenticated, token } = useAuth();
+  const { isAuthenticated, token, refresh, logout } = useAuth();
+  // Whether the event stream has connected since login; later connects reload
+  const streamConnected = useRef(false);
 
   useEffect(() => {
     if (isAuthenticated) {
@@ -21,24 +50,85 @@ export default function Home() {
     }
   }, [isAuthenticated]);
 
+  // Introspections finish in the background; they are pushed here as they land
+  useEffect(() => {
+    if (!isAuthenticated || !token) {
+      streamConnected.current = false;
+      return;
+    }
+    return thoughtEventService.subscribe(token, {
+      onEvent: (event: ThoughtEvent) => {
+        if (event.type === "thought.deleted") {
+          setThoughts((prev) => prev.filter((t) => t.id !== event.id));
+          return;
+        }
+        const thought = {
+          ...event.thought,
+          introspective_version: event.thought.introspective_version ?? "",
+        };
+        setThoughts((prev) => {
+          // Our own new thought: the POST response puts it in place of its placeholder
+          if (
+            event.type === "thought.created" &&
+            prev.some((t) => t.isLoading && t.text === thought.text)
+          )
+            return prev;
+          return upsert(prev, thought);
+        });
+      },
+      // Nothing is replayed after a reconnect, so reload
+      onConnect: () => {
+        if (streamConnected.current) fetchThoughts();
+        streamConnected.current = true;
+      },
+      // A new token re-runs this effect and subscribes again
+      onUnauthorized: async () => {
+        if (!(await refresh())) logout();
+      },
+    });
+  }, [isAuthenticated, token]);
+
+  const fetchPage = async (url: string) => {
+    const response = await fetch(url, {
+      headers: {
+        Authorization: `Bearer ${token}`,
+        "Content-Type": "application/json",
+      },
+    });
+    if (!response.ok) {
+      const errorData = await response.json();
+      console.error("Error fetching thoughts:", errorData);
+      return null;
+    }
+    return response.json();
+  };
+
   const fetchThoughts = async () => {
     try {
-      const response = await fetch(
-        `${process.env.NEXT_PUBLIC_API_URL}/api/thoughts/`,
-        {
-          headers: {
-            Authorization: `Bearer ${token}`,
-            "Content-Type": "application/json",
-          },
-        }
+      // Pages come newest first; the timeline shows oldest first
+      const data = await fetchPage(
+        `${process.env.NEXT_PUBLIC_API_URL}/api/thoughts/`
       );
-      if (!response.ok) {
-        const errorData = await response.json();
-        console.error("Error fetching thoughts:", errorData);
-        return;
-      }
-      const data = await response.json();
-      setThoughts(data);
+      if (!data) return;
+      setThoughts([...data.results].reverse());
+      setOlderPage(data.next);
+    } catch (error) {
+      console.error("Error fetching thoughts:", error);
+    }
+  };
+
+  const loadOlderThoughts = async () => {
+    if (!olderPage) return;
+    try {
+      const data = await fetchPage(olderPage);
+      if (!data) return;
+      setThoughts((prev) => [
+        ...[...data.results]
+          .reverse()
+          .filter((t: TimelineThought) => !prev.some((p) => p.id === t.id)),
+        ...prev,
+      ]);
+      setOlderPage(data.next);
     } catch (error) {
       console.error("Error fetching thoughts:", error);
     }
@@ -77,7 +167,10 @@ export default function Home() {
       const newThought = await response.json();
       // Replace the loading thought with the actual response
       setThoughts((prev) =>
-        prev.map((t) => (t === tempThought ? newThought : t))
+        upsert(
+          prev.filter((t) => t !== tempThought),
+          newThought
+        )
       );
     } catch (error) {
       console.error("Error adding thought:", error);
@@ -96,11 +189,19 @@ export default function Home() {
             Introspective Thoughts
           </h2>
           <div className="max-w-xl mx-auto">
+            {olderPage && (
+              <button
+                onClick={loadOlderThoughts}
+                className="block mx-auto mb-4 text-sm text-gray-500 hover:text-gray-700"
+              >
+                Load older thoughts
+              </button>
+            )}
             {thoughts.map((thought, index) => (
               <ThoughtBubble
-                key={index}
+                key={thought.id ?? `pending-${index}`}
                 text={thought.introspective_version}
-                isLoading={thought.isLoading}
+                isLoading={thought.isLoading || !thought.introspective_version}
               />
             ))}
           </div>
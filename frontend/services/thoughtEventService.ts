@@ -0,0 +1,147 @@
+export interface Thought {
+  id: number;
+  text: string;
+  introspective_version: string | null;
+  introspection_status: string;
+  updated_at: string;
+}
+
+export type ThoughtEvent =
+  | {
+      type: "thought.created" | "thought.updated" | "introspection.completed";
+      thought: Thought;
+    }
+  | { type: "thought.deleted"; id: number };
+
+interface Handlers {
+  onEvent: (event: ThoughtEvent) => void;
+  // Called each time the stream (re)connects; events missed while disconnected
+  // are not replayed, so reload or sync the thoughts here
+  onConnect?: () => void;
+  // Called when the server refuses or drops the stream because the token is
+  // invalid or expired. Listening stops; subscribe again with a fresh token
+  onUnauthorized?: () => void;
+}
+
+const EVENTS_PATH = "/api/thoughts/events/";
+const MAX_RETRY_DELAY = 30000;
+
+const parseSse = (block: string) => {
+  let event = "message";
+  let data = "";
+  for (const line of block.split("\n")) {
+    if (line.startsWith("event:")) event = line.slice(6).trim();
+    else if (line.startsWith("data:")) data += line.slice(5).trim();
+  }
+  return { event, data };
+};
+
+export const thoughtEventService = {
+  /**
+   * Listen to the user's thought events over a WebSocket, or Server-Sent
+   * Events where the WebSocket cannot connect. Reconnects with backoff,
+   * except after an authentication failure, which goes to onUnauthorized.
+   * Returns a function that stops listening.
+   */
+  subscribe: (
+    token: string,
+    { onEvent, onConnect, onUnauthorized }: Handlers
+  ) => {
+    const baseUrl = process.env.NEXT_PUBLIC_API_URL;
+    let stopped = false;
+    let useSse = typeof WebSocket === "undefined";
+    let retryDelay = 1000;
+    let socket: WebSocket | null = null;
+    let abort: AbortController | null = null;
+    let retryTimer: ReturnType<typeof setTimeout> | undefined;
+
+    const retry = () => {
+      if (stopped) return;
+      retryTimer = setTimeout(connect, retryDelay);
+      retryDelay = Math.min(retryDelay * 2, MAX_RETRY_DELAY);
+    };
+
+    const unauthorized = () => {
+      if (stopped) return;
+      stopped = true;
+      onUnauthorized?.();
+    };
+
+    const ready = () => {
+      retryDelay = 1000;
+      onConnect?.();
+    };
+
+    const connectSocket = () => {
+      let opened = false;
+      socket = new WebSocket(`${baseUrl?.replace(/^http/, "ws")}${EVENTS_PATH}`);
+      socket.onopen = () => {
+        opened = true;
+        socket?.send(JSON.stringify({ token }));
+      };
+      socket.onmessage = (message) => {
+        const event = JSON.parse(message.data);
+        if (event.type === "ready") ready();
+        else onEvent(event);
+      };
+      socket.onclose = (close) => {
+        // 4401: the token was refused or has expired
+        if (close.code === 4401) return unauthorized();
+        if (!opened) useSse = true;
+        retry();
+      };
+    };
+
+    const connectSse = async () => {
+      abort = new AbortController();
+      try {
+        const response = await fetch(`${baseUrl}${EVENTS_PATH}`, {
+          headers: { Authorization: `Bearer ${token}` },
+          signal: abort.signal,
+        });
+        if (response.status === 401) return unauthorized();
+        if (!response.ok || !response.body) throw new Error("Event stream unavailable");
+
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = "";
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += value;
+          const blocks = buffer.split("\n\n");
+          buffer = blocks.pop() ?? "";
+          for (const block of blocks) {
+            const { event, data } = parseSse(block);
+            if (!data) continue;
+            if (event === "ready") ready();
+            else if (event === "closed") {
+              // The token expired; anything else reconnects below
+              if (JSON.parse(data).reason === "expired") {
+                abort?.abort();
+                return unauthorized();
+              }
+            } else onEvent({ type: event, ...JSON.parse(data) } as ThoughtEvent);
+          }
+        }
+      } catch (error) {
+        if (stopped) return;
+        console.error("Error reading thought events:", error);
+      }
+      retry();
+    };
+
+    const connect = () => {
+      if (stopped) return;
+      if (useSse) connectSse();
+      else connectSocket();
+    };
+
+    connect();
+    return () => {
+      stopped = true;
+      clearTimeout(retryTimer);
+      socket?.close();
+      abort?.abort();
+    };
+  },
+};